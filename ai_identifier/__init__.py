@@ -7,16 +7,31 @@ PLUGIN_DESCRIPTION = "Identifiziert Musikdateien per AcoustID und ergänzt Metad
 PLUGIN_VERSION = "0.9.1"
 PLUGIN_API_VERSIONS = ["3.0"]
 
-from .constants import *
-from .cache import load_cache, save_cache, get_cache
-from .ki import *
-from .worker import *
-from .utils import *
-from .workflow import *
-from . import logging  # Initialisiert das eigene Logging-Setup
-import logging as std_logging
-logger = std_logging.getLogger("ai_identifier")
-logger.info("Test: ai_identifier Plugin wurde geladen und Logging initialisiert!")
+import multiprocessing as _multiprocessing
+
+# Kindprozesse des Nachverarbeitungs-Pools ("spawn") importieren nur ai_identifier.pooltasks;
+# Picard, Qt, Hooks und Provider werden dort weder gebraucht noch initialisiert.
+# (Der Pool übergibt keine Funktionen aus diesem Paket als Initializer: sie würden entpickelt,
+# bevor parent_process() im Kindprozess gesetzt ist.)
+if _multiprocessing.parent_process() is None:
+    from .constants import *
+    from .cache import load_cache, save_cache, get_cache
+    from .ki import *
+    from .worker import *
+    from .utils import *
+    from .workflow import *
+    from .album import *
+    from .postprocess import *
+    from .cover import *
+    from .journal import *
+    from .batch import *
+    from .langdetect import *
+    from . import logging  # Initialisiert das eigene Logging-Setup
+    import logging as std_logging
+    logger = std_logging.getLogger("ai_identifier")
+    logger.info("Test: ai_identifier Plugin wurde geladen und Logging initialisiert!")
+    # Cache-Datei einmalig beim Laden des Plugins öffnen (wird nur gemappt, nicht geparst)
+    load_cache()
 # Keine UI-Registrierung mehr nötig – reines Backend-Plugin
 
 # ... hier kann die Haupt-Plugin-Logik stehen, z.B. Event-Hooks, Initialisierung, etc. ...
@@ -0,0 +1,308 @@
+# pyright: reportMissingImports=false
+# Album-Logik für AI Music Identifier Plugin (Album-Inferenz und Prefetch)
+
+import asyncio
+import json
+import queue
+import re
+import threading
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+from .cache import get_cache, save_cache
+from .config import get_snapshot
+from .cancellation import CancellationToken, token_for_item
+from .ki import (
+    call_ai_provider, get_genre_suggestion, get_style_suggestion, get_language_code_suggestion
+)
+from .logging import log_event, log_exception
+from .providers.lifecycle import model_lifecycle
+from .utils import msg
+
+# Felder, die aus der Album-Antwort als Prior für jeden Track übernommen werden (Antwortfeld -> Cache-Präfix)
+_ALBUM_FIELDS = {"genre": "ki_genre", "style": "ki_style", "language": "ki_language_code"}
+_VARIOUS_ARTISTS = {"various artists", "various", "va", "verschiedene interpreten", "diverse"}
+
+
+def is_compilation(album_artist: str, tracks: List[Dict[str, Any]]) -> bool:
+    """
+    Erkennt Compilations (Sampler), bei denen eine Album-Antwort nicht für alle Tracks gilt.
+    :param album_artist: Album-Künstler
+    :param tracks: Liste von Dicts mit 'title' und 'artist'
+    :return: True bei "Various Artists" oder zu vielen abweichenden Track-Künstlern
+    """
+    if (album_artist or "").strip().lower() in _VARIOUS_ARTISTS:
+        return True
+    if not tracks:
+        return False
+    ratio = get_snapshot().album_compilation_ratio
+    base = (album_artist or "").strip().lower()
+    foreign = sum(1 for t in tracks if base and base not in str(t.get("artist", "")).lower())
+    return foreign / len(tracks) > ratio
+
+
+def _build_album_prompt(album_title: str, album_artist: str, tracks: List[Dict[str, Any]]) -> str:
+    """Baut den Album-Prompt aus Titel, Künstler und Trackliste."""
+    tracklist = "\n".join(f"{i + 1}. {t.get('title', '')}" for i, t in enumerate(tracks))
+    return (
+        f"Das Album '{album_title}' von '{album_artist}' hat folgende Tracks:\n{tracklist}\n"
+        "Bestimme Genre, Musikstil und die gesungene Sprache (ISO-639-1 Code) des Albums. "
+        "Falls einzelne Tracks deutlich davon abweichen, gib ihre Nummern als 'outliers' an. "
+        "Antworte nur mit JSON im Format "
+        '{"genre": "...", "style": "...", "language": "..", "outliers": []}, ohne weitere Erklärungen.'
+    )
+
+
+def _parse_album_answer(text: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Extrahiert das JSON-Objekt aus der KI-Antwort.
+    :return: Dict mit den Album-Feldern oder None, wenn die Antwort unbrauchbar ist
+    """
+    if not text or "Fehler" in text:
+        return None
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    result: Dict[str, Any] = {}
+    for field in _ALBUM_FIELDS:
+        value = data.get(field)
+        result[field] = str(value).strip() if value else None
+    outliers = data.get("outliers") or []
+    result["outliers"] = [int(o) - 1 for o in outliers if isinstance(o, (int, str)) and str(o).isdigit()]
+    return result
+
+
+async def get_album_suggestion(album_title: str, album_artist: str, tracks: List[Dict[str, Any]], tagger=None, token: Optional[CancellationToken]=None) -> Optional[Dict[str, Any]]:
+    """
+    Liefert Genre, Stil und Sprache für ein ganzes Album mit einem einzigen Prompt.
+    :param album_title: Albumtitel
+    :param album_artist: Album-Künstler
+    :param tracks: Liste von Dicts mit 'title' und 'artist'
+    :param tagger: (optional) Picard-Tagger-Objekt
+    :param token: (optional) Abbruch-Token
+    :return: Dict mit 'genre', 'style', 'language', 'outliers' (Track-Indizes) oder None
+    """
+    settings = get_snapshot()
+    model = settings.ollama_model
+    cache_key = f"ki_album::{model}::{album_title}::{album_artist}"
+    use_cache = settings.enable_cache
+    if use_cache and cache_key in get_cache():
+        v = get_cache()[cache_key]
+        if isinstance(v, dict) and isinstance(v.get("value"), dict):
+            log_event("info", "Album-Vorschlag aus KI-Cache", album=album_title, artist=album_artist)
+            return v["value"]
+    answer = await call_ai_provider(_build_album_prompt(album_title, album_artist, tracks), model, tagger, token=token, settings=settings, json_mode=True)
+    result = _parse_album_answer(answer)
+    if result is None:
+        log_event("warning", msg("Album-Antwort der KI unbrauchbar", "Unusable album answer from AI"), album=album_title, answer=answer)
+        return None
+    log_event("info", "Album-Vorschlag von KI", album=album_title, artist=album_artist, **{k: result[k] for k in _ALBUM_FIELDS})
+    if use_cache:
+        get_cache()[cache_key] = {"value": result, "ts": time.time()}
+        save_cache()
+    return result
+
+
+def _store_track_priors(model: str, album: Dict[str, Any], tracks: List[Dict[str, Any]], skip: set) -> set:
+    """
+    Schreibt die Album-Antwort als Prior in die Track-Cache-Einträge (nur bei aktivem Cache),
+    damit spätere Einzelanfragen zu den Tracks sie ohne KI-Request beantworten.
+    Vorhandene Track-Werte aus eigenen Track-Anfragen werden nicht überschrieben;
+    weichen sie vom Album-Wert ab, gilt der Track als Ausreißer.
+    :return: Indizes der Tracks mit abweichenden Track-Werten
+    """
+    cache = get_cache()
+    now = time.time()
+    disagree = set()
+    for i, track in enumerate(tracks):
+        if i in skip:
+            continue
+        for field, prefix in _ALBUM_FIELDS.items():
+            value = album.get(field)
+            if not value:
+                continue
+            key = f"{prefix}::{model}::{track.get('title', '')}::{track.get('artist', '')}"
+            existing = cache.get(key)
+            if isinstance(existing, dict) and existing.get("source") != "album":
+                if str(existing.get("value", "")).strip().lower() != value.lower():
+                    disagree.add(i)
+                continue
+            cache[key] = {"value": value, "ts": now, "source": "album"}
+    return disagree
+
+
+async def album_track_suggestions(album_title: str, album_artist: str, tracks: List[Dict[str, Any]], tagger=None, token: Optional[CancellationToken]=None) -> List[Dict[str, Optional[str]]]:
+    """
+    Album-Inferenz: ein Prompt pro Album, die Antwort wird direkt für alle Tracks übernommen
+    (und bei aktivem Cache als Prior gespeichert). Einzelne Track-Anfragen gibt es nur für Ausreißer (Compilations, von der KI genannte
+    oder vom Track-Cache abweichende Tracks).
+    :param album_title: Albumtitel
+    :param album_artist: Album-Künstler
+    :param tracks: Liste von Dicts mit 'title' und 'artist' (optional 'item_key')
+    :param tagger: (optional) Picard-Tagger-Objekt
+    :param token: (optional) Abbruch-Token
+    :return: Liste von Dicts mit 'genre', 'style', 'language_code' (gleiche Reihenfolge wie tracks)
+    """
+    settings = get_snapshot()
+    model = settings.ollama_model
+    outliers = set(range(len(tracks)))
+    album = None
+    if settings.album_inference and not is_compilation(album_artist, tracks):
+        album = await get_album_suggestion(album_title, album_artist, tracks, tagger, token)
+    if album is not None:
+        outliers = set(i for i in album.get("outliers", []) if 0 <= i < len(tracks))
+        if settings.enable_cache:
+            outliers |= _store_track_priors(model, album, tracks, outliers)
+            save_cache()
+        log_event("info", msg("Album-Inferenz", "Album inference"), album=album_title,
+                  tracks=len(tracks), outliers=len(outliers))
+    results: List[Dict[str, Optional[str]]] = []
+    for i, track in enumerate(tracks):
+        if token is not None and token.cancelled:
+            results.append({"genre": None, "style": None, "language_code": None})
+            continue
+        if album is not None and i not in outliers:
+            # Nicht-Ausreißer direkt aus der Album-Antwort, unabhängig vom Cache
+            results.append({"genre": album.get("genre"), "style": album.get("style"), "language_code": album.get("language")})
+            continue
+        child = token_for_item(track.get("item_key"), parent=token)
+        title, artist = track.get("title", ""), track.get("artist", "")
+        genre, style, lang = await asyncio.gather(
+            get_genre_suggestion(title, artist, tagger, token=child, settings=settings),
+            get_style_suggestion(title, artist, tagger, token=child, settings=settings),
+            get_language_code_suggestion(title, artist, tagger, token=child, settings=settings),
+        )
+        results.append({"genre": genre, "style": style, "language_code": lang})
+    return results
+
+
+# Noch nicht geladene Alben: höchstens so viele Versuche bzw. so lange warten
+_LOAD_RETRY_LIMIT = 10
+_LOAD_TIMEOUT = 300.0
+_LOAD_RETRY_MAX_DELAY = 30.0
+
+
+class AlbumPrefetcher:
+    """
+    Wärmt den Cache im Hintergrund für alle Tracks eines gerade geladenen Albums vor.
+    Titel, Künstler und Trackliste werden im Haupt-Thread kopiert, sobald das Album geladen ist;
+    der Prefetch-Thread greift nie auf Picard-Objekte zu. Er läuft mit niedriger Priorität:
+    ein Album nach dem anderen, und nur solange weder KI-Worker noch ein Batch laufen.
+    """
+    def __init__(self):
+        self._queue: "queue.Queue[Tuple[Dict[str, Any], CancellationToken]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, album: Any) -> None:
+        """
+        Plant den Prefetch für ein Picard-Album ein (im Haupt-Thread aufzurufen, z.B. aus einem Hook).
+        :param album: Picard-Album-Objekt
+        """
+        if not get_snapshot().album_prefetch:
+            return
+        run_when_loaded = getattr(album, "run_when_loaded", None)
+        if callable(run_when_loaded):
+            # Picard ruft den Callback im Haupt-Thread auf, sobald das Album fertig geladen ist
+            run_when_loaded(partial(self._queue_snapshot, album))
+        else:
+            self._check_loaded(album, time.monotonic(), 0)
+
+    @staticmethod
+    def _busy() -> bool:
+        """True, wenn interaktive KI-Arbeit läuft, die Vorrang hat."""
+        from .worker import active_ki_threads
+        return active_ki_threads() > 0 or model_lifecycle.batch_active
+
+    def _check_loaded(self, album: Any, queued_at: float, attempt: int) -> None:
+        """
+        Ohne run_when_loaded (ältere Picard-Versionen): wartet mit exponentiellem Backoff, bis das Album
+        geladen ist. Die Prüfung läuft im Haupt-Thread, der Timer blockiert keinen Thread.
+        """
+        if getattr(album, "loaded", True):
+            self._queue_snapshot(album)
+            return
+        if attempt >= _LOAD_RETRY_LIMIT or time.monotonic() - queued_at > _LOAD_TIMEOUT:
+            log_event("info", msg("Album-Prefetch verworfen, Album nicht geladen", "Album prefetch dropped, album not loaded"),
+                      album=getattr(album, "id", None), attempts=attempt)
+            return
+        delay = min(_LOAD_RETRY_MAX_DELAY, 0.5 * (2 ** attempt))
+        timer = threading.Timer(delay, _to_main, args=(self._check_loaded, album, queued_at, attempt + 1))
+        timer.daemon = True
+        timer.start()
+
+    def _queue_snapshot(self, album: Any) -> None:
+        """Kopiert die Album-Metadaten (im Haupt-Thread) und stellt sie in die Prefetch-Warteschlange."""
+        try:
+            metadata = getattr(album, "metadata", None)
+            job = {
+                "title": str(metadata["album"]) if metadata is not None else "",
+                "artist": str(metadata["albumartist"]) if metadata is not None else "",
+                "tracks": [
+                    {"title": str(t.metadata["title"]), "artist": str(t.metadata["artist"])}
+                    for t in getattr(album, "tracks", [])
+                ],
+            }
+        except Exception as e:
+            log_exception("Fehler beim Album-Prefetch", error=str(e))
+            return
+        if not job["title"] or not job["tracks"]:
+            return
+        # Token wird abgebrochen, wenn das Album geschlossen wird (worker._on_album_removed)
+        self._queue.put((job, token_for_item(getattr(album, "id", None))))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="aiid-album-prefetch", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job, token = self._queue.get()
+            try:
+                while self._busy() and not token.cancelled:
+                    time.sleep(1.0)
+                if token.cancelled:
+                    continue
+                asyncio.run(album_track_suggestions(job["title"], job["artist"], job["tracks"], token=token))
+                log_event("info", msg("Album vorab analysiert", "Album prefetched"), album=job["title"], tracks=len(job["tracks"]))
+            except Exception as e:
+                log_exception("Fehler beim Album-Prefetch", error=str(e))
+
+
+def _to_main(func: Any, *args: Any) -> None:
+    """Führt func im Haupt-Thread von Picard aus (ohne Picard direkt)."""
+    try:
+        from picard.util.thread import to_main
+    except ImportError:
+        func(*args)
+        return
+    to_main(func, *args)
+
+
+album_prefetcher = AlbumPrefetcher()
+
+
+def _on_album_loaded(api: Any, album: Any, metadata: Any, release: Any) -> None:
+    """Picard-Hook: Album-Metadaten geladen, Prefetch einplanen."""
+    album_prefetcher.enqueue(album)
+
+
+def _register_prefetch_hook() -> None:
+    """Registriert den Picard-Hook für geladene Alben (falls von der Picard-Version unterstützt)."""
+    try:
+        from picard.metadata import register_album_metadata_processor
+        register_album_metadata_processor(_on_album_loaded)
+    except Exception:
+        pass
+
+_register_prefetch_hook()
+
+__all__ = [
+    "is_compilation", "get_album_suggestion", "album_track_suggestions", "AlbumPrefetcher", "album_prefetcher"
+]
@@ -0,0 +1,138 @@
+# Streaming-Batch-Engine für AI Music Identifier Plugin
+#
+# Statt fester Batches, die per asyncio.gather aufeinander warten, hält die Engine ein
+# gleitendes Fenster laufender Requests gefüllt: Sobald ein Request fertig ist, wird sein
+# Ergebnis (mit Eingabe-Index) geliefert und der nächste Eintrag gestartet. Die Eingabe
+# wird erst bei Bedarf gelesen, der Speicherbedarf ist durch die Fenstergröße begrenzt.
+
+import asyncio
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Tuple, TypeVar, Union
+from .cancellation import CancellationToken
+from .config import SettingsSnapshot, get_snapshot
+from .logging import log_event, log_exception
+from .utils import msg
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class AdaptiveWindow:
+    """
+    Größe des Fensters gleichzeitiger Requests, angepasst an Antwortzeit und Fehler.
+    Nach jeweils "size" fertigen Requests wird verkleinert (Fehler oder langsam) bzw.
+    vergrößert (schnell) – wie die bisherige Batch-Größenanpassung, aber ohne Gleichschritt.
+    """
+    def __init__(self, minimum: int, maximum: int, start: int, slow_threshold: float, fast_threshold: float, step: int = 1):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.size = min(max(start, self.minimum), self.maximum)
+        self.slow_threshold = slow_threshold
+        self.fast_threshold = fast_threshold
+        self.step = step
+        self._completed = 0
+        self._errors = 0
+        self._elapsed = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: Optional[SettingsSnapshot] = None) -> "AdaptiveWindow":
+        """Erzeugt das Fenster aus den Batch-Einstellungen ("aiid_batch_*")."""
+        settings = settings or get_snapshot()
+        return cls(settings.batch_min_size, settings.batch_max_size, settings.batch_start_size,
+                   settings.batch_slow_threshold, settings.batch_fast_threshold, settings.batch_adjust_step)
+
+    def record(self, elapsed: float, error: bool) -> bool:
+        """
+        Meldet einen fertigen Request.
+        :param elapsed: Dauer in Sekunden
+        :param error: True bei Fehler
+        :return: True, wenn die Fenstergröße neu bewertet wurde
+        """
+        self._completed += 1
+        self._errors += int(error)
+        self._elapsed += elapsed
+        if self._completed < self.size:
+            return False
+        average = self._elapsed / self._completed
+        if self._errors > 0 or average > self.slow_threshold:
+            self.size = max(self.minimum, self.size - self.step)
+        elif average < self.fast_threshold:
+            self.size = min(self.maximum, self.size + self.step)
+        self._completed = 0
+        self._errors = 0
+        self._elapsed = 0.0
+        return True
+
+
+async def _aiter(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    if hasattr(items, "__aiter__"):
+        async for item in items:  # type: ignore[union-attr]
+            yield item
+    else:
+        for item in items:  # type: ignore[union-attr]
+            yield item
+
+
+async def stream_batch(
+    items: Union[Iterable[T], AsyncIterable[T]],
+    worker: Callable[[T], Awaitable[R]],
+    window: Optional[AdaptiveWindow] = None,
+    token: Optional[CancellationToken] = None,
+    is_error: Optional[Callable[[Any], bool]] = None,
+) -> AsyncIterator[Tuple[int, Optional[R]]]:
+    """
+    Verarbeitet beliebig viele (auch unendliche) Einträge mit einem gleitenden Fenster laufender Requests.
+    :param items: Eingabe (Iterable oder async Iterable), wird erst bei Bedarf gelesen
+    :param worker: Coroutine-Funktion für einen Eintrag
+    :param window: (optional) Fenstergröße, sonst aus den Batch-Einstellungen
+    :param token: (optional) Abbruch-Token; danach werden keine neuen Einträge mehr gestartet
+    :param is_error: (optional) Prüft, ob ein Ergebnis als Fehler zählt (für die Fensteranpassung)
+    :return: Async-Generator über (Eingabe-Index, Ergebnis) in Fertigstellungsreihenfolge;
+             None, wenn der Worker eine Ausnahme warf
+    """
+    window = window or AdaptiveWindow.from_settings()
+    source = _aiter(items)
+    pending: Dict["asyncio.Future[R]", Tuple[int, float]] = {}
+    index = 0
+    exhausted = False
+    done_count = 0
+    try:
+        while True:
+            # Fenster auffüllen
+            while not exhausted and len(pending) < window.size:
+                if token is not None and token.cancelled:
+                    log_event("info", msg("Batch abgebrochen", "Batch cancelled"), done=done_count, started=index)
+                    exhausted = True
+                    break
+                try:
+                    item = await source.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending[asyncio.ensure_future(worker(item))] = (index, time.monotonic())
+                index += 1
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                position, started = pending.pop(task)
+                try:
+                    result: Optional[R] = task.result()
+                    error = is_error is not None and is_error(result)
+                except Exception as e:
+                    log_exception(msg("Fehler im Batch-Worker", "Batch worker failed"), index=position, error=str(e))
+                    result, error = None, True
+                done_count += 1
+                if window.record(time.monotonic() - started, error):
+                    log_event("info", msg(
+                        f"Batch: {done_count} fertig, {len(pending)} laufend, Fenster: {window.size}",
+                        f"Batch: {done_count} done, {len(pending)} in flight, window: {window.size}"
+                    ))
+                yield position, result
+    finally:
+        # Consumer hat abgebrochen (aclose) oder Fehler: laufende Requests nicht verwaisen lassen
+        for task in pending:
+            task.cancel()
+
+
+__all__ = ["AdaptiveWindow", "stream_batch"]
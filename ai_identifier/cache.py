@@ -5,47 +5,68 @@ import os
 import json
 import time
 import logging
-from picard import config
 from .utils import show_error
+from .config import get_snapshot
+from .profiling import profiled, span
+from .cachefile import CacheFile, LazyCache
 import threading
-from typing import Optional, Dict, Any
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator
 from . import logging
 import logging as std_logging
 
-_aiid_cache = {}
+_aiid_cache = LazyCache()
 _cache_lock = threading.Lock()
+_save_lock = threading.Lock()
+# True, solange ein Speicher-Thread gestartet ist, aber noch keine Momentaufnahme genommen hat
+_save_pending = False
+# Anzahl laufender Export-/Import-Vorgänge, die die Cache-Datei lesen (geschützt durch _save_lock)
+_base_holds = 0
+
+# Negativ-Cache (nur im Speicher): kurzlebige Einträge für deterministische Fehler, z.B. unbekanntes Modell
+_negative_cache: Dict[str, Any] = {}
 
 # Speicherort für den Cache (z.B. im Picard-Config-Verzeichnis)
-_CACHE_PATH = os.path.expanduser("~/.config/MusicBrainz/Picard/aiid_cache.json")
+_CACHE_PATH = os.path.expanduser("~/.config/MusicBrainz/Picard/aiid_cache.bin")
+# Früheres JSON-Format, wird beim ersten Laden migriert
+_LEGACY_CACHE_PATH = os.path.expanduser("~/.config/MusicBrainz/Picard/aiid_cache.json")
+
+
+def _migrate_legacy_cache(expiry_sec: float) -> int:
+    """
+    Überführt die alte JSON-Cache-Datei einmalig in das Binärformat und benennt sie in *.migrated um.
+    :return: Anzahl übernommener Einträge
+    """
+    with open(_LEGACY_CACHE_PATH, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    now = time.time()
+    items = sorted(
+        (k.encode("utf-8"), v) for k, v in raw.items()
+        if isinstance(v, dict) and "ts" in v and (not expiry_sec or now - v["ts"] <= expiry_sec)
+    )
+    tmp_path = _CACHE_PATH + ".tmp"
+    count = CacheFile.write(tmp_path, items)
+    os.replace(tmp_path, _CACHE_PATH)
+    os.replace(_LEGACY_CACHE_PATH, _LEGACY_CACHE_PATH + ".migrated")
+    return count
 
-# Standard-Ablaufzeit für Cache (in Tagen)
-_DEFAULT_CACHE_EXPIRY_DAYS = 7
 
 def load_cache(tagger=None) -> None:
     """
-    Lädt den Cache aus der Cache-Datei und entfernt abgelaufene Einträge.
+    Öffnet die Cache-Datei. Sie wird nur gemappt, nicht geparst: Einträge werden erst beim Zugriff
+    dekodiert und abgelaufene Einträge beim Lesen übersprungen (beim nächsten Speichern entfernt).
     :param tagger: (optional) Picard-Tagger-Objekt für Fehlermeldungen
     """
-    global _aiid_cache
+    expiry_sec = get_snapshot().cache_expiry_days * 86400
     try:
+        if not os.path.exists(_CACHE_PATH) and os.path.exists(_LEGACY_CACHE_PATH):
+            migrated = _migrate_legacy_cache(expiry_sec)
+            std_logging.getLogger().info(f"AI Music Identifier: JSON-Cache mit {migrated} Einträgen ins Binärformat migriert.")
+        _aiid_cache.expiry_seconds = expiry_sec
         if os.path.exists(_CACHE_PATH):
-            with open(_CACHE_PATH, "r", encoding="utf-8") as f:
-                raw = json.load(f)
-                now = time.time()
-                expiry_days = int(config.setting["aiid_cache_expiry_days"] or _DEFAULT_CACHE_EXPIRY_DAYS) if "aiid_cache_expiry_days" in config.setting else _DEFAULT_CACHE_EXPIRY_DAYS
-                expiry_sec = expiry_days * 86400
-                with _cache_lock:
-                    _aiid_cache.clear()
-                    removed = 0
-                    for k, v in list(raw.items()):
-                        if isinstance(v, dict) and "ts" in v:
-                            if now - v["ts"] > expiry_sec:
-                                removed += 1  # abgelaufen
-                                continue
-                            _aiid_cache[k] = v
-                        else:
-                            continue
-                    std_logging.getLogger().info(f"AI Music Identifier: Cache geladen mit {len(_aiid_cache)} Einträgen, {removed} abgelaufene entfernt.")
+            with _cache_lock:
+                _aiid_cache.replace_base(_CACHE_PATH, _CACHE_PATH, {}, set())
+            std_logging.getLogger().info(f"AI Music Identifier: Cache geöffnet mit {_aiid_cache.base_count()} Einträgen (inkl. abgelaufener).")
         else:
             std_logging.getLogger().info("AI Music Identifier: Keine Cache-Datei gefunden, neuer Cache wird angelegt.")
     except Exception as e:
@@ -53,25 +74,93 @@ def load_cache(tagger=None) -> None:
         show_error(tagger, f"Cache konnte nicht geladen werden: {e}")
 
 
+@profiled("cache.save_cache")
 def save_cache() -> None:
     """
-    Speichert den aktuellen Cache asynchron in die Cache-Datei.
+    Speichert den aktuellen Cache asynchron in die Cache-Datei (abgelaufene Einträge werden dabei entfernt).
+    Geschrieben wird nur, wenn sich seit dem letzten Speichern etwas geändert hat; schnell aufeinander
+    folgende Aufrufe werden zu einem Schreibvorgang zusammengefasst.
     """
+    global _save_pending
+
     def _write_cache():
+        global _save_pending
         try:
-            with _cache_lock:
-                with open(_CACHE_PATH, "w", encoding="utf-8") as f:
-                    json.dump(_aiid_cache, f, ensure_ascii=False, indent=2)
-            std_logging.getLogger().info(f"AI Music Identifier: Cache erfolgreich gespeichert mit {len(_aiid_cache)} Einträgen.")
+            with span("cache.save_cache.write"), _save_lock:
+                with _cache_lock:
+                    # Änderungen ab hier landen in der Momentaufnahme oder starten einen neuen Thread
+                    _save_pending = False
+                if _base_holds or not _aiid_cache.dirty:
+                    # Während eines Exports/Imports bleibt die Datei gemappt; hold_base() speichert danach
+                    return
+                items, overlay, deleted = _aiid_cache.snapshot()
+                tmp_path = _CACHE_PATH + ".tmp"
+                count = CacheFile.write(tmp_path, items)
+                with _cache_lock:
+                    _aiid_cache.replace_base(tmp_path, _CACHE_PATH, overlay, deleted)
+            std_logging.getLogger().info(f"AI Music Identifier: Cache erfolgreich gespeichert mit {count} Einträgen.")
         except Exception as e:
             std_logging.getLogger().warning(f"AI Music Identifier: Konnte Cache nicht speichern: {e}")
+    with _cache_lock:
+        if _save_pending:
+            return
+        _save_pending = True
     threading.Thread(target=_write_cache, daemon=True).start()
 
 
-def get_cache() -> Dict[str, Any]:
+@contextmanager
+def hold_base() -> Iterator[LazyCache]:
     """
-    Gibt das aktuelle Cache-Objekt zurück (thread-sicher).
-    :return: Dictionary mit Cache-Inhalten
+    Hält die aktuelle Cache-Datei fest, solange eine Momentaufnahme gelesen wird (Export/Import).
+    Speichern wird so lange ausgesetzt und danach nachgeholt; Lese- und Schreibzugriffe auf den
+    Cache sind weiter möglich.
+    :return: Cache-Mapping
+    """
+    global _base_holds
+    with _save_lock:
+        _base_holds += 1
+    try:
+        yield _aiid_cache
+    finally:
+        with _save_lock:
+            _base_holds -= 1
+        if _aiid_cache.dirty:
+            save_cache()
+
+
+def get_cache() -> LazyCache:
+    """
+    Gibt das aktuelle Cache-Objekt zurück (thread-sicher, verhält sich wie ein Dict).
+    :return: Cache-Mapping
     """
     with _cache_lock:
         return _aiid_cache
+
+
+def get_negative(key: str) -> Optional[str]:
+    """
+    Gibt eine noch gültige Fehlermeldung aus dem Negativ-Cache zurück.
+    :param key: Schlüssel (z.B. "model::mistral")
+    :return: Fehlermeldung oder None
+    """
+    with _cache_lock:
+        entry = _negative_cache.get(key)
+        if entry is None:
+            return None
+        if time.time() >= entry["expires"]:
+            del _negative_cache[key]
+            return None
+        return entry["value"]
+
+
+def put_negative(key: str, message: str, ttl: Optional[float] = None) -> None:
+    """
+    Speichert eine deterministische Fehlermeldung kurzzeitig im Negativ-Cache.
+    :param key: Schlüssel (z.B. "model::mistral")
+    :param message: Fehlermeldung, die bis zum Ablauf direkt zurückgegeben wird
+    :param ttl: (optional) Lebensdauer in Sekunden, sonst "aiid_negative_cache_ttl"
+    """
+    if ttl is None:
+        ttl = get_snapshot().negative_cache_ttl
+    with _cache_lock:
+        _negative_cache[key] = {"value": message, "expires": time.time() + ttl}
@@ -0,0 +1,235 @@
+# Export, Import und Zusammenführen von Caches für AI Music Identifier Plugin
+#
+# Damit mehrere Arbeitsplätze KI-Antworten teilen können, wird der Cache als
+# JSON-Lines-Datei (optional gzip) nach Schlüssel sortiert exportiert. Beliebig viele
+# Exporte und Cache-Dateien werden per k-Wege-Merge über die sortierten Ströme
+# zusammengeführt; der Speicherbedarf hängt nicht von der Anzahl der Einträge ab.
+
+import gzip
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple, Union
+from . import cache
+from .cachefile import CacheFile, RawEntry
+from .config import get_snapshot
+from .logging import log_event, log_exception
+from .utils import msg
+
+# Binäre Cache-Dateien liefern RawEntry (kodiert), Exporte Wert-Dicts inkl. "ts"
+Entry = Tuple[bytes, Union[Dict[str, Any], RawEntry]]
+ProgressFn = Callable[[int], None]
+
+NEWEST = "newest"  # Eintrag mit dem jüngsten Zeitstempel gewinnt
+FIRST = "first"  # Eintrag der zuerst angegebenen Quelle gewinnt (z.B. lokaler Cache vor Import)
+_PROGRESS_EVERY = 10000
+
+
+def _open_text(path: str, mode: str, compressed: Optional[bool] = None):
+    if path.endswith(".gz") if compressed is None else compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _write_jsonl(path: str, entries: Iterable[Entry]) -> int:
+    """Schreibt Einträge als JSON-Lines über eine temporäre Datei (*.gz wird komprimiert)."""
+    count = 0
+    tmp_path = path + ".tmp"
+    with _open_text(tmp_path, "w", compressed=path.endswith(".gz")) as f:
+        for key, entry in entries:
+            value = entry.decode() if isinstance(entry, RawEntry) else entry
+            f.write(json.dumps({"k": key.decode("utf-8"), "v": value}, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def _model_of(key: bytes) -> str:
+    """Modellname aus einem Schlüssel der Form "feld::modell::..."."""
+    parts = key.split(b"::", 2)
+    return parts[1].decode("utf-8", "replace") if len(parts) > 2 else ""
+
+
+def _read_jsonl(path: str) -> Iterator[Entry]:
+    """Liest einen Export zeilenweise; die Schlüssel müssen aufsteigend sortiert sein."""
+    previous = b""
+    with _open_text(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = record["k"].encode("utf-8")
+            if key < previous:
+                raise ValueError(f"{path}:{number}: Schlüssel nicht sortiert")
+            previous = key
+            yield key, record["v"]
+
+
+def _read_cache_file(path: str) -> Iterator[Entry]:
+    """Liest eine binäre Cache-Datei in Schlüsselreihenfolge (Werte bleiben kodiert)."""
+    source = CacheFile(path)
+    try:
+        for i in range(len(source)):
+            yield source.key_bytes(i), source.raw(i)
+    finally:
+        source.close()
+
+
+def _read_legacy_json(path: str) -> Iterator[Entry]:
+    """Liest eine alte aiid_cache.json (wird vollständig geladen und sortiert)."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    yield from sorted((k.encode("utf-8"), v) for k, v in raw.items() if isinstance(v, dict))
+
+
+def read_source(path: str) -> Iterator[Entry]:
+    """
+    Öffnet eine Cache-Quelle anhand der Dateiendung.
+    :param path: Export (*.jsonl, *.jsonl.gz), binäre Cache-Datei (*.bin) oder alte aiid_cache.json
+    :return: Einträge in aufsteigender Schlüsselreihenfolge
+    """
+    if path.endswith((".jsonl", ".jsonl.gz")):
+        return _read_jsonl(path)
+    if path.endswith(".json"):
+        return _read_legacy_json(path)
+    return _read_cache_file(path)
+
+
+def _timestamp(entry: Union[Dict[str, Any], RawEntry]) -> float:
+    return entry.ts if isinstance(entry, RawEntry) else float(entry["ts"])
+
+
+def _filtered(entries: Iterable[Entry], prefixes: Optional[Sequence[str]], expiry_sec: float, now: float) -> Iterator[Entry]:
+    raw_prefixes = tuple(p.encode("utf-8") for p in prefixes or ())
+    for key, entry in entries:
+        if raw_prefixes and not key.startswith(raw_prefixes):
+            continue
+        if not isinstance(entry, RawEntry) and (not isinstance(entry, dict) or "ts" not in entry):
+            continue
+        if expiry_sec and now - _timestamp(entry) > expiry_sec:
+            continue
+        yield key, entry
+
+
+def _ranked(entries: Iterable[Entry], rank: int) -> Iterator[Tuple[bytes, int, Union[Dict[str, Any], RawEntry]]]:
+    for key, entry in entries:
+        yield key, rank, entry
+
+
+def merge_entries(sources: Sequence[Iterable[Entry]], prefixes: Optional[Sequence[str]] = None,
+                  policy: str = NEWEST, model_policies: Optional[Dict[str, str]] = None,
+                  progress: Optional[ProgressFn] = None) -> Iterator[Entry]:
+    """
+    Führt sortierte Eintragsströme per k-Wege-Merge zusammen.
+    :param sources: Eintragsströme in aufsteigender Schlüsselreihenfolge (Reihenfolge = Priorität bei FIRST)
+    :param prefixes: (optional) Nur Schlüssel mit einem dieser Präfixe, z.B. ("ki_genre::", "ki_style::")
+    :param policy: Konfliktlösung bei gleichem Schlüssel: NEWEST oder FIRST
+    :param model_policies: (optional) Abweichende Konfliktlösung pro Modell, z.B. {"llama3": FIRST}
+    :param progress: (optional) Callback mit der Anzahl bisher geschriebener Einträge
+    :return: Zusammengeführte Einträge in Schlüsselreihenfolge, ohne abgelaufene Einträge
+    """
+    expiry_sec = get_snapshot().cache_expiry_days * 86400
+    now = time.time()
+    tagged = [_ranked(_filtered(source, prefixes, expiry_sec, now), rank) for rank, source in enumerate(sources)]
+    written = 0
+    for key, group in itertools.groupby(heapq.merge(*tagged, key=lambda item: (item[0], item[1])), key=lambda item: item[0]):
+        candidates = list(group)
+        if len(candidates) == 1:
+            winner = candidates[0][2]
+        elif (model_policies or {}).get(_model_of(key), policy) == FIRST:
+            winner = candidates[0][2]  # nach Quell-Rang sortiert
+        else:
+            winner = max(candidates, key=lambda item: (_timestamp(item[2]), -item[1]))[2]
+        yield key, winner
+        written += 1
+        if progress is not None and written % _PROGRESS_EVERY == 0:
+            progress(written)
+    if progress is not None:
+        progress(written)
+
+
+def export_cache(path: str, prefixes: Optional[Sequence[str]] = None, progress: Optional[ProgressFn] = None) -> int:
+    """
+    Exportiert den lokalen Cache als sortierte JSON-Lines-Datei (*.gz wird komprimiert).
+    :param path: Zieldatei
+    :param prefixes: (optional) Nur Schlüssel mit diesen Präfixen
+    :param progress: (optional) Fortschritts-Callback
+    :return: Anzahl exportierter Einträge
+    """
+    with cache.hold_base() as local:
+        items, _, _ = local.snapshot()
+        count = _write_jsonl(path, merge_entries([items], prefixes, progress=progress))
+    log_event("info", msg("Cache exportiert", "Cache exported"), path=path, entries=count)
+    return count
+
+
+def merge_files(paths: Sequence[str], output: str, prefixes: Optional[Sequence[str]] = None,
+                policy: str = NEWEST, model_policies: Optional[Dict[str, str]] = None,
+                progress: Optional[ProgressFn] = None) -> int:
+    """
+    Führt mehrere Cache-Dateien/Exporte zu einer Datei zusammen, ohne den lokalen Cache zu ändern
+    (z.B. um einen gemeinsamen Cache für alle Arbeitsplätze zu erzeugen).
+    :param paths: Quellen (siehe read_source())
+    :param output: Zieldatei; *.jsonl/*.jsonl.gz als Export, sonst binäre Cache-Datei
+    :return: Anzahl geschriebener Einträge
+    """
+    merged = merge_entries([read_source(p) for p in paths], prefixes, policy, model_policies, progress)
+    if output.endswith((".jsonl", ".jsonl.gz")):
+        return _write_jsonl(output, merged)
+    tmp_path = output + ".tmp"
+    count = CacheFile.write(tmp_path, merged)
+    os.replace(tmp_path, output)
+    return count
+
+
+def import_caches(paths: Sequence[str], prefixes: Optional[Sequence[str]] = None,
+                  policy: str = NEWEST, model_policies: Optional[Dict[str, str]] = None,
+                  progress: Optional[ProgressFn] = None) -> int:
+    """
+    Übernimmt Einträge aus anderen Caches in den lokalen Cache. Der lokale Cache ist die erste
+    Quelle (gewinnt also bei FIRST). Das Ergebnis wird als neue Cache-Datei geschrieben und eingehängt.
+    :param paths: Quellen (siehe read_source())
+    :param prefixes: (optional) Nur importierte Schlüssel mit diesen Präfixen übernehmen
+    :return: Anzahl Einträge im neuen lokalen Cache
+    """
+    with cache.hold_base() as target:
+        local, overlay, deleted = target.snapshot()
+        imported = [_filtered(read_source(p), prefixes, 0, 0) for p in paths]
+        merged = merge_entries([local] + imported, None, policy, model_policies, progress)
+        tmp_path = cache._CACHE_PATH + ".import.tmp"
+        count = CacheFile.write(tmp_path, merged)
+        # Nur für den Austausch sperren; zwischenzeitliche Änderungen bleiben im Overlay
+        with cache._save_lock, cache._cache_lock:
+            target.replace_base(tmp_path, cache._CACHE_PATH, overlay, deleted)
+    log_event("info", msg("Cache importiert", "Cache imported"), sources=len(paths), entries=count)
+    return count
+
+
+def run_in_background(func: Callable[..., int], *args: Any, done: Optional[Callable[[Optional[int], Optional[Exception]], None]] = None, **kwargs: Any) -> threading.Thread:
+    """
+    Führt export_cache/merge_files/import_caches in einem Hintergrund-Thread aus, damit die UI nicht blockiert.
+    :param func: Auszuführende Funktion
+    :param done: (optional) Callback (Ergebnis, Fehler) nach Abschluss
+    :return: Gestarteter Thread
+    """
+    def _run() -> None:
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            log_exception(msg("Cache-Werkzeug fehlgeschlagen", "Cache tool failed"), tool=func.__name__, error=str(e))
+            if done is not None:
+                done(None, e)
+            return
+        if done is not None:
+            done(result, None)
+
+    thread = threading.Thread(target=_run, name=f"aiid-cache-{func.__name__}", daemon=True)
+    thread.start()
+    return thread
+
+
+__all__ = ["export_cache", "merge_files", "import_caches", "merge_entries", "read_source", "run_in_background", "NEWEST", "FIRST"]
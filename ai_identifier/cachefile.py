@@ -0,0 +1,340 @@
+# Binäres Cache-Format für AI Music Identifier Plugin
+#
+# Aufbau der Datei:
+#   Header  | Magic, Anzahl Einträge, Offset des Index
+#   Heap    | Schlüssel (UTF-8) und Werte (JSON); identische Werte stehen nur einmal im Heap
+#   Index   | ein Eintrag fester Länge pro Schlüssel, nach Schlüssel-Bytes sortiert:
+#             (Schlüssel-Offset, -Länge, Wert-Offset, -Länge, Zeitstempel)
+# Die Datei wird per mmap geöffnet; Lookups sind eine Binärsuche im Index, Werte
+# werden erst beim Zugriff dekodiert und abgelaufene Einträge beim Lesen übersprungen.
+
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+_MAGIC = b"AIIDC\x00\x01\x00"
+_HEADER = struct.Struct("<8sQQ")  # Magic, Anzahl, Index-Offset
+_ENTRY = struct.Struct("<QIQId")  # Schlüssel-Offset, -Länge, Wert-Offset, -Länge, Zeitstempel
+_MAX_SHARED_VALUES = 65536  # Obergrenze der Wert-Deduplizierung beim Schreiben (begrenzt den Speicher)
+
+
+class CacheFileError(Exception):
+    """Die Datei ist keine gültige Cache-Datei."""
+
+
+class RawEntry(NamedTuple):
+    """
+    Unveränderter Eintrag aus einer Cache-Datei: kodierter Wert (JSON ohne "ts") und Zeitstempel.
+    CacheFile.write() übernimmt die Bytes direkt, ohne sie zu dekodieren und neu zu kodieren.
+    """
+    blob: bytes
+    ts: float
+
+    def decode(self) -> Dict[str, Any]:
+        """Dekodiert den Eintrag (Wert-Dict inkl. "ts")."""
+        entry = json.loads(self.blob.decode("utf-8"))
+        entry["ts"] = self.ts
+        return entry
+
+
+# Eintrag beim Schreiben: Wert-Dict inkl. "ts" oder unverändert aus einer Cache-Datei
+Entry = Union[Dict[str, Any], RawEntry]
+
+
+class CacheFile:
+    """
+    Nur-lesender Zugriff auf eine binäre Cache-Datei über mmap.
+    Öffnen kostet unabhängig von der Größe nur das Lesen des Headers.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: Pfad zur Cache-Datei
+        :raises CacheFileError: bei ungültigem Header
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm: Optional[mmap.mmap] = None
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size < _HEADER.size:
+                raise CacheFileError(f"Datei zu kurz: {path}")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.count, self._index = _HEADER.unpack_from(self._mm, 0)
+            if magic != _MAGIC or self._index + self.count * _ENTRY.size > size:
+                raise CacheFileError(f"Ungültige Cache-Datei: {path}")
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int, float]:
+        return _ENTRY.unpack_from(self._mm, self._index + i * _ENTRY.size)
+
+    def key_bytes(self, i: int) -> bytes:
+        """Schlüssel des i-ten Index-Eintrags als UTF-8-Bytes."""
+        key_off, key_len = struct.unpack_from("<QI", self._mm, self._index + i * _ENTRY.size)
+        return self._mm[key_off:key_off + key_len]
+
+    def timestamp(self, i: int) -> float:
+        """Zeitstempel des i-ten Eintrags."""
+        return self._entry(i)[4]
+
+    def value(self, i: int) -> Dict[str, Any]:
+        """Dekodiert den i-ten Eintrag (Wert-Dict inkl. "ts")."""
+        return self.raw(i).decode()
+
+    def raw(self, i: int) -> RawEntry:
+        """Kodierter Wert und Zeitstempel des i-ten Eintrags (ohne JSON-Dekodierung)."""
+        _, _, val_off, val_len, ts = self._entry(i)
+        return RawEntry(self._mm[val_off:val_off + val_len], ts)
+
+    def lower_bound(self, key: bytes) -> int:
+        """Index des ersten Eintrags mit Schlüssel >= key (Binärsuche)."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, key: str) -> int:
+        """
+        Sucht einen Schlüssel.
+        :return: Index des Eintrags oder -1
+        """
+        raw = key.encode("utf-8")
+        i = self.lower_bound(raw)
+        if i < self.count and self.key_bytes(i) == raw:
+            return i
+        return -1
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    @staticmethod
+    def write(path: str, items: Iterable[Tuple[bytes, Entry]]) -> int:
+        """
+        Schreibt eine Cache-Datei.
+        :param path: Zielpfad
+        :param items: (Schlüssel-Bytes, Eintrag) in aufsteigender Schlüsselreihenfolge;
+                      RawEntry-Einträge werden unverändert kopiert
+        :return: Anzahl geschriebener Einträge
+        """
+        index = bytearray()
+        blobs: Dict[bytes, Tuple[int, int]] = {}
+        count = 0
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, 0, 0))
+            offset = _HEADER.size
+            for key, entry in items:
+                if isinstance(entry, RawEntry):
+                    blob, ts = entry
+                else:
+                    value = dict(entry)
+                    ts = float(value.pop("ts", 0.0) or 0.0)
+                    blob = json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+                f.write(key)
+                key_off = offset
+                offset += len(key)
+                location = blobs.get(blob)
+                if location is None:
+                    f.write(blob)
+                    location = (offset, len(blob))
+                    if len(blobs) < _MAX_SHARED_VALUES:
+                        blobs[blob] = location
+                    offset += len(blob)
+                index += _ENTRY.pack(key_off, len(key), location[0], location[1], ts)
+                count += 1
+            f.write(index)
+            f.seek(0)
+            f.write(_HEADER.pack(_MAGIC, count, offset))
+            f.flush()
+            os.fsync(f.fileno())
+        return count
+
+
+class LazyCache(MutableMapping):
+    """
+    Cache-Dict über einer binären Cache-Datei: gelesene und neue Einträge liegen in
+    einem Overlay im Speicher, alle übrigen bleiben in der gemappten Datei.
+    Einträge älter als die Ablaufzeit gelten als nicht vorhanden.
+    """
+    def __init__(self, base: Optional[CacheFile] = None, expiry_seconds: float = 0.0):
+        """
+        :param base: (optional) Geöffnete Cache-Datei
+        :param expiry_seconds: Ablaufzeit in Sekunden (0 = kein Ablauf)
+        """
+        self._lock = threading.RLock()
+        self._base = base
+        self._overlay: Dict[str, Any] = {}
+        self._deleted: Set[str] = set()
+        # Seit dem letzten Speichern geschriebene Schlüssel (gelesene Overlay-Einträge zählen nicht)
+        self._dirty: Set[str] = set()
+        self.expiry_seconds = expiry_seconds
+
+    def _live(self, i: int, now: float) -> bool:
+        return not self.expiry_seconds or now - self._base.timestamp(i) <= self.expiry_seconds
+
+    def _base_index(self, key: str) -> int:
+        if self._base is None or key in self._deleted:
+            return -1
+        i = self._base.find(key)
+        if i >= 0 and not self._live(i, time.time()):
+            return -1
+        return i
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            if key in self._overlay:
+                return self._overlay[key]
+            i = self._base_index(key)
+            if i < 0:
+                raise KeyError(key)
+            # Im Overlay ablegen, damit Änderungen am zurückgegebenen Dict erhalten bleiben
+            value = self._overlay[key] = self._base.value(i)
+            return value
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._overlay or (isinstance(key, str) and self._base_index(key) >= 0)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._overlay[key] = value
+            self._deleted.discard(key)
+            self._dirty.add(key)
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            present = key in self
+            self._overlay.pop(key, None)
+            self._dirty.discard(key)
+            if not present:
+                raise KeyError(key)
+            self._deleted.add(key)
+
+    def _base_keys(self, start: int = 0, prefix: bytes = b"") -> Iterator[Tuple[bytes, int]]:
+        if self._base is None:
+            return
+        now = time.time()
+        for i in range(start, len(self._base)):
+            raw = self._base.key_bytes(i)
+            if prefix and not raw.startswith(prefix):
+                return
+            if self._live(i, now):
+                yield raw, i
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            overlay = set(self._overlay)
+            deleted = set(self._deleted)
+            base = list(self._base_keys())
+        for raw, _ in base:
+            key = raw.decode("utf-8")
+            if key not in overlay and key not in deleted:
+                yield key
+        yield from overlay
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def keys_with_prefix(self, prefix: str) -> List[str]:
+        """
+        Gibt alle Schlüssel mit dem Präfix zurück (Bereichssuche im sortierten Index, ohne Vollscan).
+        :param prefix: Schlüssel-Präfix, z.B. "ki_cover::llava::"
+        :return: Liste der Schlüssel
+        """
+        raw_prefix = prefix.encode("utf-8")
+        with self._lock:
+            keys = [k for k in self._overlay if k.startswith(prefix)]
+            if self._base is not None:
+                seen = set(keys)
+                for raw, _ in self._base_keys(self._base.lower_bound(raw_prefix), raw_prefix):
+                    key = raw.decode("utf-8")
+                    if key not in seen and key not in self._deleted:
+                        keys.append(key)
+        return keys
+
+    @property
+    def dirty(self) -> bool:
+        """True, wenn seit dem letzten Speichern Einträge geschrieben oder gelöscht wurden."""
+        with self._lock:
+            return bool(self._dirty or self._deleted)
+
+    def base_count(self) -> int:
+        """Anzahl Einträge der Cache-Datei (inkl. abgelaufener, ohne Overlay)."""
+        return len(self._base) if self._base is not None else 0
+
+    def snapshot(self) -> Tuple[Iterator[Tuple[bytes, Entry]], Dict[str, Any], Set[str]]:
+        """
+        Momentaufnahme für das Speichern: alle gültigen Einträge nach Schlüssel-Bytes sortiert
+        (Datei und Overlay zusammengeführt, das Overlay hat Vorrang). Unter der Sperre wird nur das
+        Overlay kopiert; der Index der Datei wird erst beim Iterieren gelesen, ihre Einträge kommen
+        als RawEntry (ohne Dekodierung) zurück. Solange iteriert wird,
+        darf die Cache-Datei nicht ersetzt werden (siehe cache.hold_base()).
+        :return: (Einträge, Overlay-Stand, gelöschte Schlüssel) – die beiden letzten für replace_base()
+        """
+        with self._lock:
+            overlay = dict(self._overlay)
+            deleted = set(self._deleted)
+            base = self._base
+        new = sorted((k.encode("utf-8"), v) for k, v in overlay.items() if isinstance(v, dict))
+        expiry = self.expiry_seconds
+
+        def _from_base() -> Iterator[Tuple[bytes, Entry]]:
+            if base is None:
+                return
+            now = time.time()
+            for i in range(len(base)):
+                if expiry and now - base.timestamp(i) > expiry:
+                    continue
+                raw = base.key_bytes(i)
+                key = raw.decode("utf-8")
+                if key in overlay or key in deleted:
+                    continue
+                yield raw, base.raw(i)
+        return heapq.merge(_from_base(), iter(new), key=lambda item: item[0]), overlay, deleted
+
+    def replace_base(self, written_path: str, path: str, overlay: Dict[str, Any], deleted: Set[str]) -> None:
+        """
+        Ersetzt die Cache-Datei durch eine neu geschriebene und öffnet sie.
+        Die alte Datei wird vorher geschlossen (unter Windows lässt sich eine gemappte Datei nicht ersetzen).
+        :param written_path: Pfad der neu geschriebenen Datei
+        :param path: Zielpfad
+        :param overlay: Overlay-Stand aus snapshot(); unveränderte Einträge werden aus dem Speicher entfernt
+        :param deleted: Gelöschte Schlüssel aus snapshot()
+        """
+        with self._lock:
+            if self._base is not None:
+                self._base.close()
+                self._base = None
+            os.replace(written_path, path)
+            self._base = CacheFile(path)
+            self._deleted -= deleted
+            for key, value in overlay.items():
+                if self._overlay.get(key) is value:
+                    del self._overlay[key]
+                    self._dirty.discard(key)
+
+    def close(self) -> None:
+        """Schließt die Cache-Datei (der Overlay bleibt erhalten)."""
+        with self._lock:
+            if self._base is not None:
+                self._base.close()
+                self._base = None
+
+
+__all__ = ["CacheFile", "CacheFileError", "LazyCache", "RawEntry"]
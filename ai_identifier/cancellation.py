@@ -0,0 +1,184 @@
+# Abbruch- und Deadline-Logik für AI Music Identifier Plugin
+
+import asyncio
+import threading
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class RequestCancelled(Exception):
+    """
+    Wird ausgelöst, wenn ein KI-Request über sein Token abgebrochen wurde.
+    """
+
+
+class DeadlineExceeded(RequestCancelled):
+    """
+    Wird ausgelöst, wenn die Deadline eines KI-Requests abgelaufen ist.
+    """
+
+
+class CancellationToken:
+    """
+    Thread-sicheres Abbruch-Token mit optionaler Deadline.
+    Wird von Worker- und Batch-APIs bis zum HTTP-Request durchgereicht.
+    Ein Kind-Token gilt als abgebrochen, sobald sein Eltern-Token abgebrochen ist,
+    und übernimmt dessen Deadline, falls diese früher liegt.
+    """
+    def __init__(self, timeout: Optional[float] = None, parent: Optional["CancellationToken"] = None):
+        """
+        :param timeout: (optional) Deadline in Sekunden ab jetzt
+        :param parent: (optional) Eltern-Token (z.B. Token des gesamten Batches)
+        """
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self.parent = parent
+        self.deadline: Optional[float] = time.monotonic() + timeout if timeout else None
+        if parent is not None and parent.deadline is not None:
+            if self.deadline is None or parent.deadline < self.deadline:
+                self.deadline = parent.deadline
+
+    @property
+    def cancelled(self) -> bool:
+        """True, wenn das Token (oder ein Eltern-Token) abgebrochen oder die Deadline abgelaufen ist."""
+        if self._event.is_set() or self.expired:
+            return True
+        return self.parent.cancelled if self.parent is not None else False
+
+    @property
+    def expired(self) -> bool:
+        """True, wenn die Deadline abgelaufen ist."""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def remaining(self) -> Optional[float]:
+        """
+        Gibt die verbleibende Zeit bis zur Deadline zurück.
+        :return: Sekunden (mind. 0) oder None, wenn keine Deadline gesetzt ist
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self) -> None:
+        """Bricht das Token ab und benachrichtigt alle registrierten Callbacks."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Registriert einen Callback, der beim Abbruch (auch eines Eltern-Tokens) aufgerufen wird.
+        Ist das Token bereits abgebrochen, wird der Callback sofort aufgerufen.
+        :param callback: Funktion ohne Argumente
+        :return: Funktion zum Entfernen des Callbacks
+        """
+        with self._lock:
+            already = self._event.is_set()
+            if not already:
+                self._callbacks.append(callback)
+        if already:
+            callback()
+            return lambda: None
+        remove_parent = self.parent.register(callback) if self.parent is not None else None
+
+        def _remove() -> None:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+            if remove_parent is not None:
+                remove_parent()
+        return _remove
+
+
+async def run_cancellable(awaitable: Awaitable[Any], token: Optional[CancellationToken]) -> Any:
+    """
+    Führt ein Awaitable aus und bricht es ab, sobald das Token abgebrochen wird
+    oder seine Deadline abläuft (z.B. laufende Ollama-Streams).
+    Ist das Awaitable trotz Abbruch bereits fertig, wird sein Ergebnis zurückgegeben.
+    :param awaitable: Auszuführendes Awaitable
+    :param token: (optional) Abbruch-Token
+    :return: Ergebnis des Awaitables
+    """
+    if token is None:
+        return await awaitable
+    if token.cancelled:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded() if token.expired else RequestCancelled()
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(awaitable)
+    cancel_future = loop.create_future()
+
+    def _on_cancel() -> None:
+        def _set() -> None:
+            if not cancel_future.done():
+                cancel_future.set_result(None)
+        loop.call_soon_threadsafe(_set)
+
+    remove = token.register(_on_cancel)
+    try:
+        done, _ = await asyncio.wait(
+            {task, cancel_future}, timeout=token.remaining(), return_when=asyncio.FIRST_COMPLETED
+        )
+        if task in done:
+            return task.result()
+        task.cancel()
+        try:
+            return await task
+        except asyncio.CancelledError:
+            raise DeadlineExceeded() if token.expired else RequestCancelled()
+    finally:
+        remove()
+        if not cancel_future.done():
+            cancel_future.cancel()
+
+
+# Tokens je Picard-Objekt (Datei oder Album), damit entfernte Objekte ihre Requests abbrechen
+_item_tokens: Dict[str, "weakref.WeakSet[CancellationToken]"] = {}
+_item_lock = threading.Lock()
+
+
+def token_for_item(item_key: Optional[str], timeout: Optional[float] = None, parent: Optional[CancellationToken] = None) -> CancellationToken:
+    """
+    Erzeugt ein Token und verknüpft es mit einem Picard-Objekt.
+    :param item_key: Schlüssel des Objekts (z.B. Dateiname oder Album-ID), None = keine Verknüpfung
+    :param timeout: (optional) Deadline in Sekunden
+    :param parent: (optional) Eltern-Token
+    :return: Neues Abbruch-Token
+    """
+    token = CancellationToken(timeout=timeout, parent=parent)
+    if item_key:
+        with _item_lock:
+            _item_tokens.setdefault(item_key, weakref.WeakSet()).add(token)
+    return token
+
+
+def cancel_item(item_key: str) -> int:
+    """
+    Bricht alle Tokens ab, die mit einem Picard-Objekt verknüpft sind.
+    :param item_key: Schlüssel des Objekts
+    :return: Anzahl abgebrochener Tokens
+    """
+    with _item_lock:
+        tokens = list(_item_tokens.pop(item_key, ()))
+        for key in [k for k, v in _item_tokens.items() if not v]:
+            del _item_tokens[key]
+    for token in tokens:
+        token.cancel()
+    return len(tokens)
+
+
+__all__ = [
+    "CancellationToken", "RequestCancelled", "DeadlineExceeded",
+    "run_cancellable", "token_for_item", "cancel_item"
+]
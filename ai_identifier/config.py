@@ -1,8 +1,10 @@
 """
 Zentrale Konfigurationslogik für AI Music Identifier Plugin
 """
-from typing import Dict, Any, Optional
+from dataclasses import dataclass, fields
+from typing import Dict, Any, Optional, Tuple
 import re
+import threading
 
 try:
     from picard import config as picard_config  # type: ignore[import]
@@ -12,12 +14,63 @@ except ImportError:
 # Default-Konfiguration
 DEFAULTS = {
     "aiid_ollama_url": "http://localhost:11434",
+    "aiid_ollama_model": "mistral",
+    "aiid_enable_cache": True,
+    "aiid_cache_expiry_days": 7,  # Ablaufzeit der Cache-Einträge
+    "aiid_ollama_urls": [],  # Mehrere Ollama-Backends (leer = nur aiid_ollama_url)
+    "aiid_ollama_balance_strategy": "least_outstanding",  # oder "ewma"
+    "aiid_ollama_health_interval": 30,  # Sekunden zwischen Health-Checks (0 = aus)
+    "aiid_ollama_eject_after": 3,  # Fehler in Folge, nach denen ein Backend ausgeschlossen wird
+    "aiid_ollama_eject_seconds": 30,
+    "aiid_ollama_preload": True,  # Modell zu Beginn eines Batches vorladen
+    "aiid_ollama_keep_alive": "",  # keep_alive außerhalb von Batches (leer = Ollama-Default)
+    "aiid_ollama_keep_alive_batch": "30m",  # keep_alive während eines Batches
+    "aiid_ollama_cold_start_threshold": 1.0,  # Ladezeit (Sek.), ab der ein Request als Kaltstart gilt
     "aiid_ollama_timeout": 60,
     "aiid_ollama_max_parallel_requests": 3,  # Maximale gleichzeitige Ollama-Requests
+    "aiid_ollama_max_retries": 2,  # Wiederholungen bei Netzwerk-/Serverfehlern
+    "aiid_ollama_retry_backoff": 2.0,  # Basis des exponentiellen Backoffs in Sekunden
+    "aiid_ollama_min_parallel": 1,  # Adaptive Parallelität: Untergrenze pro Backend
+    "aiid_ollama_max_parallel": 10,  # Adaptive Parallelität: Obergrenze pro Backend
+    "aiid_ollama_adjust_threshold": 5,  # Anzahl Antworten, nach denen die Parallelität angepasst wird
+    "aiid_ollama_slow_threshold": 8.0,  # Mittlere Antwortzeit (Sek.), ab der die Parallelität sinkt
+    "aiid_ollama_min_attempt_seconds": 1.0,  # Mindestrestzeit der Deadline für einen weiteren Versuch
+    "aiid_ollama_ewma_alpha": 0.3,  # Glättungsfaktor der Antwortzeit pro Backend (Strategie "ewma")
+    "aiid_provider_mode": "live",  # "live", "record" (Antworten aufzeichnen) oder "replay" (Aufzeichnung wiedergeben)
+    "aiid_provider_record_file": "",  # Aufzeichnungsdatei für record/replay (*.jsonl.gz)
+    "aiid_provider_replay_time_scale": 1.0,  # Faktor für aufgezeichnete Antwortzeiten bei replay (0 = ohne Wartezeit)
+    "aiid_request_deadline": 300,  # Deadline pro KI-Request in Sekunden inkl. Retries (0 = keine)
     "aiid_openai_api_key": "",
     "aiid_huggingface_api_key": "",
     "aiid_acoustid_api_key": "",
+    "aiid_circuit_failure_threshold": 5,  # Fehler im Zeitfenster, ab denen der Circuit Breaker öffnet
+    "aiid_circuit_failure_window": 60,  # Zeitfenster in Sekunden
+    "aiid_circuit_open_seconds": 30,  # Dauer des offenen Zustands bis zum Probe-Request
+    "aiid_negative_cache_ttl": 60,  # Lebensdauer von Negativ-Cache-Einträgen in Sekunden
+    "aiid_album_inference": True,  # Ein Prompt pro Album, Antwort als Prior für alle Tracks
+    "aiid_album_prefetch": True,  # Cache für geladene Alben im Hintergrund vorwärmen
+    "aiid_album_compilation_ratio": 0.5,  # Anteil fremder Track-Künstler, ab dem ein Album als Compilation gilt
+    "aiid_batch_min_size": 2,  # Kleinstes Fenster gleichzeitiger Requests im Batch
+    "aiid_batch_max_size": 20,  # Größtes Fenster
+    "aiid_batch_start_size": 5,  # Startgröße des Fensters
+    "aiid_batch_slow_threshold": 8.0,  # Antwortzeit (Sek.), ab der das Fenster verkleinert wird
+    "aiid_batch_fast_threshold": 3.0,  # Antwortzeit (Sek.), unter der das Fenster vergrößert wird
+    "aiid_batch_adjust_step": 1,  # Schrittweite der Fensteranpassung
+    "aiid_postprocess_workers": 0,  # Prozesse für die Nachverarbeitung (0 = Anzahl CPU-Kerne, 1 = seriell)
+    "aiid_postprocess_min_tracks": 500,  # Ab dieser Trackzahl wird der Prozess-Pool genutzt
+    "aiid_postprocess_chunk_size": 64,  # Start-Chunkgröße, wird an die Kosten pro Track angepasst
+    "aiid_postprocess_target_chunk_ms": 50,  # Ziel-Rechenzeit pro Chunk
+    "aiid_ollama_vision_model": "llava",  # Bildfähiges Modell für die Cover-Analyse
+    "aiid_cover_phash_distance": 6,  # Max. Hamming-Distanz (0-7), ab der zwei Cover als gleich gelten
+    "aiid_undo_memory_mb": 32,  # Speicherbudget der Undo-Historie, ältere Gruppen werden ausgelagert
+    "aiid_undo_max_groups": 50,  # Maximale Anzahl Undo-Schritte
+    "aiid_workflow_history_limit": 1000,  # Maximale Einträge in WorkflowEngine.execution_history
+    "aiid_language_fast_path": False,  # Sprachcode lokal erkennen, LLM nur bei unsicherem Ergebnis (opt-in)
+    "aiid_language_min_confidence": 0.95,  # Konfidenz (0-1), ab der die lokale Erkennung ohne LLM gilt
     "aiid_debug_logging": False,
+    "aiid_profiling": False,  # Profiling-Modus: Stufen-Zeiten und Report pro Batch neben dem Plugin-Log
+    "aiid_profiling_snapshot_every": 0,  # cProfile/tracemalloc bei jedem N-ten Batch (0 = aus)
+    "aiid_profiling_top": 20,  # Anzahl Einträge in den Report-Toplisten
     # Weitere Optionen nach Bedarf
 }
 
@@ -46,6 +99,15 @@ def validate_config() -> Dict[str, str]:
     url = get_setting("aiid_ollama_url")
     if not url or not re.match(r"^https?://", str(url)):
         problems["aiid_ollama_url"] = "Ungültige oder fehlende Ollama-URL."
+    urls = get_setting("aiid_ollama_urls") or []
+    if isinstance(urls, str):
+        urls = urls.replace("\n", ",").split(",")
+    invalid = [u for u in urls if str(u).strip() and not re.match(r"^https?://", str(u).strip())]
+    if invalid:
+        problems["aiid_ollama_urls"] = f"Ungültige Ollama-URLs: {', '.join(invalid)}"
+    strategy = get_setting("aiid_ollama_balance_strategy")
+    if strategy not in ("least_outstanding", "ewma"):
+        problems["aiid_ollama_balance_strategy"] = "Unbekannte Lastverteilungs-Strategie (least_outstanding/ewma)."
     # Beispiel: OpenAI API-Key
     openai_key = get_setting("aiid_openai_api_key")
     if openai_key and not re.match(r"^sk-[A-Za-z0-9]{20,}$", openai_key):
@@ -90,3 +152,166 @@ def apply_profile(profile: str):
         return
     for key, value in PROFILES[profile].items():
         picard_config.setting[key] = value
+    refresh_snapshot()
+
+
+def _defaults_from_config(cls: type) -> type:
+    """
+    Setzt die Defaults der Snapshot-Felder aus DEFAULTS (in den annotierten Typ umgewandelt,
+    z.B. 30 → 30.0, [] → ()), damit jeder Default nur an einer Stelle steht.
+    :raises KeyError: wenn ein Feld keinen Eintrag in DEFAULTS hat
+    """
+    for name, kind in cls.__annotations__.items():
+        value = DEFAULTS[f"aiid_{name}"]
+        kind = getattr(kind, "__origin__", kind)
+        setattr(cls, name, tuple(value) if kind is tuple else kind(value))
+    return cls
+
+
+@dataclass(frozen=True)
+@_defaults_from_config
+class SettingsSnapshot:
+    """
+    Unveränderlicher, typisierter Schnappschuss aller Einstellungen des Request-Pfads.
+    Wird einmal geparst und validiert und nur bei Einstellungsänderungen in Picard neu erzeugt.
+    Feldname = Einstellungsschlüssel ohne "aiid_"-Präfix; die Defaults stammen aus DEFAULTS
+    (in den Feldtyp umgewandelt), der Default bestimmt den Typ.
+    """
+    ollama_url: str
+    ollama_urls: Tuple[str, ...]
+    ollama_model: str
+    ollama_timeout: int
+    ollama_max_parallel_requests: int
+    ollama_max_retries: int
+    ollama_retry_backoff: float
+    ollama_min_parallel: int
+    ollama_max_parallel: int
+    ollama_adjust_threshold: int
+    ollama_slow_threshold: float
+    ollama_min_attempt_seconds: float
+    ollama_balance_strategy: str
+    ollama_health_interval: float
+    ollama_eject_after: int
+    ollama_eject_seconds: float
+    ollama_ewma_alpha: float
+    ollama_preload: bool
+    ollama_keep_alive: str
+    ollama_keep_alive_batch: str
+    ollama_cold_start_threshold: float
+    request_deadline: float
+    provider_mode: str
+    provider_record_file: str
+    provider_replay_time_scale: float
+    circuit_failure_threshold: int
+    circuit_failure_window: float
+    circuit_open_seconds: float
+    negative_cache_ttl: float
+    enable_cache: bool
+    cache_expiry_days: int
+    debug_logging: bool
+    profiling: bool
+    profiling_snapshot_every: int
+    profiling_top: int
+    album_inference: bool
+    album_prefetch: bool
+    album_compilation_ratio: float
+    batch_min_size: int
+    batch_max_size: int
+    batch_start_size: int
+    batch_slow_threshold: float
+    batch_fast_threshold: float
+    batch_adjust_step: int
+    postprocess_workers: int
+    postprocess_min_tracks: int
+    postprocess_chunk_size: int
+    postprocess_target_chunk_ms: float
+    ollama_vision_model: str
+    cover_phash_distance: int
+    undo_memory_mb: float
+    undo_max_groups: int
+    workflow_history_limit: int
+    language_fast_path: bool
+    language_min_confidence: float
+
+    @classmethod
+    def from_settings(cls) -> "SettingsSnapshot":
+        """Liest und validiert alle Felder aus der Picard-Konfiguration (ungültige Werte → Default)."""
+        values = {f.name: _coerce(get_setting(f"aiid_{f.name}", f.default), f.default) for f in fields(cls)}
+        values["ollama_url"] = values["ollama_url"].rstrip("/")
+        values["ollama_urls"] = tuple(u.rstrip("/") for u in values["ollama_urls"]) or (values["ollama_url"],)
+        if values["ollama_balance_strategy"] not in ("least_outstanding", "ewma"):
+            values["ollama_balance_strategy"] = cls.ollama_balance_strategy
+        if values["provider_mode"] not in ("live", "record", "replay"):
+            values["provider_mode"] = cls.provider_mode
+        if values["batch_min_size"] < 1:
+            values["batch_min_size"] = cls.batch_min_size
+        values["batch_max_size"] = max(values["batch_min_size"], values["batch_max_size"])
+        values["batch_start_size"] = min(max(values["batch_start_size"], values["batch_min_size"]), values["batch_max_size"])
+        if values["cache_expiry_days"] <= 0:
+            # Wie bisher: 0 bzw. leer bedeutet Standard-Ablaufzeit, nicht "nie"
+            values["cache_expiry_days"] = cls.cache_expiry_days
+        values["language_min_confidence"] = min(1.0, values["language_min_confidence"])
+        values["ollama_min_parallel"] = max(1, values["ollama_min_parallel"])
+        values["ollama_max_parallel"] = max(values["ollama_min_parallel"], values["ollama_max_parallel"])
+        return cls(**values)
+
+
+def _coerce(raw: Any, default: Any) -> Any:
+    """Wandelt einen Rohwert in den Typ des Defaults um; ungültige oder negative Werte ergeben den Default."""
+    if raw is None:
+        return default
+    try:
+        if isinstance(default, bool):
+            return raw if isinstance(raw, bool) else str(raw).strip().lower() in ("1", "true", "yes", "on")
+        if isinstance(default, (int, float)):
+            value = type(default)(raw)
+            return value if value >= 0 else default
+        if isinstance(default, tuple):
+            if isinstance(raw, str):
+                raw = raw.replace("\n", ",").split(",")
+            return tuple(str(v).strip() for v in raw if str(v).strip())
+        return str(raw)
+    except (TypeError, ValueError):
+        return default
+
+
+_snapshot: Optional[SettingsSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot() -> SettingsSnapshot:
+    """Gibt den aktuellen Einstellungs-Schnappschuss zurück (wird beim ersten Zugriff erzeugt)."""
+    snapshot = _snapshot
+    if snapshot is None:
+        snapshot = refresh_snapshot()
+    return snapshot
+
+
+def refresh_snapshot() -> SettingsSnapshot:
+    """Erzeugt den Einstellungs-Schnappschuss neu (z.B. nach einer Änderung in Picard)."""
+    global _snapshot
+    snapshot = SettingsSnapshot.from_settings()
+    with _snapshot_lock:
+        _snapshot = snapshot
+    return snapshot
+
+
+def _on_setting_changed(name: str, old_value: Any = None, new_value: Any = None) -> None:
+    """Picard-Signal: eine Einstellung wurde geändert."""
+    if str(name).startswith("aiid_"):
+        refresh_snapshot()
+
+
+def _connect_setting_changed() -> None:
+    """Verbindet das setting_changed-Signal von Picard (falls von der Picard-Version angeboten)."""
+    if not picard_config:
+        return
+    try:
+        config_obj = picard_config.get_config() if hasattr(picard_config, "get_config") else None
+        signal = getattr(config_obj, "setting_changed", None) or getattr(getattr(picard_config, "setting", None), "setting_changed", None)
+        if signal is not None:
+            signal.connect(_on_setting_changed)
+    except Exception:
+        pass
+
+_connect_setting_changed()
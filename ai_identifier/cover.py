@@ -0,0 +1,180 @@
+# pyright: reportMissingImports=false
+# Cover-Analyse für AI Music Identifier Plugin
+#
+# Alle Tracks eines Albums tragen meist dasselbe eingebettete Cover. Bilder werden
+# deshalb zuerst exakt (SHA-1 der Bytes) und dann perzeptuell (dHash auf einem
+# verkleinerten Graustufenbild) zusammengefasst; jedes unterschiedliche Cover wird
+# nur einmal analysiert und das Ergebnis unter seinem Hash im Plugin-Cache abgelegt.
+
+import asyncio
+import base64
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from .cache import get_cache, save_cache
+from .cancellation import CancellationToken
+from .config import get_snapshot
+from .ki import call_ai_provider
+from .logging import log_event
+from .pooltasks import Image, hash_many, perceptual_hash
+from .postprocess import _get_executor, _reset_executor
+from .utils import msg
+
+_BANDS = 8  # 8 Bänder à 8 Bit: findet alle Paare mit Hamming-Distanz <= 7 über gleiche Bänder
+
+
+def exact_hash(data: bytes) -> str:
+    """SHA-1 der Bilddaten (erkennt byte-identische Cover)."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def hamming(a: int, b: int) -> int:
+    """Hamming-Distanz zweier Hashes."""
+    return bin(a ^ b).count("1")
+
+
+class CoverIndex:
+    """
+    Index für nahezu identische Cover: Multi-Index-Hashing über 8-Bit-Bänder,
+    damit nicht jedes Cover mit jedem verglichen werden muss.
+    """
+    def __init__(self, max_distance: int):
+        self.max_distance = min(max_distance, _BANDS - 1)
+        self._bands: List[Dict[int, List[int]]] = [{} for _ in range(_BANDS)]
+
+    @staticmethod
+    def _band_values(value: int) -> List[int]:
+        return [(value >> (i * 8)) & 0xFF for i in range(_BANDS)]
+
+    def find(self, value: int) -> Optional[int]:
+        """
+        Sucht einen bekannten Hash mit Distanz <= max_distance.
+        :return: Bekannter Hash oder None
+        """
+        best: Optional[Tuple[int, int]] = None
+        for band, part in zip(self._bands, self._band_values(value)):
+            for candidate in band.get(part, ()):
+                distance = hamming(value, candidate)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+        return best[1] if best is not None else None
+
+    def add(self, value: int) -> None:
+        """Fügt einen Hash zum Index hinzu."""
+        for band, part in zip(self._bands, self._band_values(value)):
+            band.setdefault(part, []).append(value)
+
+
+# Ein Index pro (Vision-Modell, Distanz): einmal aus dem Cache aufgebaut, danach nur ergänzt
+_indexes: Dict[Tuple[str, int], CoverIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _cover_index(model: str, max_distance: int, use_cache: bool) -> CoverIndex:
+    """
+    Gibt den Index der bekannten Cover-Hashes eines Modells zurück. Beim ersten Zugriff wird er
+    einmalig aus den Cache-Schlüsseln aufgebaut (Bereichssuche), danach nicht mehr neu gelesen.
+    """
+    with _indexes_lock:
+        index = _indexes.get((model, max_distance))
+        if index is None:
+            index = _indexes[(model, max_distance)] = CoverIndex(max_distance)
+            if use_cache:
+                prefix = f"ki_cover::{model}::p:"
+                for key in get_cache().keys_with_prefix(prefix):
+                    index.add(int(key[len(prefix):], 16))
+        return index
+
+
+def _cover_key(model: str, phash: Optional[int], sha1: str) -> str:
+    if phash is not None:
+        return f"ki_cover::{model}::p:{phash:016x}"
+    return f"ki_cover::{model}::s:{sha1}"
+
+
+async def _compute_phashes(blobs: List[bytes]) -> List[Optional[int]]:
+    """Verteilt die perzeptuellen Hashes auf den Worker-Pool (Fallback: Thread), ohne die Event-Loop zu blockieren."""
+    if Image is None or not blobs:
+        return [None] * len(blobs)
+    settings = get_snapshot()
+    workers = settings.postprocess_workers or (os.cpu_count() or 1)
+    loop = asyncio.get_running_loop()
+    if workers > 1 and len(blobs) > 1:
+        try:
+            executor = _get_executor(workers)
+            step = max(1, len(blobs) // workers)
+            chunks = await asyncio.gather(*(loop.run_in_executor(executor, hash_many, blobs[i:i + step]) for i in range(0, len(blobs), step)))
+            return [h for chunk in chunks for h in chunk]
+        except Exception as e:
+            log_event("warning", msg("Worker-Pool für Cover-Hashes nicht nutzbar", "Worker pool for cover hashes unavailable"), error=str(e))
+            _reset_executor()
+    return await loop.run_in_executor(None, hash_many, blobs)
+
+
+async def analyze_covers(covers: Sequence[Optional[bytes]], tagger=None, token: Optional[CancellationToken]=None) -> List[Optional[str]]:
+    """
+    Analysiert viele Cover, wobei identische und nahezu identische Bilder nur einmal analysiert werden.
+    :param covers: Bilddaten pro Track (None = kein Cover)
+    :param tagger: (optional) Picard-Tagger-Objekt
+    :param token: (optional) Abbruch-Token
+    :return: Analyseergebnis pro Track (gleiche Reihenfolge)
+    """
+    settings = get_snapshot()
+    model = settings.ollama_vision_model
+    # 1. Exakte Duplikate zusammenfassen
+    by_sha1: Dict[str, bytes] = {}
+    track_sha1: List[Optional[str]] = []
+    for data in covers:
+        if not data:
+            track_sha1.append(None)
+            continue
+        digest = exact_hash(data)
+        by_sha1.setdefault(digest, data)
+        track_sha1.append(digest)
+    digests = list(by_sha1)
+    # 2. Perzeptuelle Hashes nur für unterschiedliche Bilder
+    phashes = dict(zip(digests, await _compute_phashes([by_sha1[d] for d in digests])))
+    # 3. Nahezu identische Cover auf einen Repräsentanten abbilden (inkl. bereits gecachter Cover)
+    index = _cover_index(model, settings.cover_phash_distance, settings.enable_cache)
+    representative: Dict[str, str] = {}
+    for digest in digests:
+        phash = phashes[digest]
+        if phash is not None:
+            with _indexes_lock:
+                known = index.find(phash)
+                if known is None:
+                    index.add(phash)
+                    known = phash
+            phashes[digest] = known
+        representative[digest] = _cover_key(model, phashes[digest], digest)
+    # 4. Jede Cover-Gruppe einmal analysieren (Cache zuerst)
+    cache = get_cache()
+    results_by_key: Dict[str, Optional[str]] = {}
+    analysed = 0
+    for digest in digests:
+        key = representative[digest]
+        if key in results_by_key:
+            continue
+        cached = cache.get(key)
+        if settings.enable_cache and isinstance(cached, dict):
+            results_by_key[key] = cached["value"]
+            continue
+        image_b64 = base64.b64encode(by_sha1[digest]).decode("ascii")
+        result = await call_ai_provider(
+            "Beschreibe dieses Albumcover in einem Satz: Stil, Stimmung, Farben und das dazu passende Musikgenre.",
+            model, tagger, token=token, settings=settings, images=[image_b64]
+        )
+        analysed += 1
+        results_by_key[key] = result
+        if settings.enable_cache and result and "Fehler" not in result:
+            cache[key] = {"value": result, "ts": time.time()}
+    if analysed and settings.enable_cache:
+        save_cache()
+    log_event("info", msg("Cover-Analyse", "Cover analysis"), tracks=len(covers),
+              distinct_exact=len(digests), distinct_groups=len(results_by_key), analysed=analysed)
+    return [results_by_key.get(representative[d]) if d is not None else None for d in track_sha1]
+
+
+__all__ = ["analyze_covers", "exact_hash", "perceptual_hash", "hamming", "CoverIndex"]
@@ -0,0 +1,464 @@
+# Undo/Redo-Journal für AI Music Identifier Plugin
+#
+# Speichert pro Änderung nur (Item, Feld, alter Wert, neuer Wert) statt Kopien der
+# Metadaten. Änderungen eines Batches bilden eine Gruppe, die als Ganzes rückgängig
+# gemacht wird. Ältere Gruppen werden bei Überschreiten des Speicherbudgets auf die
+# Platte ausgelagert und erst beim Undo wieder geladen.
+
+import atexit
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from .config import get_snapshot
+from .logging import log_event
+from .utils import msg
+
+# Ablage für ausgelagerte Undo-Gruppen (neben Cache und Log)
+_SPILL_DIR = os.path.expanduser("~/.config/MusicBrainz/Picard")
+
+# Callback zum Anwenden eines Werts: (item_id, field, value); value None = Tag entfernen
+ApplyFn = Callable[[str, str, Any], None]
+
+
+def _intern(value: Any) -> Any:
+    """Interniert Strings (auch in Listen), damit wiederkehrende Werte wie Genres nur einmal im Speicher liegen."""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(sys.intern(v) if isinstance(v, str) else v for v in value)
+    return value
+
+
+class ChangeRecord:
+    """Eine Feldänderung an einem Item (z.B. Dateipfad eines Tracks)."""
+    __slots__ = ("item_id", "field", "old", "new")
+
+    def __init__(self, item_id: str, field: str, old: Any, new: Any):
+        self.item_id = item_id
+        self.field = field
+        self.old = old
+        self.new = new
+
+    def __getstate__(self) -> Tuple[str, str, Any, Any]:
+        return self.item_id, self.field, self.old, self.new
+
+    def __setstate__(self, state: Tuple[str, str, Any, Any]) -> None:
+        self.item_id, self.field, self.old, self.new = state
+
+    def __repr__(self) -> str:
+        return f"ChangeRecord({self.item_id!r}, {self.field!r}, {self.old!r} -> {self.new!r})"
+
+
+_RECORD_OVERHEAD = sys.getsizeof(ChangeRecord("", "", None, None)) + 8  # + Listenplatz
+
+
+def _estimate_size(value: Any) -> int:
+    """Grobe Speicherschätzung eines Werts; kurze (internierte, geteilte) Strings zählen nicht."""
+    if value is None or (isinstance(value, str) and len(value) <= 64):
+        return 0
+    return sys.getsizeof(value)
+
+
+class _Group:
+    """Eine Undo-Gruppe; records ist None, solange sie ausgelagert ist."""
+    __slots__ = ("label", "timestamp", "records", "size", "offset", "length", "nbytes")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.timestamp = time.time()
+        self.records: Optional[List[ChangeRecord]] = []
+        self.size = 0
+        self.offset = -1
+        self.length = 0
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        return self.length if self.records is None else len(self.records)
+
+
+class ChangeJournal:
+    """
+    Journal für gruppierte Undo/Redo-Operationen auf Tag-Änderungen.
+    Undo und Redo kosten O(Anzahl Änderungen der Gruppe). Innerhalb einer offenen Gruppe
+    werden mehrfache Änderungen desselben Felds zu einem Eintrag zusammengefasst.
+    Budget und Tiefe: "aiid_undo_memory_mb" und "aiid_undo_max_groups".
+    """
+    def __init__(self, spill_dir: Optional[str] = None):
+        """
+        :param spill_dir: (optional) Verzeichnis für die Auslagerungsdatei
+        """
+        self._lock = threading.RLock()
+        self._undo: Deque[_Group] = deque()
+        self._redo: List[_Group] = []
+        self._current: Optional[_Group] = None
+        self._current_index: Dict[Tuple[str, str], int] = {}
+        self._depth = 0
+        self._memory = 0
+        self._spill_dir = spill_dir or _SPILL_DIR
+        self._spill_path: Optional[str] = None
+        self._spill_file = None
+        self._spilled = 0
+        self._spill_dead = 0
+
+    # Gruppen
+
+    def begin_group(self, label: str = "") -> None:
+        """
+        Öffnet eine Undo-Gruppe (verschachtelte Aufrufe landen in der äußeren Gruppe).
+        :param label: Beschreibung, z.B. "KI-Batch (120 Tracks)"
+        """
+        with self._lock:
+            self._depth += 1
+            if self._depth == 1:
+                self._current = _Group(label)
+                self._current_index = {}
+
+    def end_group(self) -> None:
+        """Schließt die Undo-Gruppe; leere Gruppen werden verworfen."""
+        with self._lock:
+            if self._depth == 0:
+                return
+            self._depth -= 1
+            if self._depth > 0:
+                return
+            group, self._current = self._current, None
+            self._current_index = {}
+            if group is not None and group.records:
+                self._push(group)
+
+    @contextmanager
+    def group(self, label: str = "") -> Iterator["ChangeJournal"]:
+        """Kontextmanager für begin_group()/end_group()."""
+        self.begin_group(label)
+        try:
+            yield self
+        finally:
+            self.end_group()
+
+    # Aufzeichnen
+
+    def record(self, item_id: str, field: str, old: Any, new: Any) -> None:
+        """
+        Zeichnet eine Feldänderung auf. Außerhalb einer Gruppe bildet sie eine eigene Gruppe.
+        :param item_id: Kennung des Items (z.B. Dateipfad)
+        :param field: Tag-Name
+        :param old: Alter Wert (None = Tag war nicht gesetzt)
+        :param new: Neuer Wert (None = Tag entfernt)
+        """
+        old, new = _intern(old), _intern(new)
+        if old == new:
+            return
+        with self._lock:
+            standalone = self._depth == 0
+            if standalone:
+                self.begin_group(field)
+            group = self._current
+            key = (sys.intern(str(item_id)), sys.intern(field))
+            index = self._current_index.get(key)
+            if index is not None:
+                # Feld wurde in dieser Gruppe schon geändert: ursprünglichen alten Wert behalten
+                existing = group.records[index]
+                group.size += _estimate_size(new) - _estimate_size(existing.new)
+                existing.new = new
+            else:
+                self._current_index[key] = len(group.records)
+                group.records.append(ChangeRecord(key[0], key[1], old, new))
+                group.size += _RECORD_OVERHEAD + _estimate_size(old) + _estimate_size(new)
+            if standalone:
+                self.end_group()
+
+    # Undo/Redo
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo(self, apply: ApplyFn) -> int:
+        """
+        Macht die letzte Gruppe rückgängig (Änderungen in umgekehrter Reihenfolge).
+        :param apply: Callback, der einen Wert setzt
+        :return: Anzahl zurückgesetzter Felder (0, wenn nichts rückgängig zu machen ist)
+        """
+        with self._lock:
+            if not self._undo:
+                return 0
+            group = self._undo.pop()
+            self._load(group)
+            self._reclaim_spill()
+            self._memory -= group.size if group.offset < 0 else 0
+            for record in reversed(group.records):
+                apply(record.item_id, record.field, record.old)
+            self._redo.append(group)
+        log_event("info", msg("Undo", "Undo"), group=group.label, changes=len(group))
+        return len(group)
+
+    def redo(self, apply: ApplyFn) -> int:
+        """
+        Stellt die zuletzt rückgängig gemachte Gruppe wieder her.
+        :param apply: Callback, der einen Wert setzt
+        :return: Anzahl wiederhergestellter Felder
+        """
+        with self._lock:
+            if not self._redo:
+                return 0
+            group = self._redo.pop()
+            for record in group.records:
+                apply(record.item_id, record.field, record.new)
+            group.offset = -1
+            self._push(group, clear_redo=False)
+        log_event("info", msg("Redo", "Redo"), group=group.label, changes=len(group))
+        return len(group)
+
+    def history(self) -> List[Tuple[str, float, int]]:
+        """
+        Gibt die Undo-Gruppen (älteste zuerst) zurück.
+        :return: Liste von (Beschreibung, Zeitstempel, Anzahl Änderungen)
+        """
+        with self._lock:
+            return [(g.label, g.timestamp, len(g)) for g in self._undo]
+
+    def memory_usage(self) -> int:
+        """Geschätzter Speicherbedarf der nicht ausgelagerten Gruppen in Bytes."""
+        return self._memory
+
+    def clear(self) -> None:
+        """Verwirft die gesamte Historie und die Auslagerungsdatei."""
+        with self._lock:
+            self._undo.clear()
+            self._redo.clear()
+            self._memory = 0
+            self._spilled = 0
+            self._close_spill()
+
+    # Intern
+
+    def _push(self, group: _Group, clear_redo: bool = True) -> None:
+        settings = get_snapshot()
+        if clear_redo:
+            self._redo.clear()
+        self._undo.append(group)
+        self._memory += group.size
+        while len(self._undo) > max(1, settings.undo_max_groups):
+            dropped = self._undo.popleft()
+            if dropped.records is not None:
+                self._memory -= dropped.size
+            else:
+                self._spilled -= 1
+                self._spill_dead += dropped.nbytes
+        if self._spilled == 0:
+            self._close_spill()
+        else:
+            self._reclaim_spill()
+        budget = int(settings.undo_memory_mb * 1024 * 1024)
+        # Älteste Gruppen auslagern, die neueste bleibt immer im Speicher
+        for old_group in list(self._undo)[:-1]:
+            if self._memory <= budget:
+                break
+            if old_group.records is not None:
+                self._spill(old_group)
+
+    def _spill(self, group: _Group) -> None:
+        try:
+            if self._spill_file is None:
+                os.makedirs(self._spill_dir, exist_ok=True)
+                fd, self._spill_path = tempfile.mkstemp(prefix="aiid_undo_", suffix=".spill", dir=self._spill_dir)
+                self._spill_file = os.fdopen(fd, "w+b")
+            data = pickle.dumps(group.records, protocol=pickle.HIGHEST_PROTOCOL)
+            self._spill_file.seek(0, os.SEEK_END)
+            group.offset = self._spill_file.tell()
+            group.length = len(group.records)
+            group.nbytes = len(data)
+            self._spill_file.write(data)
+            self._spill_file.flush()
+        except OSError as e:
+            log_event("warning", msg("Undo-Historie konnte nicht ausgelagert werden", "Could not spill undo history to disk"), error=str(e))
+            group.offset = -1
+            return
+        self._memory -= group.size
+        self._spilled += 1
+        group.records = None
+
+    def _load(self, group: _Group) -> None:
+        if group.records is not None:
+            return
+        self._spill_file.seek(group.offset)
+        group.records = pickle.load(self._spill_file)
+        self._spilled -= 1
+        self._spill_dead += group.nbytes
+
+    def _reclaim_spill(self) -> None:
+        """Kürzt die Auslagerungsdatei: leer, wenn nichts mehr ausgelagert ist, sonst Kompaktierung,
+        sobald mehr als die Hälfte aus geladenen/verworfenen Gruppen besteht."""
+        if self._spill_file is None:
+            return
+        try:
+            if self._spilled == 0:
+                self._spill_file.seek(0)
+                self._spill_file.truncate()
+                self._spill_dead = 0
+                return
+            total = self._spill_file.seek(0, os.SEEK_END)
+            if self._spill_dead * 2 <= total:
+                return
+            # Lebende Gruppen nach vorne kopieren (Offsets sind aufsteigend, Ziel <= Quelle)
+            live = sorted((g for g in self._undo if g.records is None), key=lambda g: g.offset)
+            position = 0
+            for group in live:
+                self._spill_file.seek(group.offset)
+                data = self._spill_file.read(group.nbytes)
+                self._spill_file.seek(position)
+                self._spill_file.write(data)
+                group.offset = position
+                position += len(data)
+            self._spill_file.truncate(position)
+            self._spill_file.flush()
+            self._spill_dead = 0
+        except OSError as e:
+            log_event("warning", msg("Undo-Auslagerungsdatei konnte nicht gekürzt werden", "Could not compact undo spill file"), error=str(e))
+
+    def _close_spill(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        if self._spill_path is not None:
+            try:
+                os.remove(self._spill_path)
+            except OSError:
+                pass
+            self._spill_path = None
+        self._spill_dead = 0
+
+
+def _as_list(value: Any) -> Optional[List[Any]]:
+    """Normalisiert einen Tag-Wert für den Vergleich: None bleibt None, Einzelwerte werden zur Liste."""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return list(value) or None
+    return [value]
+
+
+class JournaledMetadata:
+    """
+    Hülle um ein Metadaten-Objekt, die jede Änderung im Journal aufzeichnet
+    (z.B. für Aktionen von Workflow-Regeln): Zuweisung und Löschen sowie die ändernden
+    Methoden von Picard-Metadaten (set, add, add_unique, delete, unset, update).
+    Alle anderen Zugriffe gehen an das Original.
+    """
+    def __init__(self, metadata: Any, journal: ChangeJournal, item_id: str):
+        self._metadata = metadata
+        self._journal = journal
+        self._item_id = item_id
+
+    def __getitem__(self, key: str) -> Any:
+        return self._metadata[key]
+
+    def _values(self, key: str) -> Any:
+        """Aktueller Wert eines Tags; bei Picard-Metadaten alle Werte (getall), damit Undo mehrwertige Tags vollständig wiederherstellt."""
+        if key not in self._metadata:
+            return None
+        getall = getattr(self._metadata, "getall", None)
+        if getall is not None:
+            return list(getall(key)) or None
+        return self._metadata[key]
+
+    @contextmanager
+    def _recording(self, keys: Iterable[str]) -> Iterator[None]:
+        """Merkt sich die Werte der Tags vor der Änderung und zeichnet danach nur tatsächliche Änderungen auf."""
+        before = {key: self._values(key) for key in dict.fromkeys(keys)}
+        yield
+        # Mehrere Tags einer Methode (update) bilden außerhalb einer Gruppe eine gemeinsame Gruppe
+        with self._journal.group(self._item_id):
+            for key, old in before.items():
+                new = self._values(key)
+                if _as_list(old) != _as_list(new):
+                    self._journal.record(self._item_id, key, old, new)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        with self._recording((key,)):
+            self._metadata[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        with self._recording((key,)):
+            del self._metadata[key]
+
+    def set(self, name: str, values: Any) -> None:
+        with self._recording((name,)):
+            self._metadata.set(name, values)
+
+    def add(self, name: str, value: Any) -> None:
+        with self._recording((name,)):
+            self._metadata.add(name, value)
+
+    def add_unique(self, name: str, value: Any) -> None:
+        with self._recording((name,)):
+            self._metadata.add_unique(name, value)
+
+    def delete(self, name: str) -> None:
+        with self._recording((name,)):
+            self._metadata.delete(name)
+
+    def unset(self, name: str) -> None:
+        with self._recording((name,)):
+            self._metadata.unset(name)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        # Iteratoren von Paaren nur einmal lesen
+        args = tuple(other if hasattr(other, "keys") else dict(other) for other in args)
+        keys: List[str] = list(kwargs)
+        for other in args:
+            keys.extend(other.keys())
+            # Picard-Metadaten übertragen auch gelöschte Tags
+            keys.extend(getattr(other, "deleted_tags", ()))
+        with self._recording(keys):
+            self._metadata.update(*args, **kwargs)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._metadata
+
+    def __iter__(self):
+        return iter(self._metadata)
+
+    def __len__(self) -> int:
+        return len(self._metadata)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._metadata, name)
+
+
+def picard_apply(tagger: Any) -> ApplyFn:
+    """
+    Erzeugt einen Apply-Callback, der Werte in die geladenen Picard-Dateien schreibt.
+    Item-Kennung ist der Dateiname (Schlüssel in tagger.files).
+    :param tagger: Picard-Tagger-Objekt
+    :return: Callback für undo()/redo()
+    """
+    def apply(item_id: str, field: str, value: Any) -> None:
+        file = tagger.files.get(item_id) if tagger is not None else None
+        if file is None:
+            return
+        if value is None:
+            if field in file.metadata:
+                del file.metadata[field]
+        else:
+            file.metadata[field] = list(value) if isinstance(value, tuple) else value
+        file.update()
+    return apply
+
+
+# Globales Journal für Batch-Änderungen
+change_journal = ChangeJournal()
+atexit.register(change_journal.clear)
+
+
+__all__ = ["ChangeRecord", "ChangeJournal", "JournaledMetadata", "picard_apply", "change_journal"]
@@ -10,14 +10,23 @@ import difflib
 import os
 import requests
 from PyQt6 import QtWidgets
-from typing import Optional
+from typing import List, Optional
 import asyncio
-from .providers.ollama import call_ollama as async_call_ollama
+from .providers.base import AIProviderBase
+from .providers.ollama import ollama_provider
+from .providers.lifecycle import model_lifecycle
+from .providers.registry import model_registry
+from .providers.replay import active_provider
 from .logging import log_event, log_exception
-from .utils import msg
+from .utils import msg, aggregated_errors
+from .cancellation import CancellationToken, token_for_item
+from .config import SettingsSnapshot, get_snapshot
+from .profiling import profiled
+from .batch import AdaptiveWindow, stream_batch
+from .langdetect import LanguageGuess, detect_language, language_stats
 
 # --- KI-Funktionen ---
-async def get_genre_suggestion(title: str, artist: str, tagger=None, file_name: Optional[str]=None) -> Optional[str]:
+async def get_genre_suggestion(title: str, artist: str, tagger=None, file_name: Optional[str]=None, token: Optional[CancellationToken]=None, settings: Optional[SettingsSnapshot]=None) -> Optional[str]:
     """
     Liefert einen Genre-Vorschlag für einen Song basierend auf Titel und Künstler.
     Nutzt ggf. den Cache und ruft ansonsten die KI auf.
@@ -25,15 +34,18 @@ async def get_genre_suggestion(title: str, artist: str, tagger=None, file_name:
     :param artist: Künstlername
     :param tagger: (optional) Picard-Tagger-Objekt für Statusmeldungen
     :param file_name: (optional) Dateiname für Logging
+    :param token: (optional) Abbruch-Token mit Deadline
+    :param settings: (optional) Einstellungs-Schnappschuss, sonst der aktuelle
     :return: Genre als String oder None/Fehlermeldung
     """
     prompt = (
         f"Welches Musikgenre hat der Song '{title}' von '{artist}'? "
         "Antworte nur mit dem Genre, ohne weitere Erklärungen."
     )
-    model = str(config.setting["aiid_ollama_model"]) if "aiid_ollama_model" in config.setting else "mistral"
+    settings = settings or get_snapshot()
+    model = settings.ollama_model
     cache_key = f"ki_genre::{model}::{title}::{artist}"
-    use_cache = bool(config.setting["aiid_enable_cache"]) if "aiid_enable_cache" in config.setting else True
+    use_cache = settings.enable_cache
     log_event("info", "Starte Genre-KI-Request", title=title, artist=artist, model=model)
     if use_cache and cache_key in get_cache():
         v = get_cache()[cache_key]
@@ -45,7 +57,7 @@ async def get_genre_suggestion(title: str, artist: str, tagger=None, file_name:
         log_event("info", "Kein Cache-Treffer für Genre", title=title, artist=artist, model=model)
     if tagger and hasattr(tagger, 'window'):
         tagger.window.set_statusbar_message("KI-Genre-Vorschlag wird berechnet...")
-    genre = await call_ai_provider(prompt, model, tagger, file_name)
+    genre = await call_ai_provider(prompt, model, tagger, file_name, token=token, settings=settings)
     if tagger and hasattr(tagger, 'window'):
         tagger.window.set_statusbar_message("")
     if genre and "Fehler" not in genre:
@@ -56,22 +68,25 @@ async def get_genre_suggestion(title: str, artist: str, tagger=None, file_name:
             log_event("info", "Genre-Vorschlag im Cache gespeichert", title=title, artist=artist)
     return genre
 
-async def get_style_suggestion(title: str, artist: str, tagger=None, file_name: Optional[str]=None) -> Optional[str]:
+async def get_style_suggestion(title: str, artist: str, tagger=None, file_name: Optional[str]=None, token: Optional[CancellationToken]=None, settings: Optional[SettingsSnapshot]=None) -> Optional[str]:
     """
     Liefert einen Stil-Vorschlag für einen Song basierend auf Titel und Künstler.
     :param title: Songtitel
     :param artist: Künstlername
     :param tagger: (optional) Picard-Tagger-Objekt
     :param file_name: (optional) Dateiname für Logging
+    :param token: (optional) Abbruch-Token mit Deadline
+    :param settings: (optional) Einstellungs-Schnappschuss, sonst der aktuelle
     :return: Stil als String oder None/Fehlermeldung
     """
     prompt = (
         f"Welcher Musikstil beschreibt den Song '{title}' von '{artist}' am besten? "
         "Antworte nur mit dem Stil (z.B. Synthpop, Hardrock, Trap), ohne weitere Erklärungen."
     )
-    model = str(config.setting["aiid_ollama_model"]) if "aiid_ollama_model" in config.setting else "mistral"
+    settings = settings or get_snapshot()
+    model = settings.ollama_model
     cache_key = f"ki_style::{model}::{title}::{artist}"
-    use_cache = bool(config.setting["aiid_enable_cache"]) if "aiid_enable_cache" in config.setting else True
+    use_cache = settings.enable_cache
     if use_cache and cache_key in get_cache():
         v = get_cache()[cache_key]
         if isinstance(v, dict):
@@ -80,7 +95,7 @@ async def get_style_suggestion(title: str, artist: str, tagger=None, file_name:
             return v["value"]
     if tagger and hasattr(tagger, 'window'):
         tagger.window.set_statusbar_message("KI-Stil-Vorschlag wird berechnet...")
-    style = await call_ai_provider(prompt, model, tagger, file_name)
+    style = await call_ai_provider(prompt, model, tagger, file_name, token=token, settings=settings)
     if tagger and hasattr(tagger, 'window'):
         tagger.window.set_statusbar_message("")
     if style and "Fehler" not in style:
@@ -91,34 +106,49 @@ async def get_style_suggestion(title: str, artist: str, tagger=None, file_name:
             log_event("info", "Stil-Vorschlag im Cache gespeichert", title=title, artist=artist)
     return style
 
-async def get_language_code_suggestion(title: str, artist: str, tagger=None, file_name: Optional[str]=None) -> Optional[str]:
+async def get_language_code_suggestion(title: str, artist: str, tagger=None, file_name: Optional[str]=None, token: Optional[CancellationToken]=None, settings: Optional[SettingsSnapshot]=None) -> Optional[str]:
     """
     Liefert einen ISO-639-1 Sprachcode-Vorschlag für einen Song.
+    Ist die lokale Erkennung (langdetect) sicher genug, wird das LLM nicht gefragt.
     :param title: Songtitel
     :param artist: Künstlername
     :param tagger: (optional) Picard-Tagger-Objekt
     :param file_name: (optional) Dateiname für Logging
+    :param token: (optional) Abbruch-Token mit Deadline
+    :param settings: (optional) Einstellungs-Schnappschuss, sonst der aktuelle
     :return: Sprachcode als String oder None/Fehlermeldung
     """
     prompt = (
         f"In welcher Sprache ist der Song '{title}' von '{artist}' gesungen? "
         "Antworte nur mit dem ISO-639-1 Sprachcode (z.B. de, en, es), ohne weitere Erklärungen."
     )
-    model = str(config.setting["aiid_ollama_model"]) if "aiid_ollama_model" in config.setting else "mistral"
+    settings = settings or get_snapshot()
+    model = settings.ollama_model
     cache_key = f"ki_language_code::{model}::{title}::{artist}"
-    use_cache = bool(config.setting["aiid_enable_cache"]) if "aiid_enable_cache" in config.setting else True
+    use_cache = settings.enable_cache
+    # Cache zuerst: enthält auch die Album-Vorgaben aus dem Album-Prefetch
     if use_cache and cache_key in get_cache():
         v = get_cache()[cache_key]
         if isinstance(v, dict):
             age = int(time.time() - v["ts"])
             log_event("info", "Sprachcode aus KI-Cache", title=title, artist=artist, value=v['value'], age=age)
             return v["value"]
+    guess = LanguageGuess(None, 0.0)
+    if settings.language_fast_path:
+        # Eindeutige Fälle (Schrift, typische Trigramme) ohne LLM beantworten
+        guess = detect_language(title, artist)
+        if guess.code is not None and guess.confidence >= settings.language_min_confidence:
+            language_stats.record_local()
+            log_event("info", "Sprachcode lokal erkannt", title=title, artist=artist, value=guess.code, confidence=guess.confidence)
+            return guess.code
     if tagger and hasattr(tagger, 'window'):
         tagger.window.set_statusbar_message("KI-Sprachcode-Vorschlag wird berechnet...")
-    lang_code = await call_ai_provider(prompt, model, tagger, file_name)
+    lang_code = await call_ai_provider(prompt, model, tagger, file_name, token=token, settings=settings)
     if tagger and hasattr(tagger, 'window'):
         tagger.window.set_statusbar_message("")
     if lang_code and "Fehler" not in lang_code:
+        if settings.language_fast_path:
+            language_stats.record_llm(guess, lang_code)
         log_event("info", "Sprachcode-Vorschlag von KI", title=title, artist=artist, lang_code=lang_code)
         if use_cache:
             get_cache()[cache_key] = {"value": lang_code, "ts": time.time()}
@@ -126,91 +156,143 @@ async def get_language_code_suggestion(title: str, artist: str, tagger=None, fil
             log_event("info", "Sprachcode-Vorschlag im Cache gespeichert", title=title, artist=artist)
     return lang_code
 
-async def call_ai_provider(prompt: str, model: str, tagger=None, file_name: Optional[str]=None) -> Optional[str]:
+# Bekannte Ollama-Modellfamilien (Präfix des Namens ohne Tag), falls die Modell-Registry das Modell
+# (noch) nicht kennt, z.B. "llava:13b", "bakllava", "llama3.2-vision"
+_OLLAMA_FAMILIES = ("mistral", "mixtral", "llama", "phi", "gemma", "qwen", "llava", "bakllava", "moondream", "minicpm-v")
+
+
+def _is_ollama_model(model: str) -> bool:
+    """True, wenn das Modell auf einem Ollama-Backend liegt oder zu einer bekannten Modellfamilie gehört."""
+    if model.startswith("ollama") or model_registry.contains(model):
+        return True
+    name = model.rsplit("/", 1)[-1].split(":", 1)[0].lower()
+    return name.startswith(_OLLAMA_FAMILIES)
+
+
+def _get_provider(model: str, settings: Optional[SettingsSnapshot]=None) -> Optional[AIProviderBase]:
+    """
+    Wählt den Provider für ein Modell (nur noch Ollama; bei aktiver Aufzeichnung/Wiedergabe deren Provider).
+    :return: Provider oder None bei unbekanntem Modell
+    """
+    if not _is_ollama_model(model):
+        return None
+    # Aufzeichnung/Wiedergabe für reproduzierbare Performance-Messungen
+    return active_provider(settings) or ollama_provider
+
+
+async def call_ai_provider(prompt: str, model: str, tagger=None, file_name: Optional[str]=None, token: Optional[CancellationToken]=None, settings: Optional[SettingsSnapshot]=None, images: Optional[List[str]]=None, json_mode: bool=False) -> Optional[str]:
     """
     Ruft den passenden KI-Provider asynchron auf (nur noch Ollama).
     :param prompt: Prompt für die KI
     :param model: Modellname/Provider
     :param tagger: (optional) Picard-Tagger-Objekt
     :param file_name: (optional) Dateiname für Logging
-    :return: Antwort der KI als String oder Fehlermeldung
+    :param token: (optional) Abbruch-Token mit Deadline
+    :param settings: (optional) Einstellungs-Schnappschuss, sonst der aktuelle
+    :param images: (optional) Base64-kodierte Bilder für multimodale Modelle
+    :param json_mode: Antwort als JSON anfordern, falls der Provider das unterstützt
+    :return: Antwort der KI als String, Fehlermeldung oder None bei Abbruch
     """
     try:
-        # Nur noch Ollama zulassen
-        if model.startswith("ollama") or model in ("mistral", "llama2", "llama3", "phi3", "gemma", "mixtral"):
-            return await async_call_ollama(prompt, model, tagger=tagger, file_name=file_name)
-        else:
+        provider = _get_provider(model, settings)
+        if provider is None:
             msg = f"Unbekannter Provider/Modell: {model}"
             log_event("error", "Unbekannter Provider/Modell", model=model)
             show_error(tagger, msg)
             return msg
+        caps = provider.capabilities()
+        json_mode = json_mode and caps.supports_json_mode
+        return await provider.call(prompt, model, tagger, file_name, token=token, settings=settings, images=images, json_mode=json_mode)
     except Exception as e:
         log_exception("Fehler bei KI-Provider", model=model, prompt=prompt, file=file_name, error=str(e))
         show_error(tagger, f"Fehler bei KI-Provider: {e}")
         return str(e)
 
+
 # Die synchronen call_ollama/call_openai/call_huggingface entfallen, da jetzt async
 
-async def async_batch_genre_suggestions(song_list, tagger=None):
+def _is_error_result(result) -> bool:
+    # Abgebrochene Requests (None) sind keine Fehler
+    return isinstance(result, str) and "Fehler" in result
+
+
+async def stream_genre_suggestions(songs, tagger=None, token: Optional[CancellationToken]=None):
+    """
+    Holt Genre-Vorschläge für beliebig viele Songs mit einem gleitenden Fenster laufender Requests
+    und liefert jedes Ergebnis, sobald es vorliegt. Die Fenstergröße wird dynamisch angepasst.
+    :param songs: Iterable oder async Iterable von Dicts mit 'title' und 'artist' (optional 'item_key' für Abbruch bei Entfernen)
+    :param tagger: (optional) Picard-Tagger-Objekt
+    :param token: (optional) Abbruch-Token; danach werden keine weiteren Songs angefragt
+    :return: Async-Generator über (Index in songs, Genre-Vorschlag oder None bei Abbruch)
+    """
+    settings = get_snapshot()
+    deadline = settings.request_deadline
+    model = settings.ollama_model
+
+    async def _suggest(song):
+        return await get_genre_suggestion(
+            song['title'], song['artist'], tagger,
+            token=token_for_item(song.get('item_key'), timeout=deadline, parent=token)
+        )
+
+    # Fehler als eine Sammelmeldung statt eines Dialogs pro Song
+    with aggregated_errors(tagger, total=len(songs) if hasattr(songs, "__len__") else None):
+        # Modell für die Batch-Dauer vorladen und geladen halten
+        async with model_lifecycle.batch(model, token):
+            async for index, genre in stream_batch(songs, _suggest, AdaptiveWindow.from_settings(settings), token, _is_error_result):
+                yield index, genre
+
+
+@profiled("ki.async_batch_genre_suggestions", report=True)
+async def async_batch_genre_suggestions(song_list, tagger=None, token: Optional[CancellationToken]=None):
     """
     Holt asynchron Genre-Vorschläge für eine Liste von Songs (Titel, Künstler) von Ollama.
-    Die Batch-Größe wird dynamisch angepasst.
-    :param song_list: Liste von Dicts mit 'title' und 'artist'
+    Sammelt die Ergebnisse von stream_genre_suggestions() in Eingabereihenfolge.
+    :param song_list: Liste von Dicts mit 'title' und 'artist' (optional 'item_key' für Abbruch bei Entfernen)
     :param tagger: (optional) Picard-Tagger-Objekt
-    :return: Liste der Genre-Vorschläge (in gleicher Reihenfolge wie song_list)
-    """
-    import time
-    from .config import get_setting
-    min_batch_raw = get_setting("aiid_batch_min_size", 2)
-    min_batch = int(min_batch_raw) if min_batch_raw is not None else 2
-    max_batch_raw = get_setting("aiid_batch_max_size", 20)
-    max_batch = int(max_batch_raw) if max_batch_raw is not None else 20
-    batch_size_raw = get_setting("aiid_batch_start_size", 5)
-    batch_size = int(batch_size_raw) if batch_size_raw is not None else 5
-    slow_threshold_raw = get_setting("aiid_batch_slow_threshold", 8.0)
-    slow_threshold = float(slow_threshold_raw) if slow_threshold_raw is not None else 8.0
-    fast_threshold_raw = get_setting("aiid_batch_fast_threshold", 3.0)
-    fast_threshold = float(fast_threshold_raw) if fast_threshold_raw is not None else 3.0
-    adjust_step_raw = get_setting("aiid_batch_adjust_step", 1)
-    adjust_step = int(adjust_step_raw) if adjust_step_raw is not None else 1
-    results = []
-    i = 0
-    while i < len(song_list):
-        batch = song_list[i:i+batch_size]
-        start = time.time()
-        tasks = [get_genre_suggestion(song['title'], song['artist'], tagger) for song in batch]
-        batch_results = await asyncio.gather(*tasks)
-        elapsed = time.time() - start
-        results.extend(batch_results)
-        # Fehler zählen
-        error_count = sum(1 for r in batch_results if r is None or (isinstance(r, str) and "Fehler" in r))
-        # Dynamische Anpassung
-        if error_count > 0 or elapsed > slow_threshold:
-            batch_size = max(min_batch, batch_size - adjust_step)
-        elif elapsed < fast_threshold:
-            batch_size = min(max_batch, batch_size + adjust_step)
-        # Logging
-        from .logging import log_event
-        from .utils import msg
-        log_event("info", msg(
-            f"Batch {i//batch_size+1}: {len(batch)} Songs, {elapsed:.1f}s, Fehler: {error_count}, neue Batch-Größe: {batch_size}",
-            f"Batch {i//batch_size+1}: {len(batch)} songs, {elapsed:.1f}s, errors: {error_count}, new batch size: {batch_size}"
-        ))
-        i += len(batch)
+    :param token: (optional) Abbruch-Token für den gesamten Batch
+    :return: Liste der Genre-Vorschläge (in gleicher Reihenfolge wie song_list, None bei Abbruch)
+    """
+    results = [None] * len(song_list)
+    async for index, genre in stream_genre_suggestions(song_list, tagger, token):
+        results[index] = genre
     return results
 
-def get_cover_analysis(cover_path: str, title: Optional[str]=None, artist: Optional[str]=None, tagger=None, file_name: Optional[str]=None) -> Optional[str]:
+def get_cover_analysis(cover_path: str, title: Optional[str]=None, artist: Optional[str]=None, tagger=None, file_name: Optional[str]=None, token: Optional[CancellationToken]=None) -> Optional[str]:
+    """
+    Synchrone Variante von async_get_cover_analysis() für Aufrufer ohne Event-Loop (z.B. Worker-Threads).
+    Innerhalb einer laufenden Event-Loop muss async_get_cover_analysis() verwendet werden.
+    :param cover_path: Pfad zum Coverbild
+    :param title: (optional) Songtitel
+    :param artist: (optional) Künstlername
+    :param tagger: (optional) Picard-Tagger-Objekt
+    :param file_name: (optional) Dateiname für Logging
+    :param token: (optional) Abbruch-Token
+    :return: Analyseergebnis als String oder Fehlermeldung
+    """
+    return asyncio.run(async_get_cover_analysis(cover_path, title, artist, tagger, file_name, token))
+
+async def async_get_cover_analysis(cover_path: str, title: Optional[str]=None, artist: Optional[str]=None, tagger=None, file_name: Optional[str]=None, token: Optional[CancellationToken]=None) -> Optional[str]:
     """
-    Analysiert ein Coverbild (Platzhalter).
+    Analysiert ein Coverbild mit dem Vision-Modell. Identische oder nahezu identische
+    Cover (z.B. dasselbe Albumcover in jedem Track) werden über ihren Hash aus dem Cache bedient.
     :param cover_path: Pfad zum Coverbild
     :param title: (optional) Songtitel
     :param artist: (optional) Künstlername
     :param tagger: (optional) Picard-Tagger-Objekt
     :param file_name: (optional) Dateiname für Logging
+    :param token: (optional) Abbruch-Token
     :return: Analyseergebnis als String oder Fehlermeldung
     """
-    # Platzhalter für Cover-Analyse
-    return "Cover-Analyse (Platzhalter)"
+    from .cover import analyze_covers  # cover importiert ki
+    try:
+        with open(cover_path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        log_event("error", msg("Coverbild konnte nicht gelesen werden", "Could not read cover image"), file=file_name or cover_path, error=str(e))
+        return "Fehler: Coverbild nicht lesbar"
+    results = await analyze_covers([data], tagger, token=token)
+    return results[0]
 
 def get_genre_subcategories(genre: str, title: str, artist: str, tagger=None, file_name: Optional[str]=None) -> Optional[str]:
     """
@@ -0,0 +1,361 @@
+# Lokale Spracherkennung für AI Music Identifier Plugin
+#
+# Für viele Titel ist die Sprache schon an der Schrift (Kana, Hangul, Kyrillisch, ...)
+# oder an typischen Zeichen-Trigrammen ("_th", "ich", "ção") zu erkennen. Der Klassifikator
+# beantwortet das in Mikrosekunden mit einer Konfidenz; nur unsichere Fälle gehen an das LLM.
+
+import math
+import threading
+import time
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# Häufigste Trigramme in Songtiteln pro Sprache, absteigend nach Häufigkeit ("_" = Wortgrenze).
+# Bewusst klein gehalten: Titel sind kurz, seltene Trigramme tragen kaum zur Entscheidung bei.
+_PROFILES: Dict[str, str] = {
+    "en": "_th the he_ _yo you ou_ _lo lov ove ve_ _an and nd_ ing ng_ _to _me me_ _my my_ _i_ "
+          "_in in_ _of of_ _be _it it_ _do on_ all _wh er_ ght igh _ni _go _no _ca _wi _so _fo",
+    "de": "_de der er_ die ie_ _di _ic ich ch_ und _un nd_ ein _ei en_ _ni nic cht ht_ sch _sc "
+          "_da das as_ _mi mit ine ne_ ebe _li lie _au auf _zu _ge ber _we ist st_ eit",
+    "fr": "_le le_ _la la_ es_ _de de_ les _et et_ _je je_ _ne ne_ _pa pas _qu que ue_ _mo mon "
+          "_am our ur_ _vo ous _to tou ent nt_ _ce eur ais _du _ma _un",
+    "es": "_la la_ _el el_ _de de_ _qu que ue_ _lo los os_ _me me_ _te te_ _mi mi_ _y_ _co con "
+          "_am amo mor or_ _no no_ _es ado ien _tu _en ar_ _pa _un ión ón_",
+    "it": "_di di_ _la la_ _ch che he_ _il il_ _no non _mi mi_ _ti ti_ _am amo ore re_ _co con "
+          "_de del _un una na_ are _pe per to_ _se ell lla _ne _vo _so",
+    "pt": "_de de_ _qu que ue_ _o_ _a_ _do do_ _da da_ _me me_ _eu eu_ _nã não ão_ _co com _em "
+          "em_ _am amo or_ ção _vo voc ocê _te ara _pa nha _se ões",
+    "nl": "_de de_ _he het et_ _ee een en_ _ik ik_ _ni nie iet _va van an_ _da dat at_ _je je_ "
+          "_me _ij ij_ _zi _we _ge oor _vo ijn jn_ aar _ma _ko",
+    "sv": "_de det et_ _oc och ch_ _ja jag ag_ _at att tt_ _so som om_ _är är_ _en en_ _me med "
+          "_du du_ _mi _fö för ör_ _på på_ _vi _ha ar_ _in _ka",
+    "pl": "_ni nie ie_ _si się _to to_ _w_ _je _na na_ _z_ _mi ię_ _cz _pr _ko _po _do _ja ja_ "
+          "_ty ty_ ego _ży ać_ ość _że że_ _mo _bo",
+    "tr": "_bi bir ir_ _ve ve_ _bu bu_ _ne _se sen en_ _be ben _ya lar ler ar_ _ol _ka _gö _de "
+          "in_ _ki ını _aş aşk şk_ ım_ im_ _gi _ha",
+}
+
+# Zeichen, die nur in wenigen Sprachen vorkommen
+_CHAR_HINTS: Dict[str, Tuple[str, ...]] = {
+    "ß": ("de",), "ä": ("de", "sv"), "ö": ("de", "sv", "tr"), "ü": ("de", "tr"),
+    "ñ": ("es",), "¿": ("es",), "¡": ("es",), "á": ("es", "pt"), "í": ("es", "pt"), "ú": ("es", "pt"),
+    "ó": ("es", "pt", "pl"), "é": ("fr", "es", "it", "pt"), "è": ("fr", "it"), "ê": ("fr", "pt"),
+    "à": ("fr", "it", "pt"), "ù": ("fr", "it"), "ò": ("it",), "ì": ("it",), "œ": ("fr",), "ë": ("fr", "nl"),
+    "ç": ("fr", "pt", "tr"), "ã": ("pt",), "õ": ("pt",), "å": ("sv",),
+    "ą": ("pl",), "ę": ("pl",), "ł": ("pl",), "ś": ("pl",), "ż": ("pl",), "ź": ("pl",), "ć": ("pl",), "ń": ("pl",),
+    "ğ": ("tr",), "ş": ("tr",), "ı": ("tr",),
+}
+_HINT_WEIGHT = 3.0
+_MARGIN_SCALE = 1.5  # Punktevorsprung vor der zweitbesten Sprache, der ~63 % Konfidenz ergibt
+# Mindestbelege für eine sichere Aussage per Trigrammen: kurze Titel ("Under Pressure", "Da Da Da")
+# und Titel, deren Vorsprung an einem einzigen Wort hängt ("Die With A Smile"), bleiben unsicher
+_MIN_WORDS = 3  # verschiedene Wörter im Titel
+_MIN_SUPPORTING_WORDS = 2  # Wörter, die für sich genommen die beste Sprache vor der zweitbesten sehen
+_MIN_MARGIN = 3.0  # absoluter Punktevorsprung vor der zweitbesten Sprache
+_UNSURE = 0.5  # Konfidenz-Obergrenze, wenn eine der Bedingungen fehlt
+
+# Schriften, die (fast) eine Sprache bestimmen: (erstes Zeichen, letztes Zeichen, Schrift)
+_SCRIPT_RANGES: Tuple[Tuple[int, int, str], ...] = (
+    (0x0370, 0x03FF, "greek"), (0x0400, 0x04FF, "cyrillic"), (0x0530, 0x058F, "armenian"),
+    (0x0590, 0x05FF, "hebrew"), (0x0600, 0x06FF, "arabic"), (0x0900, 0x097F, "devanagari"),
+    (0x0E00, 0x0E7F, "thai"), (0x10A0, 0x10FF, "georgian"), (0x3040, 0x30FF, "kana"),
+    (0x3400, 0x4DBF, "han"), (0x4E00, 0x9FFF, "han"), (0xAC00, 0xD7AF, "hangul"), (0x1100, 0x11FF, "hangul"),
+)
+# Schrift → (Sprache, Konfidenz); Sonderzeichen einzelner Sprachen werden in _script_language geprüft
+_SCRIPT_LANGUAGES: Dict[str, Tuple[str, float]] = {
+    "greek": ("el", 0.99), "armenian": ("hy", 0.99), "hebrew": ("he", 0.95), "arabic": ("ar", 0.9),
+    "devanagari": ("hi", 0.9), "thai": ("th", 0.99), "georgian": ("ka", 0.99), "kana": ("ja", 0.99),
+    "hangul": ("ko", 0.99), "han": ("zh", 0.75), "cyrillic": ("ru", 0.8),
+}
+
+
+def _build_index() -> Dict[str, Dict[str, float]]:
+    # Invertierter Index Trigramm → {Sprache: Gewicht}; Gewicht 2.0 (häufigstes) bis knapp über 1.0
+    index: Dict[str, Dict[str, float]] = {}
+    for lang, profile in _PROFILES.items():
+        grams = profile.split()
+        for rank, gram in enumerate(grams):
+            index.setdefault(gram.replace("_", " "), {})[lang] = 1.0 + (len(grams) - rank) / len(grams)
+    return index
+
+
+_INDEX = _build_index()
+
+
+class LanguageGuess(NamedTuple):
+    """Ergebnis der lokalen Erkennung: ISO-639-1-Code (oder None) und Konfidenz 0..1."""
+    code: Optional[str]
+    confidence: float
+
+
+def _script_of(ch: str) -> Optional[str]:
+    cp = ord(ch)
+    if cp < 0x0370:
+        return None
+    for first, last, script in _SCRIPT_RANGES:
+        if first <= cp <= last:
+            return script
+    return None
+
+
+def _script_language(script: str, text: str) -> Tuple[str, float]:
+    code, confidence = _SCRIPT_LANGUAGES[script]
+    if script == "cyrillic":
+        if any(ch in "іїєґ" for ch in text):
+            return "uk", 0.95
+        if any(ch in "ђјљњћџ" for ch in text):
+            return "sr", 0.95
+    elif script == "arabic" and any(ch in "پچژگ" for ch in text):
+        return "fa", 0.9
+    return code, confidence
+
+
+def _latin_scores(text: str) -> Dict[str, float]:
+    scores: Dict[str, float] = {}
+    padded = " " + text + " "
+    for i in range(len(padded) - 2):
+        weights = _INDEX.get(padded[i:i + 3])
+        if weights:
+            for lang, weight in weights.items():
+                scores[lang] = scores.get(lang, 0.0) + weight
+    for ch in padded:
+        langs = _CHAR_HINTS.get(ch)
+        if langs:
+            for lang in langs:
+                scores[lang] = scores.get(lang, 0.0) + _HINT_WEIGHT / len(langs)
+    return scores
+
+
+def detect_language(title: str, artist: str = "") -> LanguageGuess:
+    """
+    Erkennt die Sprache eines Songs lokal an Schrift und Zeichen-Trigrammen des Titels
+    (der Künstler wird nur für die Schrift herangezogen, wenn der Titel keine Buchstaben hat).
+    :param title: Songtitel
+    :param artist: (optional) Künstlername
+    :return: LanguageGuess; Konfidenz 0.0, wenn nichts erkennbar ist
+    """
+    text = unicodedata.normalize("NFC", title or "").lower()
+    letters = [ch for ch in text if ch.isalpha()]
+    if not letters:
+        text = unicodedata.normalize("NFC", artist or "").lower()
+        letters = [ch for ch in text if ch.isalpha()]
+        if not letters:
+            return LanguageGuess(None, 0.0)
+    counts: Dict[str, int] = {}
+    for ch in letters:
+        script = _script_of(ch)
+        if script is not None:
+            counts[script] = counts.get(script, 0) + 1
+    if counts:
+        # Kana neben Han-Zeichen: Japanisch
+        script = "kana" if "kana" in counts else max(counts, key=counts.__getitem__)
+        share = sum(counts.values()) / len(letters)
+        if share >= 0.5:
+            code, confidence = _script_language(script, text)
+            return LanguageGuess(code, confidence * share)
+    # Wiederholte Wörter ("Da Da Da") zählen nur einmal
+    words = list(dict.fromkeys("".join(ch if ch.isalpha() else " " for ch in text).split()))
+    scores = _latin_scores(" ".join(words))
+    if not scores:
+        return LanguageGuess(None, 0.0)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    best, best_score = ranked[0]
+    second, second_score = ranked[1] if len(ranked) > 1 else (None, 0.0)
+    # Nur der Vorsprung zählt: gemeinsame Trigramme ("_de", "la_") sprechen für keine Sprache
+    margin = best_score - second_score
+    confidence = 1.0 - math.exp(-margin / _MARGIN_SCALE)
+    if len(words) < _MIN_WORDS or margin < _MIN_MARGIN:
+        confidence = min(confidence, _UNSURE)
+    else:
+        supporting = 0
+        for word in words:
+            word_scores = _latin_scores(word)
+            if word_scores.get(best, 0.0) > word_scores.get(second, 0.0):
+                supporting += 1
+        if supporting < _MIN_SUPPORTING_WORDS:
+            confidence = min(confidence, _UNSURE)
+    return LanguageGuess(best, round(confidence, 3))
+
+
+def _normalize_code(value: Optional[str]) -> Optional[str]:
+    """Erste zwei Buchstaben einer LLM-Antwort wie "de", "DE." oder "de (Deutsch)"."""
+    if not value:
+        return None
+    code = value.strip().lower()[:2]
+    return code if len(code) == 2 and code.isalpha() else None
+
+
+class LanguageStats:
+    """
+    Zähler für den lokalen Pfad: wie oft das LLM übersprungen wurde und wie oft die
+    (unsichere) lokale Vermutung mit der LLM-Antwort übereinstimmte.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.local = 0
+            self.llm = 0
+            self.compared = 0
+            self.agreed = 0
+
+    def record_local(self) -> None:
+        with self._lock:
+            self.local += 1
+
+    def record_llm(self, guess: LanguageGuess, answer: Optional[str]) -> None:
+        """
+        :param guess: Lokale Vermutung unterhalb der Schwelle
+        :param answer: Antwort des LLM
+        """
+        code = _normalize_code(answer)
+        with self._lock:
+            self.llm += 1
+            if guess.code is not None and code is not None:
+                self.compared += 1
+                self.agreed += int(guess.code == code)
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.local + self.llm
+            return {
+                "local": self.local, "llm": self.llm,
+                "skip_rate": self.local / total if total else 0.0,
+                "agreement": self.agreed / self.compared if self.compared else 0.0,
+            }
+
+
+language_stats = LanguageStats()
+
+# Referenzmenge (Titel, Künstler, Sprache), an der Profile und Schwellen abgestimmt wurden
+BENCHMARK_SET: Tuple[Tuple[str, str, str], ...] = (
+    ("I Will Always Love You", "Whitney Houston", "en"),
+    ("Born in the U.S.A.", "Bruce Springsteen", "en"),
+    ("Don't Stop Me Now", "Queen", "en"),
+    ("What a Wonderful World", "Louis Armstrong", "en"),
+    ("Smells Like Teen Spirit", "Nirvana", "en"),
+    ("I Want to Hold Your Hand", "The Beatles", "en"),
+    ("Atemlos durch die Nacht", "Helene Fischer", "de"),
+    ("Ich war noch niemals in New York", "Udo Jürgens", "de"),
+    ("Über sieben Brücken musst du gehn", "Karat", "de"),
+    ("Major Tom (völlig losgelöst)", "Peter Schilling", "de"),
+    ("Ein bisschen Frieden", "Nicole", "de"),
+    ("Non, je ne regrette rien", "Édith Piaf", "fr"),
+    ("La vie en rose", "Édith Piaf", "fr"),
+    ("Ne me quitte pas", "Jacques Brel", "fr"),
+    ("Je t'aime moi non plus", "Serge Gainsbourg", "fr"),
+    ("Quién será", "Pedro Infante", "es"),
+    ("La Bamba", "Ritchie Valens", "es"),
+    ("Bésame mucho", "Consuelo Velázquez", "es"),
+    ("Te quiero, te quiero", "Nino Bravo", "es"),
+    ("Nel blu dipinto di blu", "Domenico Modugno", "it"),
+    ("Con te partirò", "Andrea Bocelli", "it"),
+    ("Ti amo", "Umberto Tozzi", "it"),
+    ("Garota de Ipanema", "Tom Jobim", "pt"),
+    ("Mas que nada", "Jorge Ben", "pt"),
+    ("Ai se eu te pego", "Michel Teló", "pt"),
+    ("Het is een nacht", "Guus Meeuwis", "nl"),
+    ("Zij gelooft in mij", "André Hazes", "nl"),
+    ("Du gamla, du fria", "Traditionell", "sv"),
+    ("Jag är fri", "Bo Kaspers Orkester", "sv"),
+    ("Przeżyj to sam", "Lombard", "pl"),
+    ("Şımarık", "Tarkan", "tr"),
+    ("Kiss Kiss (Şımarık)", "Tarkan", "tr"),
+    ("上を向いて歩こう", "坂本九", "ja"),
+    ("강남스타일", "싸이", "ko"),
+    ("月亮代表我的心", "邓丽君", "zh"),
+    ("Калинка", "Traditional", "ru"),
+    ("Червона рута", "Софія Ротару", "uk"),
+    ("Τα παιδιά του Πειραιά", "Μελίνα Μερκούρη", "el"),
+    ("Despacito", "Luis Fonsi", "es"),
+    ("Bohemian Rhapsody", "Queen", "en"),
+)
+
+
+# Getrennte Prüfmenge, nicht zum Abstimmen der Profile und Schwellen verwendet; enthält bewusst
+# kurze und mehrdeutige Titel, an denen die lokale Erkennung scheitern darf (dann aber unsicher)
+HELDOUT_SET: Tuple[Tuple[str, str, str], ...] = (
+    ("Under Pressure", "Queen", "en"),
+    ("Die With A Smile", "Lady Gaga", "en"),
+    ("Alles nur geklaut", "Die Prinzen", "de"),
+    ("Da Da Da", "Trio", "de"),
+    ("Rolling in the Deep", "Adele", "en"),
+    ("Shape of You", "Ed Sheeran", "en"),
+    ("Hotel California", "Eagles", "en"),
+    ("Another Brick in the Wall", "Pink Floyd", "en"),
+    ("Stairway to Heaven", "Led Zeppelin", "en"),
+    ("Wind of Change", "Scorpions", "en"),
+    ("Take On Me", "a-ha", "en"),
+    ("Billie Jean", "Michael Jackson", "en"),
+    ("Don't Worry Be Happy", "Bobby McFerrin", "en"),
+    ("Mamma Mia", "ABBA", "en"),
+    ("Dynamite", "BTS", "en"),
+    ("Livin' la vida loca", "Ricky Martin", "en"),
+    ("Männer", "Herbert Grönemeyer", "de"),
+    ("Ein Kompliment", "Sportfreunde Stiller", "de"),
+    ("Haus am See", "Peter Fox", "de"),
+    ("Auf uns", "Andreas Bourani", "de"),
+    ("Tage wie diese", "Die Toten Hosen", "de"),
+    ("Junge", "Die Ärzte", "de"),
+    ("Wie schön, dass du geboren bist", "Rolf Zuckowski", "de"),
+    ("Skandal im Sperrbezirk", "Spider Murphy Gang", "de"),
+    ("99 Luftballons", "Nena", "de"),
+    ("Atemlos", "Helene Fischer", "de"),
+    ("Formidable", "Stromae", "fr"),
+    ("Papaoutai", "Stromae", "fr"),
+    ("Les Champs-Élysées", "Joe Dassin", "fr"),
+    ("Je veux", "Zaz", "fr"),
+    ("Comme d'habitude", "Claude François", "fr"),
+    ("Tous les garçons et les filles", "Françoise Hardy", "fr"),
+    ("Tu t'en vas", "Alain Barrière", "fr"),
+    ("La Macarena", "Los del Río", "es"),
+    ("Vivir mi vida", "Marc Anthony", "es"),
+    ("Corazón espinado", "Santana", "es"),
+    ("Bailando", "Enrique Iglesias", "es"),
+    ("Volare", "Domenico Modugno", "it"),
+    ("Sarà perché ti amo", "Ricchi e Poveri", "it"),
+    ("L'italiano", "Toto Cutugno", "it"),
+    ("Azzurro", "Adriano Celentano", "it"),
+    ("Aquarela do Brasil", "Ary Barroso", "pt"),
+    ("Águas de março", "Elis Regina", "pt"),
+    ("Dragostea din tei", "O-Zone", "ro"),
+    ("Ik neem je mee", "Gers Pardoel", "nl"),
+    ("Sto lat", "Traditional", "pl"),
+    ("Sen Ağlama", "Tarkan", "tr"),
+    ("Ночь", "Андрей Губин", "ru"),
+    ("恋", "星野源", "ja"),
+    ("Червона рута", "Софія Ротару", "uk"),
+)
+
+
+def run_benchmark(min_confidence: float = 0.95, items: Optional[Sequence[Tuple[str, str, str]]] = None,
+                  repeat: int = 200) -> Dict[str, float]:
+    """
+    Misst den lokalen Pfad gegen eine Referenzmenge (Standard: HELDOUT_SET).
+    :param min_confidence: Konfidenzschwelle wie "aiid_language_min_confidence"
+    :param items: (optional) Eigene Referenzmenge (Titel, Künstler, erwartete Sprache), z.B. BENCHMARK_SET
+    :param repeat: Wiederholungen für die Zeitmessung
+    :return: skip_rate (ohne LLM beantwortet), precision (davon korrekt), accuracy (alle Vermutungen), us_per_call
+    """
+    items = list(items if items is not None else HELDOUT_SET)
+    if not items:
+        return {"items": 0, "skip_rate": 0.0, "precision": 0.0, "accuracy": 0.0, "us_per_call": 0.0}
+    guesses: List[LanguageGuess] = [detect_language(title, artist) for title, artist, _ in items]
+    skipped = [(g, expected) for g, (_, _, expected) in zip(guesses, items) if g.confidence >= min_confidence]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for title, artist, _ in items:
+            detect_language(title, artist)
+    elapsed = time.perf_counter() - start
+    return {
+        "items": len(items),
+        "skip_rate": len(skipped) / len(items),
+        "precision": sum(g.code == expected for g, expected in skipped) / len(skipped) if skipped else 0.0,
+        "accuracy": sum(g.code == expected for g, (_, _, expected) in zip(guesses, items)) / len(items),
+        "us_per_call": elapsed / (repeat * len(items)) * 1e6,
+    }
+
+
+__all__ = ["LanguageGuess", "detect_language", "LanguageStats", "language_stats", "BENCHMARK_SET", "HELDOUT_SET", "run_benchmark"]
@@ -1,6 +1,7 @@
 import logging
 import os
 import traceback
+from .profiling import span
 
 LOGFILE = os.path.expanduser("~/.config/MusicBrainz/Picard/aiid_plugin.log")
 LOGLEVEL = os.environ.get("AIID_LOGLEVEL", "INFO").upper()
@@ -17,10 +18,11 @@ logging.basicConfig(
 
 def log_event(level, msg, **context):
     """Zentrale Logging-Funktion mit Kontextinformationen."""
-    logger = logging.getLogger("ai_identifier")
-    if context:
-        msg += " | " + " ".join(f"{k}={v!r}" for k, v in context.items())
-    getattr(logger, level.lower())(msg)
+    with span("logging.log_event"):
+        logger = logging.getLogger("ai_identifier")
+        if context:
+            msg += " | " + " ".join(f"{k}={v!r}" for k, v in context.items())
+        getattr(logger, level.lower())(msg)
 
 
 def log_exception(msg, **context):
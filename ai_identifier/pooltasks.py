@@ -0,0 +1,125 @@
+# Aufgaben für den Prozess-Pool des AI Music Identifier Plugins
+#
+# Der Pool startet seine Prozesse mit "spawn"; jeder Kindprozess importiert die hier
+# referenzierten Funktionen neu. Dieses Modul darf deshalb nur die Standardbibliothek,
+# .constants und (optional) Pillow importieren – kein Picard, kein Qt, keine Provider.
+# Das Paket-__init__ lädt in Kindprozessen nichts weiter (siehe multiprocessing.parent_process()).
+
+import difflib
+import io
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from .constants import GENRE_HIERARCHY, VALID_GENRES, VALID_MOODS
+
+try:
+    from PIL import Image  # optional, für perzeptuelle Hashes
+except ImportError:
+    Image = None
+
+# Kompakter Track-Record für den Prozess-Pool: (KI-Felder als (Feld, Wert)-Paare, Metadaten als (Tag, Wert)-Paare)
+TrackRecord = Tuple[Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str], ...]]
+
+# Flacher Index über GENRE_HIERARCHY: kleingeschriebener Name -> Pfad von oben (z.B. ("Rock", "Alternative Rock"))
+_HIERARCHY_INDEX: Dict[str, Tuple[str, ...]] = {}
+for _top, _subs in GENRE_HIERARCHY.items():
+    _HIERARCHY_INDEX.setdefault(_top.lower(), ())
+    for _mid, _leaves in _subs.items():
+        _HIERARCHY_INDEX.setdefault(_mid.lower(), (_top,))
+        for _leaf in _leaves:
+            _HIERARCHY_INDEX.setdefault(_leaf.lower(), (_top, _mid))
+
+
+def validate_value(field: str, value: Optional[str]) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Prüft einen KI-Wert gegen die Listen gültiger Genres/Stimmungen (exakt, sonst Fuzzy-Matching).
+    :param field: Feldname ("genre", "mood", ...)
+    :param value: KI-Wert
+    :return: (gültig, Wert bzw. korrekte Schreibweise, Vorschlag oder None)
+    """
+    if not value:
+        return (True, value, None)
+    if field == "genre":
+        valid_list = VALID_GENRES
+    elif field == "mood":
+        valid_list = VALID_MOODS
+    else:
+        return (True, value, None)
+    # Exakte Übereinstimmung (case-insensitive)
+    for v in valid_list:
+        if v.lower() == value.strip().lower():
+            return (True, v, None)
+    # Fuzzy-Matching
+    matches = difflib.get_close_matches(value.strip(), valid_list, n=1, cutoff=0.6)
+    if matches:
+        return (False, value, matches[0])
+    return (False, value, None)
+
+
+def genre_path(genre: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Gibt die übergeordneten Genres eines Genres laut GENRE_HIERARCHY zurück.
+    :param genre: Genre oder Subgenre
+    :return: Pfad von oben (leer für Hauptgenres) oder None, wenn unbekannt
+    """
+    if not genre:
+        return None
+    return _HIERARCHY_INDEX.get(genre.strip().lower())
+
+
+def process_chunk(records: List[TrackRecord], rules: List[Any]) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Verarbeitet einen Chunk der Nachverarbeitung im Kindprozess.
+    :param records: Kompakte Track-Records
+    :param rules: Reine (seiteneffektfreie, picklebare) Workflow-Regeln; ihre Klassen sollten
+                  ebenfalls in einem Modul ohne Picard-/Qt-Importe liegen
+    :return: (Ergebnisse in Eingabereihenfolge, Rechenzeit in Sekunden)
+    """
+    start = time.perf_counter()
+    results = []
+    for ai_pairs, meta_pairs in records:
+        ai_results = dict(ai_pairs)
+        metadata = dict(meta_pairs)
+        validation = {field: validate_value(field, value) for field, value in ai_pairs}
+        matched = []
+        for rule in rules:
+            try:
+                if rule.evaluate_conditions(metadata, ai_results, None):
+                    matched.append(rule.name)
+            except Exception:
+                # Fehlerhafte Regel: im Hauptprozess erneut auswerten lassen
+                matched.append(None)
+        results.append({
+            "validation": validation,
+            "hierarchy": genre_path(ai_results.get("genre")),
+            "matched_rules": matched,
+        })
+    return results, time.perf_counter() - start
+
+
+def perceptual_hash(data: bytes) -> Optional[int]:
+    """
+    Berechnet einen 64-Bit-dHash: Graustufen, Verkleinerung auf 9x8 Pixel,
+    ein Bit pro Vergleich benachbarter Pixel. Ähnliche Bilder (andere Auflösung,
+    Kompression) ergeben Hashes mit kleiner Hamming-Distanz.
+    :param data: Bilddaten (JPEG/PNG/...)
+    :return: Hash als int oder None, wenn Pillow fehlt oder das Bild nicht lesbar ist
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # JPEG direkt verkleinert dekodieren statt in voller Auflösung
+            img.draft("L", (64, 64))
+            pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def hash_many(blobs: List[bytes]) -> List[Optional[int]]:
+    """Perzeptuelle Hashes für mehrere Bilder (läuft im Worker-Prozess)."""
+    return [perceptual_hash(b) for b in blobs]
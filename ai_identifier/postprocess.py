@@ -0,0 +1,169 @@
+# Nachverarbeitung für AI Music Identifier Plugin
+#
+# Validierung, Hierarchie-Lookup und reine Regel-Auswertung laufen nach der
+# KI-Antwort rein CPU-gebunden. Für große Bibliotheken werden sie in Chunks
+# auf einen Prozess-Pool verteilt und in Eingabereihenfolge zusammengeführt.
+
+import atexit
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .config import get_snapshot
+from .logging import log_event
+from .pooltasks import TrackRecord, genre_path, process_chunk
+from .profiling import profiled
+from .utils import msg
+from .workflow import workflow_engine
+
+
+class ChunkSizer:
+    """
+    Passt die Chunk-Größe an die gemessenen Kosten pro Track an, sodass ein Chunk
+    etwa die Zieldauer braucht (genug Arbeit gegen den IPC-Overhead, klein genug für Lastausgleich).
+    """
+    def __init__(self, initial: int, target_seconds: float, minimum: int = 8, maximum: int = 4096):
+        self.size = max(minimum, min(maximum, initial))
+        self.target = target_seconds
+        self.minimum = minimum
+        self.maximum = maximum
+        self.per_item: Optional[float] = None
+
+    def update(self, items: int, elapsed: float) -> None:
+        """Meldet die Rechenzeit eines fertigen Chunks."""
+        if items <= 0:
+            return
+        cost = elapsed / items
+        self.per_item = cost if self.per_item is None else 0.5 * cost + 0.5 * self.per_item
+        if self.per_item > 0:
+            self.size = int(max(self.minimum, min(self.maximum, self.target / self.per_item)))
+
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers: int) -> Executor:
+    """
+    Gibt den (lazy erzeugten) Prozess-Pool zurück. Die Prozesse starten auf allen Plattformen
+    mit "spawn" (fork ist mit Qt-Threads unsicher) und importieren nur ai_identifier.pooltasks.
+    In eingefrorenen Picard-Builds (sys.frozen) gibt es keinen Python-Interpreter für "spawn",
+    dort wird ein Thread-Pool verwendet.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if getattr(sys, "frozen", False):
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aiid-postprocess")
+            else:
+                # Strg+C beendet nur Picard, nicht die Worker einzeln (Initializer ohne Import dieses Pakets)
+                _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN))
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _reset_executor() -> None:
+    """Verwirft einen defekten Prozess-Pool, damit der nächste Aufruf einen neuen erzeugt."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _to_record(track: Dict[str, Any]) -> TrackRecord:
+    """Wandelt einen Track in einen kompakten, picklebaren Record um (nur String-Werte)."""
+    ai_results = track.get("ai_results") or {}
+    metadata = track.get("metadata") or {}
+    ai_pairs = tuple((str(k), str(v)) for k, v in ai_results.items() if v is not None)
+    meta_pairs = tuple((str(k), str(v)) for k, v in dict(metadata).items() if v is not None)
+    return ai_pairs, meta_pairs
+
+
+@profiled("postprocess.postprocess_tracks")
+def postprocess_tracks(tracks: List[Dict[str, Any]], engine: Any = None, context: Any = None, tagger: Any = None) -> List[Dict[str, Any]]:
+    """
+    Nachverarbeitung vieler Tracks: Validierung (Fuzzy-Matching), Genre-Hierarchie und
+    Auswertung reiner Workflow-Regeln im Prozess-Pool, danach Regel-Aktionen im Hauptprozess.
+    Regeln mit Attribut pure=True müssen picklebar sein und dürfen nur Metadaten/KI-Ergebnisse lesen.
+    Tag-Änderungen der Regel-Aktionen bilden eine Undo-Gruppe im Journal der Engine.
+    :param tracks: Liste von Dicts mit 'metadata', 'ai_results' und (für Undo) 'filename'
+    :param engine: (optional) WorkflowEngine, deren Regeln ausgeführt werden (Standard: workflow_engine)
+    :param context: (optional) Kontext für die Regeln
+    :param tagger: (optional) Picard-Tagger-Objekt
+    :return: Ergebnisse pro Track (gleiche Reihenfolge): 'validation', 'hierarchy', 'executed_rules'
+    """
+    settings = get_snapshot()
+    engine = engine if engine is not None else workflow_engine
+    rules = list(engine.rules) if engine.enabled else []
+    pure_rules = [r for r in rules if getattr(r, "pure", False)]
+    records = [_to_record(t) for t in tracks]
+    workers = settings.postprocess_workers or (os.cpu_count() or 1)
+    sizer = ChunkSizer(settings.postprocess_chunk_size, settings.postprocess_target_chunk_ms / 1000.0)
+    results: List[Dict[str, Any]] = []
+    if workers > 1 and len(records) >= settings.postprocess_min_tracks:
+        try:
+            results = _run_pool(records, pure_rules, workers, sizer)
+        except Exception as e:
+            log_event("warning", msg(
+                "Prozess-Pool für Nachverarbeitung nicht nutzbar, verarbeite seriell",
+                "Process pool for post-processing unavailable, processing serially"
+            ), error=str(e))
+            _reset_executor()
+            results = []
+    if not results and records:
+        results, _ = process_chunk(records, pure_rules)
+    # Regel-Aktionen (mit Seiteneffekten) in Eingabereihenfolge im Hauptprozess, als eine Undo-Gruppe
+    journal = getattr(engine, "journal", None) if rules else None
+    with journal.group(f"KI-Batch ({len(tracks)} Tracks)") if journal is not None else nullcontext():
+        for track, result in zip(tracks, results):
+            matched = result.pop("matched_rules")
+            executed: List[Dict[str, Any]] = []
+            if rules:
+                precomputed: Optional[Set[str]] = set(name for name in matched if name is not None)
+                if None in matched:
+                    # Auswertung im Kindprozess fehlgeschlagen: alle Regeln im Hauptprozess prüfen
+                    precomputed = None
+                executed = engine.execute_workflows(track.get("metadata"), track.get("ai_results"), context, tagger,
+                                                    precomputed=precomputed, item_id=track.get("filename"))
+            result["executed_rules"] = executed
+    log_event("info", msg("Nachverarbeitung abgeschlossen", "Post-processing finished"),
+              tracks=len(tracks), chunk_size=sizer.size, per_item_ms=round((sizer.per_item or 0) * 1000, 3))
+    return results
+
+
+def _run_pool(records: List[TrackRecord], rules: List[Any], workers: int, sizer: ChunkSizer) -> List[Dict[str, Any]]:
+    """
+    Verteilt die Records in adaptiv großen Chunks auf den Prozess-Pool und führt
+    die Ergebnisse in Eingabereihenfolge zusammen.
+    """
+    executor = _get_executor(workers)
+    chunks: Dict[int, List[Dict[str, Any]]] = {}
+    pending: Dict[Future, Tuple[int, int]] = {}
+    position = 0
+    while position < len(records) or pending:
+        # Pool mit etwa zwei Chunks pro Worker gefüllt halten
+        while position < len(records) and len(pending) < workers * 2:
+            size = sizer.size
+            future = executor.submit(process_chunk, records[position:position + size], rules)
+            pending[future] = (position, min(size, len(records) - position))
+            position += size
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            start, count = pending.pop(future)
+            chunk_results, elapsed = future.result()
+            sizer.update(count, elapsed)
+            chunks[start] = chunk_results
+    merged: List[Dict[str, Any]] = []
+    for start in sorted(chunks):
+        merged.extend(chunks[start])
+    return merged
+
+
+__all__ = ["postprocess_tracks", "genre_path", "ChunkSizer"]
@@ -0,0 +1,192 @@
+# Profiling-Hooks für AI Music Identifier Plugin
+#
+# Opt-in über die Einstellung "aiid_profiling". Ist sie aus, kostet ein Span nur
+# einen Attributzugriff auf den Einstellungs-Schnappschuss.
+
+import asyncio
+import cProfile
+import functools
+import io
+import logging as std_logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional
+from .config import get_snapshot
+
+_NULL_SPAN = nullcontext()
+_stats: Dict[str, List[float]] = {}  # name -> [Anzahl, Gesamtzeit, Maximum]
+_stats_lock = threading.Lock()
+_batch_counter = 0
+
+
+def profiling_enabled() -> bool:
+    """True, wenn der Profiling-Modus aktiviert ist."""
+    return get_snapshot().profiling
+
+
+class _Span:
+    """Misst die Dauer eines Abschnitts und addiert sie zur Statistik."""
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        with _stats_lock:
+            entry = _stats.get(self.name)
+            if entry is None:
+                _stats[self.name] = [1, elapsed, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+                if elapsed > entry[2]:
+                    entry[2] = elapsed
+
+
+def span(name: str):
+    """
+    Kontextmanager zur Zeitmessung eines Abschnitts (nur bei aktivem Profiling).
+    :param name: Name der Stufe (z.B. "ollama.call")
+    """
+    return _Span(name) if get_snapshot().profiling else _NULL_SPAN
+
+
+def profiled(name: str, report: bool = False) -> Callable:
+    """
+    Dekorator für sync- und async-Funktionen: misst jeden Aufruf als Span.
+    :param name: Name der Stufe
+    :param report: True für Batch-Einstiegspunkte; schreibt am Ende einen Report
+    """
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not get_snapshot().profiling:
+                    return await func(*args, **kwargs)
+                session = _BatchSession(name) if report else None
+                try:
+                    with _Span(name):
+                        return await func(*args, **kwargs)
+                finally:
+                    if session is not None:
+                        session.finish()
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not get_snapshot().profiling:
+                return func(*args, **kwargs)
+            session = _BatchSession(name) if report else None
+            try:
+                with _Span(name):
+                    return func(*args, **kwargs)
+            finally:
+                if session is not None:
+                    session.finish()
+        return wrapper
+    return decorator
+
+
+def get_profile_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Gibt die bisher gesammelten Span-Statistiken zurück.
+    :return: Dict name -> {"count", "total", "max"} (Zeiten in Sekunden)
+    """
+    with _stats_lock:
+        return {k: {"count": v[0], "total": v[1], "max": v[2]} for k, v in _stats.items()}
+
+
+def reset_profile_stats() -> None:
+    """Setzt die Span-Statistiken zurück."""
+    with _stats_lock:
+        _stats.clear()
+
+
+class _BatchSession:
+    """
+    Profiling eines Batch-Laufs: Stufen-Zeiten, optional cProfile/tracemalloc
+    (jeder N-te Batch laut "aiid_profiling_snapshot_every"), Report neben dem Plugin-Log.
+    """
+    def __init__(self, name: str):
+        global _batch_counter
+        settings = get_snapshot()
+        self.name = name
+        self.start = time.perf_counter()
+        self.before = get_profile_stats()
+        self.profiler: Optional[cProfile.Profile] = None
+        self.tracing = False
+        with _stats_lock:
+            _batch_counter += 1
+            self.number = _batch_counter
+        every = settings.profiling_snapshot_every
+        if every > 0 and self.number % every == 0:
+            try:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+            except ValueError:
+                # Anderer Profiler aktiv (z.B. paralleler Batch)
+                self.profiler = None
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.tracing = True
+
+    def finish(self) -> None:
+        """Beendet die Messung und schreibt den Report."""
+        elapsed = time.perf_counter() - self.start
+        if self.profiler is not None:
+            self.profiler.disable()
+        memory = tracemalloc.take_snapshot() if self.tracing else None
+        if self.tracing:
+            tracemalloc.stop()
+        try:
+            path = self._write_report(elapsed, memory)
+            std_logging.getLogger("ai_identifier").info(f"Profiling-Report geschrieben: {path}")
+        except Exception as e:
+            std_logging.getLogger("ai_identifier").warning(f"Profiling-Report konnte nicht geschrieben werden: {e}")
+
+    def _write_report(self, elapsed: float, memory: Optional[tracemalloc.Snapshot]) -> str:
+        from .logging import LOGFILE
+        top = get_snapshot().profiling_top
+        after = get_profile_stats()
+        lines = [
+            f"AI Music Identifier – Profiling-Report {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"{self.name} #{self.number}, Dauer {elapsed:.3f}s",
+            "",
+            "Stufen:",
+            f"  {'Name':<32}{'Anzahl':>8}{'Gesamt[s]':>12}{'Mittel[ms]':>12}{'Max[ms]':>10}{'Anteil':>8}",
+        ]
+        rows = []
+        for name, stat in after.items():
+            prev = self.before.get(name, {"count": 0, "total": 0.0})
+            count = stat["count"] - prev["count"]
+            total = stat["total"] - prev["total"]
+            if count > 0:
+                rows.append((name, count, total, stat["max"]))
+        for name, count, total, maximum in sorted(rows, key=lambda r: r[2], reverse=True):
+            share = total / elapsed * 100 if elapsed > 0 else 0.0
+            lines.append(f"  {name:<32}{count:>8}{total:>12.3f}{total / count * 1000:>12.2f}{maximum * 1000:>10.1f}{share:>7.1f}%")
+        if self.profiler is not None:
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(top)
+            lines += ["", f"cProfile (Top {top} nach kumulierter Zeit):", out.getvalue()]
+        if memory is not None:
+            lines += ["", f"tracemalloc (Top {top} Allokationen):"]
+            for stat in memory.statistics("lineno")[:top]:
+                lines.append(f"  {stat}")
+        path = os.path.join(os.path.dirname(LOGFILE), f"aiid_profile_{time.strftime('%Y%m%d_%H%M%S')}_{self.number}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+
+__all__ = ["span", "profiled", "profiling_enabled", "get_profile_stats", "reset_profile_stats"]
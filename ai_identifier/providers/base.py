@@ -1,11 +1,42 @@
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+import asyncio
 import logging
 
+# Messung auf Backend-Ebene für den laufenden Request: Wer sie braucht (z.B. RecordingProvider),
+# setzt ein leeres Dict; Provider tragen nach einer erfolgreichen HTTP-Antwort "elapsed"
+# (Round-Trip in Sekunden, ohne Warten auf Slots, Retries und Backoff) und "in_flight"
+# (gleichzeitig laufende HTTP-Requests beim Senden) ein.
+backend_timing: ContextVar[Optional[Dict[str, float]]] = ContextVar("aiid_backend_timing", default=None)
+
+
+class ProviderError(Exception):
+    """
+    Fehler eines Providers, der nicht als Antwort-String gemeldet werden kann (z.B. Abbruch eines
+    Streams mittendrin). Bereits gelieferte Teile sind ungültig und dürfen nicht verwendet werden.
+    """
+
+
+@dataclass(frozen=True)
+class ProviderCapabilities:
+    """
+    Beschreibt, was ein Provider kann; call_ai_provider wählt danach die Ausführungsstrategie.
+    """
+    max_batch: int = 1  # Prompts pro nativer Batch-Anfrage (1 = keine native Batch-API)
+    max_concurrency: int = 1  # Sinnvolle Anzahl gleichzeitiger Requests
+    supports_streaming: bool = False
+    supports_json_mode: bool = False  # Antwort als gültiges JSON erzwingbar
+    supports_images: bool = False
+
+
 class AIProviderBase(ABC):
     """
-    Abstrakte Basisklasse für KI-Provider.
-    Definiert die Schnittstelle und gemeinsame Logik für alle Provider.
+    Abstrakte Basisklasse für KI-Provider (asynchron).
+    Definiert die Schnittstelle und gemeinsame Logik für alle Provider:
+    call (ein Prompt), call_many (mehrere Prompts, Ergebnisse in Eingabereihenfolge),
+    stream (Antwort in Teilen) und capabilities (Fähigkeiten und Grenzen).
     """
 
     def __init__(self, name: str):
@@ -16,18 +47,61 @@ class AIProviderBase(ABC):
         self.name = name
         self.logger = logging.getLogger(f"AIProvider.{self.name}")
 
+    def capabilities(self) -> ProviderCapabilities:
+        """
+        Gibt die Fähigkeiten des Providers zurück (kann von Einstellungen abhängen).
+        :return: ProviderCapabilities
+        """
+        return ProviderCapabilities()
+
     @abstractmethod
-    def call(self, prompt: str, model: Optional[str] = None, tagger: Any = None, file_name: Optional[str] = None) -> str:
+    async def call(self, prompt: str, model: Optional[str] = None, tagger: Any = None, file_name: Optional[str] = None,
+                   token: Any = None, settings: Any = None, images: Optional[List[str]] = None,
+                   json_mode: bool = False) -> Optional[str]:
         """
         Führt einen KI-Request aus und gibt die Antwort als String zurück.
         :param prompt: Prompt für die KI
         :param model: Modellname (optional)
         :param tagger: Tagger-Objekt (optional, für Statusmeldungen)
         :param file_name: Dateiname (optional, für Logging)
-        :return: Antwort der KI als String
+        :param token: Abbruch-Token (optional)
+        :param settings: Einstellungs-Schnappschuss (optional)
+        :param images: Base64-kodierte Bilder (optional, nur mit supports_images)
+        :param json_mode: Antwort als JSON anfordern (nur mit supports_json_mode)
+        :return: Antwort der KI, Fehlermeldung oder None bei Abbruch
         """
         pass
 
+    async def call_many(self, prompts: Sequence[str], model: Optional[str] = None, tagger: Any = None,
+                        file_names: Optional[Sequence[Optional[str]]] = None, token: Any = None, settings: Any = None,
+                        json_mode: bool = False) -> List[Optional[str]]:
+        """
+        Führt mehrere Requests aus; Standard: gleichzeitig bis max_concurrency.
+        Provider mit nativer Batch-API überschreiben diese Methode.
+        :param prompts: Prompts
+        :param file_names: (optional) Dateinamen pro Prompt für Logging
+        :return: Antworten in Eingabereihenfolge
+        """
+        names = list(file_names) if file_names is not None else [None] * len(prompts)
+        semaphore = asyncio.Semaphore(max(1, self.capabilities().max_concurrency))
+
+        async def _one(prompt: str, file_name: Optional[str]) -> Optional[str]:
+            async with semaphore:
+                return await self.call(prompt, model, tagger, file_name, token=token, settings=settings, json_mode=json_mode)
+        return list(await asyncio.gather(*(_one(p, n) for p, n in zip(prompts, names))))
+
+    async def stream(self, prompt: str, model: Optional[str] = None, tagger: Any = None, file_name: Optional[str] = None,
+                     token: Any = None, settings: Any = None, json_mode: bool = False) -> AsyncIterator[str]:
+        """
+        Liefert die Antwort in Teilen; Standard: die komplette Antwort als ein Teil.
+        Bricht der Stream wegen eines Fehlers ab, wird ProviderError ausgelöst (kein Teilergebnis);
+        bei Abbruch über das Token endet er ohne Fehler.
+        :return: Asynchroner Iterator über Antwortteile
+        """
+        result = await self.call(prompt, model, tagger, file_name, token=token, settings=settings, json_mode=json_mode)
+        if result is not None:
+            yield result
+
     def log_info(self, message: str) -> None:
         """Loggt eine Info-Nachricht für den Provider."""
         self.logger.info(message)
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+from ..config import get_snapshot
+from ..logging import log_event
+from ..utils import msg
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit Breaker für KI-Provider.
+    - closed: Requests laufen normal, Fehler werden in einem Zeitfenster gezählt.
+    - open: Nach zu vielen Fehlern im Fenster schlagen Requests sofort fehl.
+    - half_open: Nach der Wartezeit darf ein Probe-Request durch; Erfolg schließt
+      den Breaker wieder, ein Fehler öffnet ihn erneut.
+    """
+    def __init__(self, name: str):
+        """
+        :param name: Name für Logging (z.B. "Ollama")
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures: Deque[float] = deque()
+        self._opened_at: float = 0.0
+        self._probe_running = False
+        self.last_error: Optional[str] = None
+
+    @staticmethod
+    def _settings():
+        settings = get_snapshot()
+        return settings.circuit_failure_threshold, settings.circuit_failure_window, settings.circuit_open_seconds
+
+    @property
+    def state(self) -> str:
+        """Aktueller Zustand; ein offener Breaker wird nach der Wartezeit als half_open gemeldet."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self._settings()[2]:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> Tuple[bool, bool]:
+        """
+        Prüft, ob ein Request durchgelassen wird.
+        Im Zustand half_open wird genau ein Probe-Request zugelassen.
+        :return: (darf ausgeführt werden, ist der Probe-Request); nur der Probe-Request
+                 gibt den Slot mit release_probe() frei
+        """
+        _, _, open_seconds = self._settings()
+        with self._lock:
+            if self._state == CLOSED:
+                return True, False
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < open_seconds:
+                    return False, False
+                self._state = HALF_OPEN
+                self._probe_running = False
+            if self._probe_running:
+                return False, False
+            self._probe_running = True
+            return True, True
+
+    def record_success(self) -> None:
+        """Meldet einen erfolgreichen Request."""
+        with self._lock:
+            if self._state != CLOSED:
+                log_event("info", msg(f"Circuit Breaker {self.name} geschlossen", f"Circuit breaker {self.name} closed"))
+            self._state = CLOSED
+            self._failures.clear()
+            self._probe_running = False
+            self.last_error = None
+
+    def record_failure(self, error: Optional[str] = None) -> None:
+        """
+        Meldet einen fehlgeschlagenen Request (nur Backend-Fehler, keine Abbrüche).
+        :param error: (optional) Fehlertext für die Sammelmeldung
+        """
+        threshold, window, open_seconds = self._settings()
+        now = time.monotonic()
+        with self._lock:
+            self.last_error = error or self.last_error
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > window:
+                self._failures.popleft()
+            if self._state == HALF_OPEN or (self._state == CLOSED and len(self._failures) >= threshold):
+                self._state = OPEN
+                self._opened_at = now
+                self._probe_running = False
+                log_event("warning", msg(
+                    f"Circuit Breaker {self.name} geöffnet, Requests schlagen {open_seconds:.0f}s lang sofort fehl",
+                    f"Circuit breaker {self.name} opened, requests fail fast for {open_seconds:.0f}s"
+                ), failures=len(self._failures), error=self.last_error)
+
+    def release_probe(self) -> None:
+        """
+        Gibt den Probe-Slot frei, wenn der Probe-Request weder Erfolg noch Fehler meldete (z.B. Abbruch).
+        Nur vom Inhaber des Slots aufzurufen (allow() lieferte probe=True).
+        """
+        with self._lock:
+            self._probe_running = False
@@ -0,0 +1,237 @@
+import aiohttp
+import asyncio
+import threading
+import time
+from typing import AbstractSet, FrozenSet, Iterable, List, Optional, Set
+from ..config import get_snapshot
+from ..logging import log_event
+from ..utils import msg
+from .registry import model_aliases, model_registry, serves_model
+
+
+class Endpoint:
+    """
+    Ein Ollama-Backend im Endpoint-Pool mit Lastzustand und Health-Status.
+    """
+    def __init__(self, url: str):
+        """
+        :param url: Basis-URL des Backends (z.B. "http://localhost:11434")
+        """
+        self.url = url.rstrip("/")
+        self.outstanding: int = 0
+        self.ewma: Optional[float] = None  # geglättete Antwortzeit in Sekunden
+        # Modelle laut Modell-Registry; None = unbekannt (noch kein /api/tags)
+        self.models: Optional[AbstractSet[str]] = model_registry.endpoint_models(self.url)
+        self.missing: Set[str] = set()  # Modelle, für die das Backend 404 lieferte (bis zur nächsten Modelländerung)
+        self.failures: int = 0
+        self.ejected_until: float = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        """True, wenn das Backend nicht (mehr) ausgeschlossen ist."""
+        return time.monotonic() >= self.ejected_until
+
+    def serves(self, model: Optional[str]) -> bool:
+        """True, wenn das Modell auf dem Backend vorhanden ist (oder die Modelle noch unbekannt sind)."""
+        if model is None:
+            return True
+        if self.missing and serves_model(self.missing, model):
+            return False
+        return self.models is None or serves_model(self.models, model)
+
+    def eject(self, seconds: float) -> None:
+        """Schließt das Backend für eine gewisse Zeit von der Lastverteilung aus."""
+        self.ejected_until = time.monotonic() + seconds
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.url!r}, outstanding={self.outstanding}, ewma={self.ewma})"
+
+
+class EndpointPool:
+    """
+    Pool von Ollama-Backends mit Lastverteilung und Health-Checks.
+    Jeder Request geht an das Backend mit den wenigsten offenen Requests
+    (Strategie "least_outstanding") bzw. mit der kleinsten gewichteten
+    Antwortzeit (Strategie "ewma"), das das angefragte Modell anbietet.
+    Fehlerhafte Backends werden vorübergehend ausgeschlossen.
+    """
+    def __init__(self, urls: Iterable[str], health_interval: float = 0.0):
+        """
+        :param urls: Basis-URLs der Backends
+        :param health_interval: Abstand der Health-Checks in Sekunden (<= 0 = keine);
+                                sie starten erst mit dem ersten Request (acquire)
+        """
+        self.endpoints: List[Endpoint] = [Endpoint(u) for u in urls if u]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    @property
+    def urls(self) -> List[str]:
+        return [e.url for e in self.endpoints]
+
+    def acquire(self, model: Optional[str] = None, exclude: Iterable[Endpoint] = ()) -> Optional[Endpoint]:
+        """
+        Wählt ein Backend für einen Request und zählt ihn als offen.
+        :param model: (optional) Angefragtes Modell
+        :param exclude: (optional) Backends, die nicht gewählt werden sollen (z.B. bereits fehlgeschlagen)
+        :return: Gewähltes Backend oder None, wenn der Pool leer ist
+        """
+        if self._health_thread is None and self.health_interval > 0:
+            # Nicht schon beim Import starten (Tests, Prozess-Pool, Wiedergabe-Modus)
+            self.start_health_checks(self.health_interval)
+        strategy = get_snapshot().ollama_balance_strategy
+        excluded = set(id(e) for e in exclude)
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.serves(model)] or list(self.endpoints)
+            if not candidates:
+                return None
+            preferred = [e for e in candidates if e.healthy and id(e) not in excluded]
+            if not preferred:
+                preferred = [e for e in candidates if e.healthy] or candidates
+            if strategy == "ewma":
+                # Erwartete Wartezeit: (offene Requests + 1) * geglättete Antwortzeit
+                def key(e: Endpoint):
+                    return ((e.outstanding + 1) * (e.ewma or 0.0), e.outstanding)
+            else:
+                def key(e: Endpoint):
+                    return (e.outstanding, e.ewma or 0.0)
+            if all(not e.healthy for e in preferred):
+                # Alle ausgeschlossen: das Backend nehmen, das am frühesten wieder verfügbar ist
+                endpoint = min(preferred, key=lambda e: e.ejected_until)
+            else:
+                endpoint = min(preferred, key=key)
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, elapsed: Optional[float] = None, failed: bool = False) -> None:
+        """
+        Meldet das Ende eines Requests an ein Backend.
+        :param endpoint: Backend aus acquire()
+        :param elapsed: (optional) Antwortzeit in Sekunden (für die EWMA)
+        :param failed: True, wenn der Request wegen eines Backend-Fehlers fehlschlug
+        """
+        settings = get_snapshot()
+        alpha = settings.ollama_ewma_alpha
+        eject_after = settings.ollama_eject_after
+        eject_seconds = settings.ollama_eject_seconds
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            if failed:
+                endpoint.failures += 1
+                if endpoint.failures >= eject_after and endpoint.healthy:
+                    endpoint.eject(eject_seconds)
+                    log_event("warning", msg(
+                        "Ollama-Backend vorübergehend ausgeschlossen",
+                        "Ollama backend temporarily ejected"
+                    ), url=endpoint.url, failures=endpoint.failures, seconds=eject_seconds)
+            else:
+                endpoint.failures = 0
+                if elapsed is not None:
+                    endpoint.ewma = elapsed if endpoint.ewma is None else alpha * elapsed + (1 - alpha) * endpoint.ewma
+
+    def mark_missing(self, endpoint: Endpoint, model: str) -> None:
+        """
+        Merkt vor, dass ein Backend das Modell nicht hat (404), ohne es für andere Modelle auszuschließen.
+        Gilt bis zur nächsten geänderten /api/tags-Antwort des Backends.
+        """
+        with self._lock:
+            endpoint.missing.update(model_aliases(model))
+
+    def available_models(self) -> Optional[FrozenSet[str]]:
+        """
+        Gibt die Vereinigung der Modelle aller Backends zurück (aus der Modell-Registry, O(1)).
+        :return: Menge der Modellnamen oder None, solange kein Backend seine Modelle gemeldet hat
+        """
+        return model_registry.models
+
+    async def check_health(self) -> None:
+        """
+        Fragt /api/tags aller Backends ab, meldet die Antworten an die Modell-Registry und
+        schließt nicht erreichbare Backends aus bzw. nimmt sie wieder auf.
+        Mit bekanntem ETag wird If-None-Match gesendet; 304 bedeutet unveränderte Modelle.
+        """
+        eject_seconds = get_snapshot().ollama_eject_seconds
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession() as session:
+            async def _check(endpoint: Endpoint) -> None:
+                try:
+                    etag = model_registry.etag(endpoint.url)
+                    headers = {"If-None-Match": etag} if etag else None
+                    async with session.get(endpoint.url + "/api/tags", timeout=timeout, headers=headers) as response:
+                        response.raise_for_status()
+                        if response.status == 304:
+                            changed = None
+                        else:
+                            changed = model_registry.observe(endpoint.url, await response.json(), response.headers.get("ETag"))
+                    with self._lock:
+                        was_ejected = not endpoint.healthy
+                        if changed is not None:
+                            endpoint.missing.clear()
+                        # Auch bei unveränderter Signatur (z.B. nach Neuaufbau des Pools) aus der Registry übernehmen
+                        endpoint.models = model_registry.endpoint_models(endpoint.url)
+                        endpoint.failures = 0
+                        endpoint.ejected_until = 0.0
+                    if was_ejected:
+                        log_event("info", msg("Ollama-Backend wieder verfügbar", "Ollama backend available again"), url=endpoint.url)
+                except Exception as e:
+                    with self._lock:
+                        was_healthy = endpoint.healthy
+                        endpoint.eject(eject_seconds)
+                    if was_healthy:
+                        log_event("warning", msg(
+                            "Health-Check für Ollama-Backend fehlgeschlagen",
+                            "Health check for Ollama backend failed"
+                        ), url=endpoint.url, error=str(e))
+            await asyncio.gather(*(_check(e) for e in self.endpoints))
+
+    def start_health_checks(self, interval: float) -> None:
+        """
+        Startet die periodischen Health-Checks in einem Hintergrund-Thread (einmalig).
+        :param interval: Abstand der Checks in Sekunden (<= 0 = deaktiviert)
+        """
+        with self._lock:
+            if interval <= 0 or self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._run_health_checks, args=(interval,), name="aiid-ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def _run_health_checks(self, interval: float) -> None:
+        while not self._stop.is_set():
+            try:
+                asyncio.run(self.check_health())
+            except Exception as e:
+                log_event("warning", "Health-Check-Durchlauf fehlgeschlagen", error=str(e))
+            self._stop.wait(interval)
+
+    def stop(self) -> None:
+        """Beendet die Health-Checks."""
+        self._stop.set()
+
+
+_pool: Optional[EndpointPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_endpoint_pool() -> EndpointPool:
+    """
+    Gibt den Endpoint-Pool zurück und baut ihn neu auf, wenn sich die konfigurierten URLs geändert haben.
+    "aiid_ollama_urls" (Liste oder komma-/zeilengetrennt) hat Vorrang vor "aiid_ollama_url".
+    :return: EndpointPool
+    """
+    global _pool
+    settings = get_snapshot()
+    urls = list(settings.ollama_urls)
+    with _pool_lock:
+        if _pool is None or _pool.urls != urls:
+            if _pool is not None:
+                _pool.stop()
+                for url in set(_pool.urls) - set(urls):
+                    model_registry.forget(url)
+            _pool = EndpointPool(urls, settings.ollama_health_interval)
+            log_event("info", msg("Ollama-Endpoint-Pool initialisiert", "Ollama endpoint pool initialised"), urls=", ".join(urls))
+        return _pool
@@ -0,0 +1,117 @@
+import aiohttp
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from ..config import get_snapshot
+from ..logging import log_event
+from ..utils import msg
+from ..cancellation import CancellationToken, RequestCancelled, run_cancellable
+from .endpoints import get_endpoint_pool
+
+
+class ModelLifecycleManager:
+    """
+    Verwaltet Laden und Keep-Alive der Ollama-Modelle.
+    Lädt das Modell zu Beginn eines Batches vor, hält es per "keep_alive" für
+    die Dauer des Batches im Speicher und trennt anhand der Timing-Felder der
+    Ollama-Antwort Ladezeit von Generierungszeit, damit Kaltstarts weder die
+    adaptive Parallelisierung noch die Metriken verfälschen.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batch_depth: int = 0
+        self._cold_starts: int = 0
+        self._load_time_total: float = 0.0
+
+    @property
+    def batch_active(self) -> bool:
+        """True, solange mindestens ein Batch läuft."""
+        return self._batch_depth > 0
+
+    def keep_alive(self) -> Optional[str]:
+        """
+        Gibt den keep_alive-Wert für den nächsten Request zurück.
+        :return: Batch-Wert während eines Batches, sonst der konfigurierte Wert (None = Ollama-Default)
+        """
+        settings = get_snapshot()
+        if self._batch_depth > 0:
+            return settings.ollama_keep_alive_batch
+        return settings.ollama_keep_alive or None
+
+    def analyze_timing(self, result_json: Dict[str, Any], elapsed: float) -> Tuple[float, bool]:
+        """
+        Trennt Modell-Ladezeit und Generierungszeit einer Ollama-Antwort.
+        Ollama liefert die Dauern in Nanosekunden ("load_duration", "total_duration").
+        :param result_json: JSON-Antwort von /api/generate
+        :param elapsed: Gemessene Gesamtdauer in Sekunden
+        :return: (Dauer ohne Ladezeit in Sekunden, True bei Kaltstart)
+        """
+        load = float(result_json.get("load_duration") or 0) / 1e9
+        cold = load >= get_snapshot().ollama_cold_start_threshold
+        if cold:
+            with self._lock:
+                self._cold_starts += 1
+                self._load_time_total += load
+        return max(0.0, elapsed - load), cold
+
+    def stats(self) -> Dict[str, float]:
+        """Gibt Anzahl und Gesamtdauer der erkannten Kaltstarts zurück."""
+        with self._lock:
+            return {"cold_starts": self._cold_starts, "load_time_total": round(self._load_time_total, 3)}
+
+    async def warm_up(self, model: str, token: Optional[CancellationToken] = None) -> None:
+        """
+        Lädt ein Modell auf allen Backends vor, die es anbieten.
+        Ein Generate-Request ohne Prompt lädt das Modell nur, ohne Text zu erzeugen.
+        :param model: Modellname
+        :param token: (optional) Abbruch-Token
+        """
+        pool = get_endpoint_pool()
+        endpoints = [e for e in pool.endpoints if e.healthy and e.serves(model)]
+        data: Dict[str, Any] = {"model": model}
+        keep_alive = self.keep_alive()
+        if keep_alive:
+            data["keep_alive"] = keep_alive
+        timeout = aiohttp.ClientTimeout(total=get_snapshot().ollama_timeout)
+
+        async def _load(session: aiohttp.ClientSession, url: str) -> None:
+            start = time.time()
+            try:
+                async with session.post(url + "/api/generate", json=data, timeout=timeout) as response:
+                    response.raise_for_status()
+                    result_json = await response.json()
+                load = float(result_json.get("load_duration") or 0) / 1e9
+                log_event("info", msg("Modell vorgeladen", "Model preloaded"), url=url, model=model,
+                          load=round(load, 2), elapsed=round(time.time() - start, 2), keep_alive=keep_alive)
+            except Exception as e:
+                log_event("warning", msg("Modell konnte nicht vorgeladen werden", "Could not preload model"),
+                          url=url, model=model, error=str(e))
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                await run_cancellable(asyncio.gather(*(_load(session, e.url) for e in endpoints)), token)
+        except RequestCancelled:
+            log_event("info", msg("Vorladen abgebrochen", "Preload cancelled"), model=model)
+
+    @asynccontextmanager
+    async def batch(self, model: str, token: Optional[CancellationToken] = None) -> AsyncIterator[None]:
+        """
+        Kontext für einen Batch: Modell vorladen und für die Batch-Dauer geladen halten.
+        :param model: Modellname
+        :param token: (optional) Abbruch-Token
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            if get_snapshot().ollama_preload:
+                await self.warm_up(model, token)
+            yield
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+            log_event("info", msg("Batch beendet, Modell-Lebenszyklus", "Batch finished, model lifecycle"), model=model, **self.stats())
+
+
+model_lifecycle = ModelLifecycleManager()
@@ -1,58 +1,46 @@
 import aiohttp
 import asyncio
-from typing import Any, Optional
+import json
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from picard import log  # type: ignore[import]
-from PyQt6 import QtWidgets
-from ..utils import is_debug_logging, msg
-from ..config import get_setting
-from .base import AIProviderBase
+from ..utils import is_debug_logging, msg, show_error
+from ..cache import get_negative, put_negative
+from ..config import SettingsSnapshot, get_snapshot
+from .base import AIProviderBase, ProviderCapabilities, ProviderError, backend_timing
+from .endpoints import Endpoint, EndpointPool, get_endpoint_pool
+from .lifecycle import model_lifecycle
+from .circuit import CircuitBreaker, CLOSED
+from .registry import model_registry
 from ..logging import log_event, log_exception
+from ..profiling import profiled
+from ..cancellation import CancellationToken, RequestCancelled, DeadlineExceeded, run_cancellable
 
 class OllamaProvider(AIProviderBase):
     """
     Provider für Ollama-API (lokal).
     Erbt von AIProviderBase und implementiert die call-Methode.
+    Requests werden über den Endpoint-Pool auf alle konfigurierten Ollama-Backends verteilt.
+    Ein Circuit Breaker lässt Requests bei ausgefallenem Backend sofort fehlschlagen.
     """
     _semaphore: Optional[asyncio.Semaphore] = None
-    _available_models: Optional[set] = None
+    _breaker: CircuitBreaker = CircuitBreaker("Ollama")
     _response_times: list = []
     _error_count: int = 0
     _min_parallel: int = 1
     _max_parallel: int = 10
     _adjust_threshold: int = 5  # Nach wie vielen Requests wird angepasst?
     _slow_threshold: float = 8.0  # Sek.
-
-    @staticmethod
-    async def log_available_models():
-        """Liest die lokal verfügbaren Ollama-Modelle aus, loggt sie und speichert sie in _available_models."""
-        url = str(get_setting("aiid_ollama_url", "http://localhost:11434"))
-        url += "/api/tags"
-        try:
-            async with aiohttp.ClientSession() as session:
-                timeout = aiohttp.ClientTimeout(total=10)
-                async with session.get(url, timeout=timeout) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    models = [m["name"] for m in data.get("models", [])]
-                    OllamaProvider._available_models = set(models)
-                    log_event("info", "Verfügbare Ollama-Modelle", models=", ".join(models))
-        except Exception as e:
-            log_event("warning", "Konnte Ollama-Modelle nicht abrufen", error=str(e))
-            OllamaProvider._available_models = None
+    _in_flight: int = 0  # Laufende HTTP-Requests an alle Backends (über alle Event-Loops)
+    _in_flight_lock = threading.Lock()
 
     def __init__(self):
         super().__init__(name="Ollama")
         if OllamaProvider._semaphore is None:
-            max_parallel_raw = get_setting("aiid_ollama_max_parallel_requests", 3)
-            max_parallel = int(max_parallel_raw) if max_parallel_raw is not None else 3
-            OllamaProvider._semaphore = asyncio.Semaphore(max_parallel)
-        # Modelle beim ersten Init loggen (nur einmal pro Session)
-        if not hasattr(OllamaProvider, "_models_logged"):
-            try:
-                asyncio.create_task(OllamaProvider.log_available_models())
-            except Exception:
-                pass
-            OllamaProvider._models_logged = True
+            max_parallel = get_snapshot().ollama_max_parallel_requests
+            # Parallelität skaliert mit der Anzahl der Backends; die Health-Checks, die die
+            # Modell-Registry füllen, startet der Pool erst mit dem ersten Request
+            OllamaProvider._semaphore = asyncio.Semaphore(max_parallel * max(1, len(get_endpoint_pool())))
 
     def _adjust_parallelism(self):
         """Passt die Semaphore dynamisch an die Performance an."""
@@ -72,85 +60,196 @@ class OllamaProvider(AIProviderBase):
         self._response_times.clear()
         self._error_count = 0
 
+    @profiled("ollama.call")
     async def call(
         self,
         prompt: str,
         model: str = "mistral",
         tagger: Any = None,
-        file_name: Optional[str] = None
-    ) -> str:
+        file_name: Optional[str] = None,
+        token: Optional[CancellationToken] = None,
+        settings: Optional[SettingsSnapshot] = None,
+        images: Optional[List[str]] = None,
+        json_mode: bool = False
+    ) -> Optional[str]:
         """
         Führt eine asynchrone Anfrage an die Ollama-API aus und gibt die Antwort zurück.
+        Bei Abbruch über das Token (oder abgelaufener Deadline) wird None zurückgegeben.
+        :param settings: (optional) Einstellungs-Schnappschuss, sonst der aktuelle
+        :param images: (optional) Base64-kodierte Bilder für multimodale Modelle (z.B. llava)
+        :param json_mode: Antwort als JSON anfordern (Ollama "format": "json")
         """
-        # Retry-Konfiguration
-        max_retries_raw = get_setting("aiid_ollama_max_retries", 2)
-        max_retries = int(max_retries_raw) if max_retries_raw is not None else 2
-        backoff_base_raw = get_setting("aiid_ollama_retry_backoff", 2.0)
-        backoff_base = float(backoff_base_raw) if backoff_base_raw is not None else 2.0
-        # Prüfe, ob das Modell lokal verfügbar ist
-        if OllamaProvider._available_models is not None:
-            if model not in OllamaProvider._available_models:
-                msg_text = msg(
-                    f"Das Modell '{model}' ist lokal nicht installiert. Verfügbare Modelle: {', '.join(OllamaProvider._available_models)}",
-                    f"The model '{model}' is not installed locally. Available models: {', '.join(OllamaProvider._available_models)}"
-                )
-                log_event("warning", msg(
-                    "Angefordertes Modell nicht installiert",
-                    "Requested model not installed"
-                ), requested=model, available=", ".join(OllamaProvider._available_models))
-                if tagger and hasattr(tagger, 'window'):
-                    tagger.window.set_statusbar_message(msg_text)
-                return msg_text
-        # Adaptive Parallelisierung: Parameter aus Config
-        min_parallel_raw = get_setting("aiid_ollama_min_parallel", 1)
-        self._min_parallel = int(min_parallel_raw) if min_parallel_raw is not None else 1
-        max_parallel_raw = get_setting("aiid_ollama_max_parallel", 10)
-        self._max_parallel = int(max_parallel_raw) if max_parallel_raw is not None else 10
-        adjust_threshold_raw = get_setting("aiid_ollama_adjust_threshold", 5)
-        self._adjust_threshold = int(adjust_threshold_raw) if adjust_threshold_raw is not None else 5
-        slow_threshold_raw = get_setting("aiid_ollama_slow_threshold", 8.0)
-        self._slow_threshold = float(slow_threshold_raw) if slow_threshold_raw is not None else 8.0
+        try:
+            return await self._call(prompt, model, tagger, file_name, token, settings or get_snapshot(), images, json_mode)
+        except RequestCancelled as e:
+            log_event("info", msg(
+                "KI-Request abgebrochen" if not isinstance(e, DeadlineExceeded) else "KI-Request: Deadline abgelaufen",
+                "AI request cancelled" if not isinstance(e, DeadlineExceeded) else "AI request: deadline exceeded"
+            ), file=file_name, model=model)
+            return None
+
+    async def _call(
+        self,
+        prompt: str,
+        model: str,
+        tagger: Any,
+        file_name: Optional[str],
+        token: Optional[CancellationToken],
+        settings: SettingsSnapshot,
+        images: Optional[List[str]] = None,
+        json_mode: bool = False
+    ) -> str:
+        refused, probe = self._preflight(prompt, model, tagger, file_name)
+        if refused is not None:
+            return refused
+        pool = get_endpoint_pool()
+        try:
+            return await self._send(prompt, model, tagger, file_name, token, settings, pool, images, json_mode)
+        finally:
+            # Eigenen Probe-Slot (half_open) auf jedem Rückweg freigeben, auch ohne Erfolg/Fehler-Meldung
+            if probe:
+                OllamaProvider._breaker.release_probe()
+
+    def _preflight(self, prompt: str, model: str, tagger: Any, file_name: Optional[str]) -> Tuple[Optional[str], bool]:
+        """
+        Prüfungen vor jedem Request (call und stream): Negativ-Cache, Modell-Registry, Circuit Breaker.
+        :return: (Meldung, wenn der Request nicht gesendet wird, sonst None; True, wenn der Request
+                 der Probe-Request des Circuit Breakers ist und den Slot mit release_probe() freigeben muss)
+        """
+        # Deterministische Fehler (z.B. unbekanntes Modell) kurzzeitig aus dem Negativ-Cache beantworten
+        negative = get_negative(f"model::{model}") or get_negative(f"prompt::{model}::{prompt}")
+        if negative is not None:
+            return negative, False
+        # Prüfe, ob das Modell auf mindestens einem Backend verfügbar ist (O(1), ohne auf /api/tags zu warten)
+        if model_registry.contains(model) is False:
+            available_models = sorted(model_registry.models or ())
+            # Evtl. gerade erst installiert: Registry im Hintergrund aktualisieren
+            model_registry.request_refresh()
+            msg_text = msg(
+                f"Das Modell '{model}' ist lokal nicht installiert. Verfügbare Modelle: {', '.join(available_models)}",
+                f"The model '{model}' is not installed locally. Available models: {', '.join(available_models)}"
+            )
+            log_event("warning", msg(
+                "Angefordertes Modell nicht installiert",
+                "Requested model not installed"
+            ), requested=model, available=", ".join(available_models))
+            if tagger and hasattr(tagger, 'window'):
+                tagger.window.set_statusbar_message(msg_text)
+            put_negative(f"model::{model}", msg_text)
+            return msg_text, False
+        # Circuit Breaker offen: sofort fehlschlagen statt Retries mit Backoff
+        allowed, probe = OllamaProvider._breaker.allow()
+        if not allowed:
+            msg_text = msg(
+                f"[Netzwerkfehler] Ollama nicht erreichbar, Anfrage für Datei {file_name} übersprungen: {OllamaProvider._breaker.last_error}",
+                f"[Network error] Ollama unreachable, request for file {file_name} skipped: {OllamaProvider._breaker.last_error}"
+            )
+            if tagger and hasattr(tagger, 'window'):
+                tagger.window.set_statusbar_message(msg_text)
+            return msg_text, False
+        return None, probe
+
+    async def _send(
+        self,
+        prompt: str,
+        model: str,
+        tagger: Any,
+        file_name: Optional[str],
+        token: Optional[CancellationToken],
+        settings: SettingsSnapshot,
+        pool: EndpointPool,
+        images: Optional[List[str]] = None,
+        json_mode: bool = False
+    ) -> str:
+        """Führt den Request mit Retries und Failover aus (nachdem der Circuit Breaker ihn zugelassen hat)."""
+        max_retries = settings.ollama_max_retries
+        backoff_base = settings.ollama_retry_backoff
+        # Adaptive Parallelisierung: Parameter aus Config (pro Backend, skaliert mit der Pool-Größe)
+        backends = max(1, len(pool))
+        self._min_parallel = settings.ollama_min_parallel * backends
+        self._max_parallel = settings.ollama_max_parallel * backends
+        self._adjust_threshold = settings.ollama_adjust_threshold
+        self._slow_threshold = settings.ollama_slow_threshold
+        min_attempt = settings.ollama_min_attempt_seconds
         semaphore = OllamaProvider._semaphore or asyncio.Semaphore(3)
-        async with semaphore:
-            url = str(get_setting("aiid_ollama_url"))
-            url += "/api/generate"
-            data = {"model": model, "prompt": prompt, "stream": False}
-            timeout_raw = get_setting("aiid_ollama_timeout", 60)
-            timeout = int(timeout_raw) if timeout_raw is not None else 60
-            aio_timeout = aiohttp.ClientTimeout(total=timeout)
-            if is_debug_logging():
-                self.log_debug(f"[KI-Request] Datei: {file_name}, Modell: {model}, URL: {url}, Timeout: {timeout}, Prompt: {prompt}")
+        # Warten auf einen freien Slot ist abbrechbar (z.B. Datei wurde entfernt)
+        await run_cancellable(semaphore.acquire(), token)
+        try:
+            if token is not None and token.cancelled:
+                raise DeadlineExceeded() if token.expired else RequestCancelled()
+            data: Dict[str, Any] = {"model": model, "prompt": prompt, "stream": False}
+            if images:
+                data["images"] = images
+            if json_mode:
+                data["format"] = "json"
+            keep_alive = model_lifecycle.keep_alive()
+            if keep_alive:
+                data["keep_alive"] = keep_alive
+            timeout = settings.ollama_timeout
             import time as _time
-            start = _time.time()
             attempt = 0
+            failed_endpoints: list = []
             while True:
+                endpoint = pool.acquire(model, exclude=failed_endpoints)
+                if endpoint is None:
+                    return msg("[Konfigurationsfehler] Keine Ollama-URL konfiguriert", "[Configuration error] No Ollama URL configured")
+                url = endpoint.url + "/api/generate"
+                if settings.debug_logging:
+                    self.log_debug(f"[KI-Request] Datei: {file_name}, Modell: {model}, URL: {url}, Timeout: {timeout}, Prompt: {prompt}")
+                # Timeout des Versuchs nie über die verbleibende Deadline hinaus
+                remaining = token.remaining() if token is not None else None
+                aio_timeout = aiohttp.ClientTimeout(total=min(timeout, remaining) if remaining is not None else timeout)
+                attempt_start = _time.time()
+                attempt_elapsed: Optional[float] = None
+                endpoint_failed = False
                 try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(url, json=data, timeout=aio_timeout) as response:
-                            elapsed = _time.time() - start
-                            self._response_times.append(elapsed)
-                            if elapsed > 10:
-                                log_event("warning", "KI-Request dauerte ungewöhnlich lange", file=file_name, elapsed=elapsed)
-                            if is_debug_logging():
-                                log_event("debug", "KI-Response", file=file_name, elapsed=elapsed, status=response.status)
-                            response.raise_for_status()
-                            result_json = await response.json()
-                            result = result_json["response"].strip()
-                            log_event("info", "Ollama-Antwort erhalten", file=file_name, result=result)
-                            # Nach adjust_threshold Requests: Parallelität anpassen
-                            if len(self._response_times) >= self._adjust_threshold:
-                                self._adjust_parallelism()
-                            return result
+                    result, attempt_elapsed = await run_cancellable(self._post(url, data, aio_timeout, attempt_start, file_name), token)
+                    OllamaProvider._breaker.record_success()
+                    # Nach adjust_threshold Requests: Parallelität anpassen
+                    if len(self._response_times) >= self._adjust_threshold:
+                        self._adjust_parallelism()
+                    return result
+                except RequestCancelled:
+                    raise
                 except (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientResponseError) as e:
                     self._error_count += 1
                     is_5xx = isinstance(e, aiohttp.ClientResponseError) and 500 <= getattr(e, 'status', 0) < 600
-                    if attempt < max_retries and (isinstance(e, (asyncio.TimeoutError, aiohttp.ClientConnectionError)) or is_5xx):
-                        wait = backoff_base * (2 ** attempt)
+                    endpoint_failed = isinstance(e, (asyncio.TimeoutError, aiohttp.ClientConnectionError)) or is_5xx
+                    if endpoint_failed:
+                        failed_endpoints.append(endpoint)
+                        OllamaProvider._breaker.record_failure(str(e))
+                    else:
+                        # 4xx: Backend erreichbar, Fehler ist deterministisch
+                        OllamaProvider._breaker.record_success()
+                    if isinstance(e, aiohttp.ClientResponseError) and e.status == 404:
+                        # Modell fehlt nur auf diesem Backend: dort nicht mehr anfragen, auf ein anderes ausweichen
+                        pool.mark_missing(endpoint, model)
+                        model_registry.request_refresh()
+                        failed_endpoints.append(endpoint)
+                        if any(e2 not in failed_endpoints and e2.serves(model) for e2 in pool.endpoints):
+                            log_event("warning", msg(
+                                "Modell fehlt auf Ollama-Backend, weiche auf anderes Backend aus",
+                                "Model missing on Ollama backend, failing over to another backend"
+                            ), file=file_name, url=endpoint.url, model=model)
+                            continue
+                    # Kein Retry, wenn der Breaker inzwischen offen ist
+                    if attempt < max_retries and endpoint_failed and OllamaProvider._breaker.state == CLOSED:
+                        # Failover auf ein anderes gesundes Backend ohne Backoff
+                        has_alternative = any(e2.healthy and e2 not in failed_endpoints and e2.serves(model) for e2 in pool.endpoints)
+                        wait = 0.0 if has_alternative else backoff_base * (2 ** attempt)
+                        # Retry nur, wenn die Deadline Wartezeit und einen weiteren Versuch abdeckt
+                        remaining = token.remaining() if token is not None else None
+                        if remaining is not None and remaining < wait + min_attempt:
+                            log_event("info", msg(
+                                "Kein weiterer Versuch, Deadline reicht nicht aus",
+                                "Skipping retry, deadline too short"
+                            ), file=file_name, remaining=round(remaining, 1), wait=wait)
+                            raise DeadlineExceeded()
                         log_event("warning", msg(
                             f"Temporärer Fehler bei Ollama-Anfrage (Versuch {attempt+1}/{max_retries+1}), warte {wait:.1f}s: {e}",
                             f"Temporary error on Ollama request (attempt {attempt+1}/{max_retries+1}), waiting {wait:.1f}s: {e}"
                         ), file=file_name, error=str(e))
-                        await asyncio.sleep(wait)
+                        await run_cancellable(asyncio.sleep(wait), token)
                         attempt += 1
                         continue
                     # Wenn keine weiteren Versuche: Fehlerbehandlung wie bisher
@@ -163,22 +262,174 @@ class OllamaProvider(AIProviderBase):
                     elif isinstance(e, aiohttp.ClientResponseError):
                         msg_text = msg(f"[API-Fehler] HTTP-Fehler bei Ollama-Anfrage für Datei {file_name}: {e}", f"[API error] HTTP error on Ollama request for file {file_name}: {e}")
                         log_exception("HTTP-Fehler bei Ollama-Anfrage", file=file_name, error=str(e))
+                        if e.status == 404:
+                            # Kein Backend bietet das Modell (mehr) an
+                            put_negative(f"model::{model}", msg_text)
+                        elif 400 <= e.status < 500:
+                            put_negative(f"prompt::{model}::{prompt}", msg_text)
                     else:
                         msg_text = msg(f"[Unbekannter Fehler] Fehler bei Ollama-Anfrage für Datei {file_name}: {e}", f"[Unknown error] Error on Ollama request for file {file_name}: {e}")
                         log_exception("Unbekannter Fehler bei Ollama-Anfrage", file=file_name, error=str(e))
-                    if tagger and hasattr(tagger, 'window'):
-                        tagger.window.set_statusbar_message(msg_text)
-                        QtWidgets.QMessageBox.critical(tagger.window, str(msg("Fehler", "Error") or "Fehler"), msg_text)
+                    # Meldung über show_error, damit Batches sie zu einer Sammelmeldung bündeln
+                    show_error(tagger, msg_text)
                     return msg_text
                 except Exception as e:
                     msg_text = msg(f"[Lokaler Fehler] Fehler bei Ollama-Anfrage für Datei {file_name}: {e}", f"[Local error] Error on Ollama request for file {file_name}: {e}")
                     log_exception("Lokaler Fehler bei Ollama-Anfrage", file=file_name, error=str(e))
-                    if tagger and hasattr(tagger, 'window'):
-                        tagger.window.set_statusbar_message(msg_text)
-                        QtWidgets.QMessageBox.critical(tagger.window, str(msg("Fehler", "Error") or "Fehler"), msg_text)
+                    show_error(tagger, msg_text)
                     return msg_text
+                finally:
+                    pool.release(endpoint, elapsed=attempt_elapsed, failed=endpoint_failed)
+        finally:
+            semaphore.release()
+
+    def capabilities(self) -> ProviderCapabilities:
+        """Ollama: keine native Batch-API, Parallelität über alle Backends, Streaming und JSON-Modus."""
+        settings = get_snapshot()
+        return ProviderCapabilities(
+            max_batch=1,
+            max_concurrency=settings.ollama_max_parallel_requests * max(1, len(get_endpoint_pool())),
+            supports_streaming=True,
+            supports_json_mode=True,
+            supports_images=True,
+        )
+
+    async def stream(
+        self,
+        prompt: str,
+        model: str = "mistral",
+        tagger: Any = None,
+        file_name: Optional[str] = None,
+        token: Optional[CancellationToken] = None,
+        settings: Optional[SettingsSnapshot] = None,
+        json_mode: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Streamt die Antwort von /api/generate ("stream": true) in Teilen.
+        Gleiche Vorprüfungen wie call(), aber ohne Retries: Fehler (auch eine vorzeitig geschlossene
+        Verbindung) lösen ProviderError aus, Abbruch über das Token beendet den Stream ohne Fehler
+        (auch während auf die nächste Zeile gewartet wird).
+        :raises ProviderError: Wenn der Request abgelehnt wird oder der Stream fehlschlägt
+        """
+        settings = settings or get_snapshot()
+        refused, probe = self._preflight(prompt, model, tagger, file_name)
+        if refused is not None:
+            raise ProviderError(refused)
+        try:
+            pool = get_endpoint_pool()
+            endpoint = pool.acquire(model)
+            if endpoint is None:
+                raise ProviderError(msg("[Konfigurationsfehler] Keine Ollama-URL konfiguriert", "[Configuration error] No Ollama URL configured"))
+            data: Dict[str, Any] = {"model": model, "prompt": prompt, "stream": True}
+            if json_mode:
+                data["format"] = "json"
+            keep_alive = model_lifecycle.keep_alive()
+            if keep_alive:
+                data["keep_alive"] = keep_alive
+            remaining = token.remaining() if token is not None else None
+            timeout = settings.ollama_timeout if remaining is None else min(settings.ollama_timeout, remaining)
+            import time as _time
+            start = _time.time()
+            elapsed: Optional[float] = None
+            failed = False
+            semaphore = OllamaProvider._semaphore or asyncio.Semaphore(3)
+            try:
+                await run_cancellable(semaphore.acquire(), token)
+                try:
+                    async with aiohttp.ClientSession() as session:
+                        async with session.post(endpoint.url + "/api/generate", json=data, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                            response.raise_for_status()
+                            while True:
+                                line = await run_cancellable(response.content.readline(), token)
+                                if not line:
+                                    # Verbindung ohne "done" geschlossen: Antwort unvollständig
+                                    raise aiohttp.ClientConnectionError("stream closed before done")
+                                if not line.strip():
+                                    continue
+                                chunk = json.loads(line)
+                                if chunk.get("response"):
+                                    yield chunk["response"]
+                                if chunk.get("done"):
+                                    break
+                finally:
+                    semaphore.release()
+                elapsed = _time.time() - start
+                OllamaProvider._breaker.record_success()
+            except RequestCancelled as e:
+                log_event("info", msg(
+                    "KI-Stream abgebrochen" if not isinstance(e, DeadlineExceeded) else "KI-Stream: Deadline abgelaufen",
+                    "AI stream cancelled" if not isinstance(e, DeadlineExceeded) else "AI stream: deadline exceeded"
+                ), file=file_name, model=model)
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientResponseError) as e:
+                failed = not isinstance(e, aiohttp.ClientResponseError) or getattr(e, "status", 0) >= 500
+                if failed:
+                    OllamaProvider._breaker.record_failure(str(e))
+                else:
+                    OllamaProvider._breaker.record_success()
+                    if getattr(e, "status", 0) == 404:
+                        # Modell fehlt auf diesem Backend: wie in call() vormerken, global nur ohne Alternative
+                        pool.mark_missing(endpoint, model)
+                        model_registry.request_refresh()
+                        if not any(e2.serves(model) for e2 in pool.endpoints):
+                            put_negative(f"model::{model}", str(e))
+                log_exception("Fehler beim Streamen der Ollama-Antwort", file=file_name, error=str(e))
+                raise ProviderError(msg(
+                    f"[Netzwerkfehler] Streaming der Ollama-Antwort für Datei {file_name} fehlgeschlagen: {e}",
+                    f"[Network error] Streaming the Ollama response for file {file_name} failed: {e}"
+                )) from e
+            except ValueError as e:
+                # Ungültige Stream-Zeile: Backend erreichbar, Antwort aber unbrauchbar
+                log_exception("Ungültige Zeile im Ollama-Stream", file=file_name, error=str(e))
+                raise ProviderError(msg(
+                    f"[API-Fehler] Ungültige Streaming-Antwort von Ollama für Datei {file_name}: {e}",
+                    f"[API error] Invalid streaming response from Ollama for file {file_name}: {e}"
+                )) from e
+            finally:
+                pool.release(endpoint, elapsed=elapsed, failed=failed)
+        finally:
+            if probe:
+                OllamaProvider._breaker.release_probe()
+
+    async def _post(self, url: str, data: dict, aio_timeout: aiohttp.ClientTimeout, start: float, file_name: Optional[str]) -> Tuple[str, Optional[float]]:
+        """
+        Sendet einen einzelnen Generate-Request an Ollama (ein Versuch).
+        Wird über run_cancellable abgebrochen, wodurch die HTTP-Verbindung geschlossen wird.
+        Die Modell-Ladezeit (Kaltstart) wird aus den Timing-Feldern der Antwort herausgerechnet.
+        :return: (Antwort, Dauer ohne Ladezeit in Sekunden)
+        """
+        import time as _time
+        with OllamaProvider._in_flight_lock:
+            OllamaProvider._in_flight += 1
+            in_flight = OllamaProvider._in_flight
+        try:
+            sent = _time.monotonic()
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url, json=data, timeout=aio_timeout) as response:
+                    if is_debug_logging():
+                        log_event("debug", "KI-Response", file=file_name, elapsed=_time.time() - start, status=response.status)
+                    response.raise_for_status()
+                    result_json = await response.json()
+            # Reiner HTTP-Round-Trip für Aufzeichnungen (ohne Warten auf Slots, Retries und Backoff)
+            timing = backend_timing.get()
+            if timing is not None:
+                timing.update(elapsed=_time.monotonic() - sent, in_flight=in_flight)
+        finally:
+            with OllamaProvider._in_flight_lock:
+                OllamaProvider._in_flight -= 1
+        elapsed, cold = model_lifecycle.analyze_timing(result_json, _time.time() - start)
+        if cold:
+            # Kaltstart: nicht als Überlast werten
+            log_event("info", msg("KI-Request mit Modell-Kaltstart", "AI request with model cold start"),
+                      file=file_name, model=data.get("model"), load=round(float(result_json.get("load_duration") or 0) / 1e9, 2), elapsed=elapsed)
+        else:
+            self._response_times.append(elapsed)
+        if elapsed > 10:
+            log_event("warning", "KI-Request dauerte ungewöhnlich lange", file=file_name, elapsed=elapsed)
+        result = result_json["response"].strip()
+        log_event("info", "Ollama-Antwort erhalten", file=file_name, result=result)
+        return result, elapsed
 
 # Für Kompatibilität: bisherige Funktionsweise als Funktion (jetzt async)
 ollama_provider = OllamaProvider()
-async def call_ollama(prompt, model="mistral", tagger=None, file_name=None):
-    return await ollama_provider.call(prompt, model, tagger, file_name)
+async def call_ollama(prompt, model="mistral", tagger=None, file_name=None, token=None, settings=None, images=None, json_mode=False):
+    return await ollama_provider.call(prompt, model, tagger, file_name, token=token, settings=settings, images=images, json_mode=json_mode)
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import threading
+import time
+from typing import AbstractSet, Any, Dict, FrozenSet, Optional, Set, Tuple
+from ..logging import log_event
+from ..utils import msg
+
+
+def model_aliases(name: str) -> Tuple[str, ...]:
+    """
+    Gleichwertige Schreibweisen eines Modellnamens: Ollama ergänzt fehlende Tags um ":latest",
+    "mistral" und "mistral:latest" bezeichnen also dasselbe Modell ("mistral:7b" dagegen nicht).
+    :param name: Modellname mit oder ohne Tag (auch mit Namespace, z.B. "library/mistral")
+    :return: Name und ggf. seine Variante mit bzw. ohne ":latest"
+    """
+    name = name.strip()
+    base, sep, tag = name.rpartition(":")
+    if sep and "/" not in tag:
+        return (name, base) if tag == "latest" else (name,)
+    return (name, name + ":latest")
+
+
+def serves_model(models: AbstractSet[str], model: str) -> bool:
+    """True, wenn eine Menge von Modellnamen (z.B. aus /api/tags) das Modell enthält, unabhängig von ":latest"."""
+    return any(alias in models for alias in model_aliases(model))
+
+
+class ModelRegistry:
+    """
+    Bekannte Ollama-Modelle aller Backends.
+    Die Health-Checks des Endpoint-Pools melden jede /api/tags-Antwort; eine Änderung wird
+    über ETag bzw. eine Signatur aus Name, Digest und Größe der Modelle erkannt, und nur dann
+    wird die Modellmenge neu aufgebaut. Requests prüfen Modelle in O(1) gegen eine frozenset
+    und warten nie auf eine Aktualisierung.
+    """
+    def __init__(self, min_refresh_interval: float = 5.0):
+        """
+        :param min_refresh_interval: Mindestabstand zwischen außerplanmäßigen Aktualisierungen in Sekunden
+        """
+        self._lock = threading.Lock()
+        self._signatures: Dict[str, str] = {}
+        self._etags: Dict[str, str] = {}
+        self._per_endpoint: Dict[str, FrozenSet[str]] = {}
+        self._models: Optional[FrozenSet[str]] = None
+        self._refreshing = False
+        self._last_refresh = 0.0
+        self.min_refresh_interval = min_refresh_interval
+        self.version = 0
+
+    @property
+    def models(self) -> Optional[FrozenSet[str]]:
+        """Alle bekannten Modelle oder None, solange noch kein Backend geantwortet hat."""
+        return self._models
+
+    def contains(self, model: str) -> Optional[bool]:
+        """
+        Prüft, ob ein Modell auf mindestens einem Backend vorhanden ist ("name" = "name:latest").
+        :return: True/False oder None, wenn die Modelle noch unbekannt sind
+        """
+        models = self._models
+        return None if models is None else serves_model(models, model)
+
+    def endpoint_models(self, url: str) -> Optional[FrozenSet[str]]:
+        """Zuletzt gemeldete Modelle eines Backends oder None, solange es noch nicht geantwortet hat."""
+        return self._per_endpoint.get(url)
+
+    def etag(self, url: str) -> Optional[str]:
+        """Zuletzt gesehener ETag eines Backends (für If-None-Match)."""
+        return self._etags.get(url)
+
+    @staticmethod
+    def _signature(data: Dict[str, Any]) -> str:
+        digest = hashlib.sha1()
+        for m in sorted(data.get("models", []), key=lambda m: m.get("name", "")):
+            digest.update(f"{m.get('name')}\0{m.get('digest', '')}\0{m.get('size', '')}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def observe(self, url: str, data: Dict[str, Any], etag: Optional[str] = None) -> Optional[Set[str]]:
+        """
+        Übernimmt eine /api/tags-Antwort eines Backends.
+        :param url: Basis-URL des Backends
+        :param data: JSON-Antwort
+        :param etag: (optional) ETag-Header der Antwort
+        :return: Modelle des Backends, wenn sie sich geändert haben, sonst None
+        """
+        signature = etag or self._signature(data)
+        with self._lock:
+            if etag:
+                self._etags[url] = etag
+            if self._signatures.get(url) == signature:
+                return None
+            self._signatures[url] = signature
+            # "name" und "model" sind in /api/tags meist gleich, ältere Ollama-Versionen liefern nur "name"
+            models = frozenset(n for m in data.get("models", []) for n in (m.get("name"), m.get("model")) if n)
+            previous = self._per_endpoint.get(url, frozenset())
+            self._per_endpoint[url] = models
+            self._rebuild()
+        added, removed = models - previous, previous - models
+        if added or removed:
+            log_event("info", msg("Ollama-Modelle aktualisiert", "Ollama models updated"), url=url,
+                      added=", ".join(sorted(added)), removed=", ".join(sorted(removed)))
+        return set(models)
+
+    def forget(self, url: str) -> None:
+        """Entfernt ein Backend (z.B. nach Änderung der konfigurierten URLs)."""
+        with self._lock:
+            self._signatures.pop(url, None)
+            self._etags.pop(url, None)
+            if self._per_endpoint.pop(url, None) is not None:
+                self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._models = frozenset().union(*self._per_endpoint.values())
+        self.version += 1
+
+    def request_refresh(self) -> bool:
+        """
+        Stößt eine sofortige Aktualisierung im Hintergrund an (z.B. bei unbekanntem Modell),
+        höchstens alle min_refresh_interval Sekunden. Blockiert nicht.
+        :return: True, wenn eine Aktualisierung gestartet wurde
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshing or now - self._last_refresh < self.min_refresh_interval:
+                return False
+            self._refreshing = True
+            self._last_refresh = now
+
+        def _run() -> None:
+            from .endpoints import get_endpoint_pool
+            try:
+                asyncio.run(get_endpoint_pool().check_health())
+            except Exception as e:
+                log_event("warning", msg("Aktualisierung der Ollama-Modelle fehlgeschlagen", "Refreshing Ollama models failed"), error=str(e))
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=_run, name="aiid-model-refresh", daemon=True).start()
+        return True
+
+
+model_registry = ModelRegistry()
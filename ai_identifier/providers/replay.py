@@ -0,0 +1,236 @@
+import asyncio
+import atexit
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from ..config import SettingsSnapshot, get_snapshot
+from ..logging import log_event
+from ..utils import msg
+from ..cancellation import CancellationToken, RequestCancelled, run_cancellable
+from .base import AIProviderBase, ProviderCapabilities, backend_timing
+
+# Aufzeichnungsformat: gzip-komprimierte JSON-Lines, ein Objekt pro Antwort
+#   {"k": Request-Hash, "m": Modell, "r": Antwort, "t": Dauer des HTTP-Round-Trips [s],
+#    "o": Startzeit relativ zum Aufzeichnungsbeginn [s], "c": gleichzeitig laufende HTTP-Requests beim Senden}
+# Am Ende eine Zusammenfassung {"summary": {"requests": n, "max_concurrency": m}}.
+
+
+def request_key(prompt: str, model: str, images: Optional[List[str]] = None, json_mode: bool = False) -> str:
+    """
+    Schlüssel eines Requests für Aufzeichnung und Wiedergabe.
+    :return: SHA-1 über Modell, Prompt, Bilder und JSON-Modus
+    """
+    digest = hashlib.sha1()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    for image in images or ():
+        digest.update(b"\0")
+        digest.update(image.encode("ascii", "replace"))
+    if json_mode:
+        digest.update(b"\0json")
+    return digest.hexdigest()
+
+
+class RecordingProvider(AIProviderBase):
+    """
+    Provider, der einen anderen Provider (standardmäßig Ollama) aufruft und jedes
+    Request/Antwort-Paar mit Dauer und Gleichzeitigkeit in eine Datei schreibt.
+    Beides stammt aus der Messung des Providers auf HTTP-Ebene (backend_timing); nur wenn der
+    Provider keine liefert, wird um den gesamten Aufruf gemessen.
+    """
+    def __init__(self, path: str, inner: Optional[AIProviderBase] = None):
+        """
+        :param path: Zieldatei (gzip-JSON-Lines)
+        :param inner: (optional) Aufgerufener Provider, sonst der Ollama-Provider
+        """
+        super().__init__(name="Recording")
+        if inner is None:
+            from .ollama import ollama_provider
+            inner = ollama_provider
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._start = time.monotonic()
+        self._running = 0
+        self._max_in_flight = 0
+        self._count = 0
+
+    async def call(self, prompt: str, model: str = "mistral", tagger: Any = None, file_name: Optional[str] = None,
+                   token: Optional[CancellationToken] = None, settings: Optional[SettingsSnapshot] = None,
+                   images: Optional[List[str]] = None, json_mode: bool = False) -> Optional[str]:
+        with self._lock:
+            self._running += 1
+            concurrency = self._running
+        start = time.monotonic()
+        timing: Dict[str, float] = {}
+        reset = backend_timing.set(timing)
+        try:
+            result = await self.inner.call(prompt, model, tagger, file_name, token=token, settings=settings, images=images, json_mode=json_mode)
+        finally:
+            backend_timing.reset(reset)
+            with self._lock:
+                self._running -= 1
+        if result is None:
+            # Abgebrochen: keine verwertbare Antwort
+            return None
+        elapsed = timing.get("elapsed", time.monotonic() - start)
+        concurrency = int(timing.get("in_flight", concurrency))
+        with self._lock:
+            self._max_in_flight = max(self._max_in_flight, concurrency)
+        record = {
+            "k": request_key(prompt, model, images, json_mode), "m": model, "r": result,
+            "t": round(elapsed, 4), "o": round(start - self._start, 4), "c": concurrency,
+        }
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                self._count += 1
+        return result
+
+    def capabilities(self) -> ProviderCapabilities:
+        # Streaming würde die Antwortzeit verfälschen, daher ohne supports_streaming
+        caps = self.inner.capabilities()
+        return ProviderCapabilities(max_batch=1, max_concurrency=caps.max_concurrency,
+                                    supports_json_mode=caps.supports_json_mode, supports_images=caps.supports_images)
+
+    def close(self) -> None:
+        """Schreibt die Zusammenfassung und schließt die Datei."""
+        with self._lock:
+            if self._file is None:
+                return
+            summary = {"requests": self._count, "max_concurrency": self._max_in_flight}
+            self._file.write(json.dumps({"summary": summary}) + "\n")
+            self._file.close()
+            self._file = None
+        log_event("info", msg("KI-Aufzeichnung gespeichert", "AI recording saved"), path=self.path, **summary)
+
+
+class ReplayProvider(AIProviderBase):
+    """
+    Provider, der aufgezeichnete Antworten wiedergibt. Die aufgezeichnete Dauer wird
+    (skaliert) abgewartet und die Gleichzeitigkeit wie beim Original-Backend begrenzt,
+    sodass Messungen nur den Overhead und das Scheduling des Plugins zeigen.
+    """
+    def __init__(self, path: str, time_scale: float = 1.0, max_concurrency: Optional[int] = None):
+        """
+        :param path: Aufzeichnung von RecordingProvider
+        :param time_scale: Faktor für die Wartezeit (0 = ohne Wartezeit, 0.5 = doppelt so schnell)
+        :param max_concurrency: (optional) Maximale gleichzeitige Requests, sonst wie aufgezeichnet (0 = unbegrenzt)
+        """
+        super().__init__(name="Replay")
+        self.path = path
+        self.time_scale = max(0.0, time_scale)
+        self._responses: Dict[str, Deque[Tuple[str, float]]] = {}
+        recorded_concurrency = 0
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "summary" in record:
+                    recorded_concurrency = max(recorded_concurrency, record["summary"].get("max_concurrency", 0))
+                    continue
+                self._responses.setdefault(record["k"], deque()).append((record["r"], float(record["t"])))
+                recorded_concurrency = max(recorded_concurrency, record.get("c", 0))
+        self.max_concurrency = recorded_concurrency if max_concurrency is None else max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.hits = 0
+        self.misses = 0
+
+    def capabilities(self) -> ProviderCapabilities:
+        return ProviderCapabilities(max_batch=1, max_concurrency=self.max_concurrency or 1024,
+                                    supports_json_mode=True, supports_images=True)
+
+    def _get_semaphore(self) -> Optional[asyncio.Semaphore]:
+        # Jeder Worker nutzt eine eigene Event-Loop (asyncio.run), die Semaphore gilt pro Loop
+        if self.max_concurrency <= 0:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def call(self, prompt: str, model: str = "mistral", tagger: Any = None, file_name: Optional[str] = None,
+                   token: Optional[CancellationToken] = None, settings: Optional[SettingsSnapshot] = None,
+                   images: Optional[List[str]] = None, json_mode: bool = False) -> Optional[str]:
+        responses = self._responses.get(request_key(prompt, model, images, json_mode))
+        if not responses:
+            self.misses += 1
+            log_event("warning", msg("Keine Aufzeichnung für KI-Request", "No recording for AI request"), file=file_name, model=model)
+            return "Fehler: keine Aufzeichnung für diesen Request"
+        self.hits += 1
+        # Mehrfach aufgezeichnete Requests der Reihe nach wiedergeben
+        result, elapsed = responses[0]
+        responses.rotate(-1)
+        semaphore = self._get_semaphore()
+        try:
+            if semaphore is not None:
+                await run_cancellable(semaphore.acquire(), token)
+            try:
+                if elapsed and self.time_scale:
+                    await run_cancellable(asyncio.sleep(elapsed * self.time_scale), token)
+            finally:
+                if semaphore is not None:
+                    semaphore.release()
+        except RequestCancelled:
+            return None
+        return result
+
+
+_override: Optional[AIProviderBase] = None
+_from_settings: Dict[Tuple[str, str, float], AIProviderBase] = {}
+_providers_lock = threading.Lock()
+
+
+def set_provider(provider: Optional[AIProviderBase]) -> None:
+    """
+    Setzt programmatisch einen Provider für alle KI-Requests (z.B. ReplayProvider für Benchmarks).
+    :param provider: Provider oder None für den normalen Betrieb
+    """
+    global _override
+    _override = provider
+
+
+def active_provider(settings: Optional[SettingsSnapshot] = None) -> Optional[AIProviderBase]:
+    """
+    Gibt den Aufzeichnungs-/Wiedergabe-Provider zurück, falls aktiv.
+    Reihenfolge: set_provider(), dann "aiid_provider_mode" ("record"/"replay") mit "aiid_provider_record_file".
+    :return: Provider oder None (normaler Betrieb)
+    """
+    if _override is not None:
+        return _override
+    settings = settings or get_snapshot()
+    mode = settings.provider_mode
+    if mode not in ("record", "replay") or not settings.provider_record_file:
+        return None
+    key = (mode, settings.provider_record_file, settings.provider_replay_time_scale)
+    with _providers_lock:
+        provider = _from_settings.get(key)
+        if provider is None:
+            if mode == "record":
+                provider = RecordingProvider(settings.provider_record_file)
+            else:
+                provider = ReplayProvider(settings.provider_record_file, time_scale=settings.provider_replay_time_scale)
+            _from_settings[key] = provider
+            log_event("info", msg("KI-Provider-Modus aktiv", "AI provider mode active"), mode=mode, path=settings.provider_record_file)
+        return provider
+
+
+def close_providers() -> None:
+    """Schließt offene Aufzeichnungen (z.B. beim Beenden)."""
+    with _providers_lock:
+        for provider in _from_settings.values():
+            if isinstance(provider, RecordingProvider):
+                provider.close()
+        _from_settings.clear()
+
+
+atexit.register(close_providers)
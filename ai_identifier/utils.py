@@ -1,13 +1,19 @@
 # Hilfsfunktionen für AI Music Identifier Plugin
 
 # pyright: reportMissingImports=false
-import difflib
 import locale
 import logging as std_logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
 from PyQt6 import QtWidgets
-from .constants import VALID_GENRES, VALID_MOODS
-from typing import Any, Optional
+from .pooltasks import validate_value
+from typing import Any, Iterator, Optional
 from . import logging
+from .profiling import profiled
+
+# Sammelmeldungen: pro Thread, damit Hintergrund-Threads keine UI-Meldungen anderer Threads schlucken
+_error_aggregation = threading.local()
 
 def msg(de: str, en: Optional[str] = None) -> str:
     """
@@ -19,24 +25,9 @@ def msg(de: str, en: Optional[str] = None) -> str:
     lang = locale.getdefaultlocale()[0]
     return de if lang and lang.startswith("de") else en if en else de
 
+@profiled("utils.validate_ki_value")
 def validate_ki_value(field, value):
-    if not value:
-        return (True, value, None)
-    if field == "genre":
-        valid_list = VALID_GENRES
-    elif field == "mood":
-        valid_list = VALID_MOODS
-    else:
-        return (True, value, None)
-    # Exakte Übereinstimmung (case-insensitive)
-    for v in valid_list:
-        if v.lower() == value.strip().lower():
-            return (True, v, None)
-    # Fuzzy-Matching
-    matches = difflib.get_close_matches(value.strip(), valid_list, n=1, cutoff=0.6)
-    if matches:
-        return (False, value, matches[0])
-    return (False, value, None)
+    return validate_value(field, value)
 
 def show_error(tagger: Any, message: Optional[str], message_en: Optional[str] = None) -> None:
     """
@@ -55,19 +46,56 @@ def show_error(tagger: Any, message: Optional[str], message_en: Optional[str] =
     title_str: str = title if title is not None else "Fehler"
     msg_str: str = msg_text if msg_text is not None else "Unbekannter Fehler"
     std_logging.getLogger().error(f"AI Music Identifier: {msg_str}")
+    errors = getattr(_error_aggregation, "errors", None)
+    if errors is not None:
+        # Während einer Sammelphase nur Statuszeile, Dialog erst am Ende
+        errors.append(msg_str)
+        if tagger and hasattr(tagger, 'window'):
+            tagger.window.set_statusbar_message(msg_str)
+        return
     if tagger and hasattr(tagger, 'window'):
         tagger.window.set_statusbar_message(msg_str)
         QtWidgets.QMessageBox.critical(tagger.window, title_str, msg_str)
 
+@contextmanager
+def aggregated_errors(tagger: Any = None, total: Optional[int] = None) -> Iterator[None]:
+    """
+    Sammelt alle Fehlermeldungen von show_error (z.B. während eines Batches) und
+    zeigt am Ende einen einzigen Sammeldialog statt eines Dialogs pro Track.
+    Verschachtelte Aufrufe werden zusammengefasst.
+    :param tagger: (optional) Picard-Tagger-Objekt
+    :param total: (optional) Anzahl verarbeiteter Elemente für die Meldung
+    """
+    outer = getattr(_error_aggregation, "errors", None) is None
+    if outer:
+        _error_aggregation.errors = []
+    try:
+        yield
+    finally:
+        if outer:
+            errors = _error_aggregation.errors
+            _error_aggregation.errors = None
+            if errors:
+                counts = Counter(errors).most_common(5)
+                lines = "\n".join(f"{n}× {text}" for text, n in counts)
+                count_de = f"{len(errors)} von {total}" if total else str(len(errors))
+                count_en = f"{len(errors)} of {total}" if total else str(len(errors))
+                show_error(
+                    tagger,
+                    f"{count_de} KI-Anfragen fehlgeschlagen:\n{lines}",
+                    f"{count_en} AI requests failed:\n{lines}"
+                )
+
 def is_debug_logging() -> bool:
     """
     Gibt True zurück, wenn Debug-Logging in der Picard-Konfiguration aktiviert ist.
+    Liest aus dem Einstellungs-Schnappschuss statt pro Log-Aufruf aus der Picard-Konfiguration.
     """
     try:
-        from picard import config
-        return bool(config.setting.get("aiid_debug_logging", False))
+        from .config import get_snapshot
+        return get_snapshot().debug_logging
     except Exception:
         return False
 
 # Hier können weitere kleine Hilfsfunktionen ergänzt werden
-__all__ = ["msg", "show_error", "is_debug_logging", "validate_ki_value"]
+__all__ = ["msg", "show_error", "aggregated_errors", "is_debug_logging", "validate_ki_value"]
@@ -4,11 +4,14 @@
 from PyQt6.QtCore import QRunnable, QObject, pyqtSignal
 from collections import deque
 import asyncio
-from .providers.ollama import call_ollama as async_call_ollama
+from .ki import call_ai_provider
 from .utils import show_error
+from .config import get_snapshot
+from .cancellation import CancellationToken, token_for_item, cancel_item
+from .profiling import span
 import threading
 from picard import log
-from typing import Any
+from typing import Any, Optional
 
 # Globale Thread-Limitierung für KI-Worker
 _MAX_KI_THREADS = 2
@@ -26,32 +29,45 @@ class AIKIRunnable(QRunnable):
     """
     QRunnable-Worker für KI-Operationen (z.B. Genre/Mood).
     """
-    def __init__(self, prompt: str, model: str, field: str, tagger: Any = None):
+    def __init__(self, prompt: str, model: str, field: str, tagger: Any = None, item_key: Optional[str] = None, token: Optional[CancellationToken] = None):
         """
         :param prompt: Prompt für die KI
         :param model: Modellname
         :param field: Feld (z.B. "genre", "mood")
         :param tagger: (optional) Picard-Tagger-Objekt
+        :param item_key: (optional) Schlüssel des Picard-Objekts (Dateiname/Album-ID) für Abbruch bei Entfernen
+        :param token: (optional) Abbruch-Token, sonst wird eines mit der konfigurierten Deadline erzeugt
         """
         super().__init__()
         self.prompt = prompt
         self.model = model
         self.field = field  # "genre" oder "mood"
         self.tagger = tagger
+        self.item_key = item_key
+        if token is None:
+            token = token_for_item(item_key, timeout=get_snapshot().request_deadline)
+        self.token = token
         self.signals = WorkerSignals()
 
     def run(self):
         try:
             from picard import log
+            if self.token.cancelled:
+                log.info(f"AI Music Identifier: KI-Worker übersprungen, Anfrage abgebrochen (Feld: {self.field})")
+                return
             log.info(f"AI Music Identifier: KI-Worker gestartet (Feld: {self.field}, Modell: {self.model})")
             if self.field == "genre":
-                result = asyncio.run(async_call_ollama(self.prompt, self.model, self.tagger))
+                result = asyncio.run(call_ai_provider(self.prompt, self.model, self.tagger, token=self.token))
             elif self.field == "mood":
-                result = asyncio.run(async_call_ollama(self.prompt, self.model, self.tagger))
+                result = asyncio.run(call_ai_provider(self.prompt, self.model, self.tagger, token=self.token))
             else:
                 result = None
+            if result is None and self.token.cancelled:
+                log.info(f"AI Music Identifier: KI-Worker abgebrochen (Feld: {self.field})")
+                return
             if result and "Fehler" not in result:
-                self.signals.result_ready.emit(self.field, result)
+                with span("qt.signal"):
+                    self.signals.result_ready.emit(self.field, result)
                 log.info(f"AI Music Identifier: KI-Worker erfolgreich (Feld: {self.field})")
             else:
                 self.signals.error.emit(result or "Unbekannter Fehler", None)
@@ -72,10 +88,22 @@ def _on_ki_worker_finished(worker: Any) -> None:
     _active_ki_threads = max(0, _active_ki_threads - 1)
     if log:
         log.debug(f"AI Music Identifier: [Thread] KI-Worker beendet (aktiv: {_active_ki_threads})")
-    # Starte nächsten Worker aus der Queue, falls vorhanden
-    if _ki_worker_queue:
+    # Starte nächsten Worker aus der Queue, falls vorhanden (abgebrochene werden verworfen)
+    while _ki_worker_queue:
         next_worker = _ki_worker_queue.popleft()
+        if _is_cancelled(next_worker):
+            continue
         _start_ki_worker(next_worker)
+        break
+
+def _is_cancelled(worker: Any) -> bool:
+    """
+    Prüft, ob das Abbruch-Token eines Workers ausgelöst wurde.
+    :param worker: Worker
+    :return: True, wenn der Worker nicht mehr ausgeführt werden soll
+    """
+    token = getattr(worker, "token", None)
+    return token is not None and token.cancelled
 
 def _start_ki_worker(worker: Any) -> None:
     """
@@ -83,6 +111,10 @@ def _start_ki_worker(worker: Any) -> None:
     :param worker: Zu startender Worker
     """
     global _active_ki_threads
+    if _is_cancelled(worker):
+        if log:
+            log.debug("AI Music Identifier: [Thread] Abgebrochener KI-Worker verworfen")
+        return
     if _active_ki_threads < _MAX_KI_THREADS:
         _active_ki_threads += 1
         if log:
@@ -94,6 +126,13 @@ def _start_ki_worker(worker: Any) -> None:
         if log:
             log.debug(f"AI Music Identifier: [Thread] KI-Worker in Warteschlange (Queue-Länge: {len(_ki_worker_queue)})")
 
+def active_ki_threads() -> int:
+    """
+    Gibt die Anzahl gerade laufender KI-Worker zurück.
+    :return: Anzahl aktiver Worker (ohne Warteschlange)
+    """
+    return _active_ki_threads
+
 def set_ki_thread_limit(n: int) -> None:
     """
     Setzt das globale Thread-Limit für parallele KI-Worker.
@@ -102,6 +141,63 @@ def set_ki_thread_limit(n: int) -> None:
     global _MAX_KI_THREADS
     _MAX_KI_THREADS = max(1, int(n))
 
+def cancel_ki_workers(item_key: str) -> int:
+    """
+    Bricht alle KI-Requests eines Picard-Objekts ab: wartende Worker werden verworfen,
+    laufende Requests (inkl. Retries und Ollama-Streams) abgebrochen.
+    :param item_key: Schlüssel des Objekts (Dateiname oder Album-ID)
+    :return: Anzahl abgebrochener Requests
+    """
+    dropped = [w for w in _ki_worker_queue if getattr(w, "item_key", None) == item_key]
+    for worker in dropped:
+        _ki_worker_queue.remove(worker)
+    cancelled = cancel_item(item_key)
+    if log and (dropped or cancelled):
+        log.debug(f"AI Music Identifier: [Thread] {cancelled} KI-Requests abgebrochen, {len(dropped)} aus Warteschlange entfernt ({item_key})")
+    return cancelled
+
+def _file_still_loaded(file: Any) -> bool:
+    """True, wenn die Datei noch im Tagger geladen ist (Picard entfernt sie aus tagger.files vor dem Hook)."""
+    files = getattr(getattr(file, "tagger", None), "files", None)
+    return files is not None and files.get(getattr(file, "filename", None)) is file
+
+def _on_file_removed(track: Any, file: Any) -> None:
+    """
+    Picard-Hook: Datei wurde von einem Track entfernt. Der Hook feuert auch beim Verschieben
+    auf einen anderen Track/in ein anderes Album; abgebrochen wird nur, wenn die Datei nicht mehr geladen ist.
+    """
+    filename = getattr(file, "filename", None)
+    if filename and not _file_still_loaded(file):
+        cancel_ki_workers(filename)
+
+def _on_album_removed(album: Any) -> None:
+    """Picard-Hook: Album wurde geschlossen, KI-Requests für Album und Dateien abbrechen."""
+    album_id = getattr(album, "id", None)
+    if album_id:
+        cancel_ki_workers(album_id)
+    try:
+        for file in album.iterfiles():
+            # Dateien werden mit dem Album entfernt
+            if getattr(file, "filename", None):
+                cancel_ki_workers(file.filename)
+    except Exception:
+        pass
+
+def _register_removal_hooks() -> None:
+    """Registriert die Picard-Hooks für entfernte Dateien/Alben (falls von der Picard-Version unterstützt)."""
+    try:
+        from picard.file import register_file_post_removal_from_track_processor
+        register_file_post_removal_from_track_processor(_on_file_removed)
+    except Exception:
+        pass
+    try:
+        from picard.album import register_album_post_removal_processor
+        register_album_post_removal_processor(_on_album_removed)
+    except Exception:
+        pass
+
+_register_removal_hooks()
+
 __all__ = [
-    'AIKIRunnable', '_start_ki_worker', 'set_ki_thread_limit'
+    'AIKIRunnable', '_start_ki_worker', 'active_ki_threads', 'set_ki_thread_limit', 'cancel_ki_workers'
 ] 
\ No newline at end of file
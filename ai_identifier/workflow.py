@@ -2,9 +2,13 @@
 
 import time
 import logging
+from collections import deque
 from .utils import show_error
-from typing import Any, List, Dict, Optional
+from typing import Any, Deque, List, Dict, Optional, Set
 from . import logging
+from .profiling import profiled
+from .config import get_snapshot
+from .journal import ChangeJournal, JournaledMetadata, change_journal
 import logging as std_logging
 
 def analyze_batch_intelligence(song_collection: Any, tagger: Any = None) -> str:
@@ -41,9 +45,14 @@ class WorkflowEngine:
     """
     Engine zur Ausführung von Workflow-Regeln.
     """
-    def __init__(self):
+    def __init__(self, journal: Optional[ChangeJournal] = None):
+        """
+        :param journal: (optional) Journal, in dem Tag-Änderungen der Regel-Aktionen für Undo aufgezeichnet werden
+        """
         self.rules: List[Any] = []
-        self.execution_history: List[Dict[str, Any]] = []
+        # Begrenzt, damit lange Batch-Läufe nicht unbegrenzt Speicher belegen
+        self.execution_history: Deque[Dict[str, Any]] = deque(maxlen=get_snapshot().workflow_history_limit or None)
+        self.journal = journal
         self.enabled: bool = True
     
     def add_rule(self, rule: Any) -> None:
@@ -72,20 +81,31 @@ class WorkflowEngine:
                 return rule
         return None
     
-    def execute_workflows(self, metadata: Any, ai_results: Any, context: Any = None, tagger: Any = None) -> List[Dict[str, Any]]:
+    @profiled("workflow.execute_workflows")
+    def execute_workflows(self, metadata: Any, ai_results: Any, context: Any = None, tagger: Any = None, precomputed: Optional[Set[str]] = None, item_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Führt alle aktiven Workflow-Regeln aus.
         :param metadata: Metadaten
         :param ai_results: Ergebnisse der KI
         :param context: (optional) Kontext
         :param tagger: (optional) Picard-Tagger-Objekt
+        :param precomputed: (optional) Namen der reinen Regeln (pure=True), deren Bedingungen bereits
+                            ausgewertet wurden und zutreffen (z.B. im Prozess-Pool der Nachverarbeitung)
+        :param item_id: (optional) Kennung des Tracks (z.B. Dateiname); mit gesetztem Journal werden
+                        Änderungen der Regel-Aktionen für Undo aufgezeichnet
         :return: Liste der ausgeführten Regeln mit Ergebnissen
         """
         if not self.enabled:
             return []
         executed_rules = []
+        if self.journal is not None and item_id is not None and metadata is not None:
+            metadata = JournaledMetadata(metadata, self.journal, item_id)
         for rule in self.rules:
-            if rule.evaluate_conditions(metadata, ai_results, context):
+            if precomputed is not None and getattr(rule, "pure", False):
+                matches = rule.name in precomputed
+            else:
+                matches = rule.evaluate_conditions(metadata, ai_results, context)
+            if matches:
                 try:
                     results = rule.execute_actions(metadata, ai_results, context)
                     executed_rules.append({
@@ -105,6 +125,9 @@ class WorkflowEngine:
         self.execution_history.extend(executed_rules)
         return executed_rules
 
+# Gemeinsame Engine der Batch-Nachverarbeitung; Regel-Aktionen landen im globalen Undo-Journal
+workflow_engine = WorkflowEngine(journal=change_journal)
+
 def create_default_workflows() -> List[Any]:
     """
     Erstellt eine Liste von Standard-Workflow-Regeln (Platzhalter).
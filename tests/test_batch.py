@@ -0,0 +1,88 @@
+import asyncio
+
+from ai_identifier.batch import AdaptiveWindow, stream_batch
+from ai_identifier.cancellation import CancellationToken
+
+
+def collect(items, worker, window, token=None, is_error=None):
+    async def run():
+        return [pair async for pair in stream_batch(items, worker, window, token, is_error)]
+    return asyncio.run(run())
+
+
+def test_window_grows_when_fast_and_shrinks_on_errors():
+    window = AdaptiveWindow(minimum=1, maximum=4, start=2, slow_threshold=8.0, fast_threshold=3.0)
+    assert not window.record(0.1, False)
+    assert window.record(0.1, False)
+    assert window.size == 3
+    for _ in range(3):
+        window.record(0.1, error=True)
+    assert window.size == 2
+    for _ in range(2):
+        window.record(9.0, False)
+    assert window.size == 1
+    window.record(9.0, False)
+    assert window.size == 1
+
+
+def test_stream_batch_limits_in_flight_and_yields_every_index():
+    running = []
+    peak = []
+
+    async def worker(item):
+        running.append(item)
+        peak.append(len(running))
+        await asyncio.sleep(0.01 * (item % 3))
+        running.remove(item)
+        return item * 2
+
+    window = AdaptiveWindow(minimum=3, maximum=3, start=3, slow_threshold=8.0, fast_threshold=3.0)
+    results = collect(range(10), worker, window)
+    assert max(peak) == 3
+    assert sorted(results) == [(i, i * 2) for i in range(10)]
+
+
+def test_worker_exception_yields_none():
+    async def worker(item):
+        if item == 1:
+            raise ValueError("kaputt")
+        return item
+
+    window = AdaptiveWindow(1, 2, 2, 8.0, 3.0)
+    assert dict(collect([0, 1, 2], worker, window)) == {0: 0, 1: None, 2: 2}
+
+
+def test_cancelled_token_stops_starting_new_items():
+    token = CancellationToken()
+    started = []
+
+    async def worker(item):
+        started.append(item)
+        if item == 1:
+            token.cancel()
+        return item
+
+    window = AdaptiveWindow(1, 1, 1, 8.0, 3.0)
+    results = collect(iter(range(100)), worker, window, token)
+    assert started == [0, 1]
+    assert [i for i, _ in results] == [0, 1]
+
+
+def test_async_iterable_input_is_read_lazily():
+    read = []
+
+    async def source():
+        for i in range(5):
+            read.append(i)
+            yield i
+
+    async def worker(item):
+        # Beim Start des ersten Workers ist höchstens das Fenster gelesen
+        assert len(read) <= 2
+        return item
+
+    async def run():
+        async for index, _ in stream_batch(source(), worker, AdaptiveWindow(2, 2, 2, 8.0, 3.0)):
+            return index
+
+    assert asyncio.run(run()) in (0, 1)
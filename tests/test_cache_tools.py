@@ -0,0 +1,51 @@
+import time
+
+from ai_identifier.cache_tools import FIRST, NEWEST, merge_entries, merge_files, read_source
+from ai_identifier.cachefile import CacheFile, RawEntry
+
+NOW = time.time()
+
+
+def entries(*pairs):
+    return [(key.encode("utf-8"), {"value": value, "ts": ts}) for key, value, ts in pairs]
+
+
+def test_newest_wins_and_output_stays_sorted():
+    local = entries(("ki_genre::mistral::a", "Rock", NOW - 10), ("ki_genre::mistral::c", "Jazz", NOW))
+    other = entries(("ki_genre::mistral::a", "Pop", NOW), ("ki_genre::mistral::b", "Soul", NOW))
+    merged = list(merge_entries([local, other], policy=NEWEST))
+    assert [k for k, _ in merged] == [b"ki_genre::mistral::a", b"ki_genre::mistral::b", b"ki_genre::mistral::c"]
+    assert merged[0][1]["value"] == "Pop"
+
+
+def test_first_policy_and_per_model_override():
+    local = entries(("ki_genre::llama3::a", "Rock", NOW - 10), ("ki_genre::mistral::a", "Rock", NOW - 10))
+    other = entries(("ki_genre::llama3::a", "Pop", NOW), ("ki_genre::mistral::a", "Pop", NOW))
+    merged = dict(merge_entries([local, other], policy=NEWEST, model_policies={"llama3": FIRST}))
+    assert merged[b"ki_genre::llama3::a"]["value"] == "Rock"
+    assert merged[b"ki_genre::mistral::a"]["value"] == "Pop"
+    assert dict(merge_entries([local, other], policy=FIRST))[b"ki_genre::mistral::a"]["value"] == "Rock"
+
+
+def test_prefix_filter_and_expired_entries_are_dropped():
+    source = entries(
+        ("ki_cover::llava::p:01", "Cover", NOW),
+        ("ki_genre::mistral::a", "Rock", NOW),
+        ("ki_genre::mistral::old", "Rock", NOW - 30 * 86400),
+    )
+    assert [k for k, _ in merge_entries([source], prefixes=["ki_genre::"])] == [b"ki_genre::mistral::a"]
+
+
+def test_merge_files_between_cache_file_and_export(tmp_path):
+    binary = str(tmp_path / "local.bin")
+    CacheFile.write(binary, entries(("ki_genre::mistral::a", "Rock", NOW - 10), ("ki_style::mistral::a", "Punk", NOW)))
+    export = str(tmp_path / "other.jsonl.gz")
+    assert merge_files([binary], export) == 2
+    newer = str(tmp_path / "newer.bin")
+    CacheFile.write(newer, entries(("ki_genre::mistral::a", "Pop", NOW)))
+    output = str(tmp_path / "merged.bin")
+    assert merge_files([export, newer], output) == 2
+    merged = {k: v.decode() for k, v in read_source(output)}
+    assert all(isinstance(v, RawEntry) for _, v in read_source(output))
+    assert merged[b"ki_genre::mistral::a"]["value"] == "Pop"
+    assert merged[b"ki_style::mistral::a"] == {"value": "Punk", "ts": NOW}
@@ -0,0 +1,91 @@
+import os
+import time
+
+from ai_identifier.cachefile import CacheFile, LazyCache, RawEntry
+
+NOW = time.time()
+
+
+def write(path, entries):
+    return CacheFile.write(str(path), sorted((k.encode("utf-8"), v) for k, v in entries.items()))
+
+
+def test_round_trip_and_lookup(tmp_path):
+    path = tmp_path / "cache.bin"
+    assert write(path, {
+        "ki_genre::mistral::Song::Artist": {"value": "Rock", "ts": NOW},
+        "ki_style::mistral::Song::Artist": {"value": "Hardrock", "ts": NOW - 5},
+    }) == 2
+    cache = CacheFile(str(path))
+    try:
+        i = cache.find("ki_style::mistral::Song::Artist")
+        assert cache.value(i) == {"value": "Hardrock", "ts": NOW - 5}
+        assert cache.raw(i) == RawEntry(b'{"value":"Hardrock"}', NOW - 5)
+        assert cache.find("ki_genre::mistral::Other::Artist") == -1
+    finally:
+        cache.close()
+
+
+def test_identical_values_are_stored_once(tmp_path):
+    value = {"value": "Electronic" * 50, "ts": NOW}
+    write(tmp_path / "one.bin", {"a": value})
+    write(tmp_path / "many.bin", {k: value for k in "abcdefgh"})
+    grown = os.path.getsize(tmp_path / "many.bin") - os.path.getsize(tmp_path / "one.bin")
+    assert grown < len(value["value"])
+
+
+def test_lazy_cache_overlay_delete_and_expiry(tmp_path):
+    path = tmp_path / "cache.bin"
+    write(path, {"fresh": {"value": "a", "ts": NOW}, "old": {"value": "b", "ts": NOW - 10 * 86400}})
+    cache = LazyCache(CacheFile(str(path)), expiry_seconds=7 * 86400)
+    try:
+        assert "fresh" in cache and "old" not in cache
+        assert not cache.dirty
+        cache["new"] = {"value": "c", "ts": NOW}
+        del cache["fresh"]
+        assert cache.dirty
+        assert sorted(cache) == ["new"]
+    finally:
+        cache.close()
+
+
+def test_keys_with_prefix_merges_file_and_overlay(tmp_path):
+    path = tmp_path / "cache.bin"
+    write(path, {
+        "ki_cover::llava::p:01": {"value": "x", "ts": NOW},
+        "ki_cover::llava::p:02": {"value": "y", "ts": NOW},
+        "ki_genre::mistral::a::b": {"value": "Rock", "ts": NOW},
+    })
+    cache = LazyCache(CacheFile(str(path)))
+    try:
+        cache["ki_cover::llava::p:03"] = {"value": "z", "ts": NOW}
+        del cache["ki_cover::llava::p:01"]
+        assert sorted(cache.keys_with_prefix("ki_cover::llava::")) == ["ki_cover::llava::p:02", "ki_cover::llava::p:03"]
+    finally:
+        cache.close()
+
+
+def test_snapshot_compacts_and_copies_unchanged_values_raw(tmp_path):
+    path = tmp_path / "cache.bin"
+    write(path, {
+        "keep": {"value": "a", "ts": NOW},
+        "drop": {"value": "b", "ts": NOW},
+        "expired": {"value": "c", "ts": NOW - 10 * 86400},
+    })
+    cache = LazyCache(CacheFile(str(path)), expiry_seconds=7 * 86400)
+    try:
+        cache["add"] = {"value": "d", "ts": NOW}
+        del cache["drop"]
+        items, overlay, deleted = cache.snapshot()
+        items = list(items)
+        assert [k for k, _ in items] == [b"add", b"keep"]
+        assert isinstance(dict(items)[b"keep"], RawEntry)
+        tmp = str(path) + ".tmp"
+        assert CacheFile.write(tmp, iter(items)) == 2
+        cache.replace_base(tmp, str(path), overlay, deleted)
+        assert not cache.dirty
+        assert cache.base_count() == 2
+        assert cache["keep"] == {"value": "a", "ts": NOW}
+        assert cache["add"]["value"] == "d"
+    finally:
+        cache.close()
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+import pytest
+
+from ai_identifier.cancellation import (
+    CancellationToken, DeadlineExceeded, RequestCancelled, cancel_item, run_cancellable, token_for_item
+)
+
+
+def test_child_follows_parent_cancel_and_deadline():
+    parent = CancellationToken(timeout=5)
+    child = CancellationToken(timeout=60, parent=parent)
+    assert child.deadline == parent.deadline
+    assert not child.cancelled
+    parent.cancel()
+    assert child.cancelled
+    assert not child.expired
+
+
+def test_register_on_cancelled_token_calls_immediately():
+    token = CancellationToken()
+    token.cancel()
+    calls = []
+    token.register(lambda: calls.append(1))
+    assert calls == [1]
+
+
+def test_run_cancellable_returns_result():
+    async def work():
+        await asyncio.sleep(0)
+        return "ok"
+    assert asyncio.run(run_cancellable(work(), CancellationToken(timeout=5))) == "ok"
+
+
+def test_cancel_from_other_thread_stops_awaitable():
+    token = CancellationToken()
+    stopped = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            stopped.append(True)
+            raise
+
+    async def main():
+        threading.Timer(0.05, token.cancel).start()
+        await run_cancellable(work(), token)
+
+    with pytest.raises(RequestCancelled) as info:
+        asyncio.run(main())
+    assert not isinstance(info.value, DeadlineExceeded)
+    assert stopped == [True]
+
+
+def test_deadline_raises_deadline_exceeded():
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run_cancellable(asyncio.sleep(10), CancellationToken(timeout=0.05)))
+
+
+def test_already_cancelled_token_does_not_start_coroutine():
+    token = CancellationToken()
+    token.cancel()
+    started = []
+
+    async def work():
+        started.append(True)
+
+    with pytest.raises(RequestCancelled):
+        asyncio.run(run_cancellable(work(), token))
+    assert started == []
+
+
+def test_cancel_item_cancels_linked_tokens_only():
+    first = token_for_item("/music/a.flac")
+    second = token_for_item("/music/a.flac", parent=CancellationToken())
+    other = token_for_item("/music/b.flac")
+    assert cancel_item("/music/a.flac") == 2
+    assert first.cancelled and second.cancelled
+    assert not other.cancelled
+    assert cancel_item("/music/a.flac") == 0
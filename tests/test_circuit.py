@@ -0,0 +1,75 @@
+from ai_identifier import cache
+from ai_identifier.providers import circuit
+from ai_identifier.providers.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(monkeypatch, threshold=3, window=60.0, open_seconds=30.0):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit.time, "monotonic", clock)
+    monkeypatch.setattr(CircuitBreaker, "_settings", staticmethod(lambda: (threshold, window, open_seconds)))
+    return CircuitBreaker("Test"), clock
+
+
+def test_closed_open_half_open_closed(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch)
+    assert breaker.allow() == (True, False)
+    for _ in range(3):
+        breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+    assert breaker.allow() == (False, False)
+
+    clock.now += 30.0
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() == (True, True)
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow() == (True, False)
+
+
+def test_failed_probe_reopens(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch, threshold=1)
+    breaker.record_failure("timeout")
+    clock.now += 30.0
+    assert breaker.allow() == (True, True)
+    breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+    assert breaker.allow() == (False, False)
+
+
+def test_failures_outside_window_do_not_open(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch, threshold=2, window=10.0)
+    breaker.record_failure()
+    clock.now += 11.0
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_allows_single_probe(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch, threshold=1)
+    breaker.record_failure("timeout")
+    clock.now += 30.0
+    assert breaker.allow() == (True, True)
+    # Weitere Requests während des Probe-Requests werden abgelehnt
+    assert breaker.allow() == (False, False)
+    assert breaker.allow() == (False, False)
+    # Abgebrochener Probe-Request gibt den Slot frei, der nächste wird wieder Probe
+    breaker.release_probe()
+    assert breaker.allow() == (True, True)
+
+
+def test_negative_cache_expires(monkeypatch):
+    now = [5000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    cache.put_negative("model::gibtsnicht", "404", ttl=60)
+    assert cache.get_negative("model::gibtsnicht") == "404"
+    assert cache.get_negative("model::mistral") is None
+    now[0] += 61
+    assert cache.get_negative("model::gibtsnicht") is None
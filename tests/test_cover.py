@@ -0,0 +1,36 @@
+from ai_identifier.cover import CoverIndex, hamming
+
+
+def test_hamming():
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(0, 0) == 0
+
+
+def test_finds_nearest_within_distance():
+    index = CoverIndex(max_distance=6)
+    base = 0x0123456789ABCDEF
+    near = base ^ 0b101  # 2 Bits abweichend
+    farther = base ^ 0b111111  # 6 Bits abweichend
+    index.add(farther)
+    index.add(near)
+    assert index.find(base) == near
+
+
+def test_ignores_hashes_beyond_distance():
+    index = CoverIndex(max_distance=3)
+    base = 0x0F0F0F0F0F0F0F0F
+    index.add(base ^ 0b1111)  # 4 Bits
+    assert index.find(base) is None
+
+
+def test_distance_is_capped_by_band_count():
+    # 8 Bänder: Paare ab 8 abweichenden Bits werden nicht sicher gefunden, daher höchstens 7
+    assert CoverIndex(max_distance=20).max_distance == 7
+
+
+def test_difference_spread_over_all_bands_is_found():
+    index = CoverIndex(max_distance=7)
+    base = 0
+    spread = sum(1 << (band * 8) for band in range(7))  # 7 Bits in 7 verschiedenen Bändern
+    index.add(spread)
+    assert index.find(base) == spread
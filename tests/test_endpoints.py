@@ -0,0 +1,57 @@
+from ai_identifier.providers.endpoints import EndpointPool
+from ai_identifier.providers.registry import model_registry
+
+URL_A = "http://backend-a:11434"
+URL_B = "http://backend-b:11434"
+
+
+def make_pool():
+    return EndpointPool([URL_A, URL_B])
+
+
+def test_least_outstanding_spreads_requests():
+    pool = make_pool()
+    first = pool.acquire("mistral")
+    second = pool.acquire("mistral")
+    assert {first.url, second.url} == {URL_A, URL_B}
+    pool.release(first, elapsed=0.5)
+    assert pool.acquire("mistral") is first
+
+
+def test_exclude_fails_over_to_other_backend():
+    pool = make_pool()
+    first = pool.acquire("mistral")
+    pool.release(first)
+    assert pool.acquire("mistral", exclude=[first]) is not first
+
+
+def test_repeated_failures_eject_backend():
+    pool = make_pool()
+    a = pool.endpoints[0]
+    for _ in range(3):
+        pool.release(pool.acquire("mistral", exclude=[pool.endpoints[1]]), failed=True)
+    assert not a.healthy
+    assert all(pool.acquire("mistral") is pool.endpoints[1] for _ in range(3))
+
+
+def test_models_come_from_registry_on_rebuild():
+    model_registry.observe(URL_A, {"models": [{"name": "llava:13b"}]})
+    try:
+        pool = make_pool()
+        a, b = pool.endpoints
+        assert a.models == {"llava:13b"}
+        assert b.models is None
+        assert a.serves("llava:13b") and not a.serves("mistral")
+        assert pool.acquire("mistral") is b
+    finally:
+        model_registry.forget(URL_A)
+
+
+def test_missing_model_is_endpoint_specific():
+    pool = make_pool()
+    a, b = pool.endpoints
+    pool.mark_missing(a, "mistral")
+    assert not a.serves("mistral") and not a.serves("mistral:latest")
+    assert a.serves("llama3")
+    assert b.serves("mistral")
+    assert all(pool.acquire("mistral") is b for _ in range(3))
@@ -0,0 +1,115 @@
+from ai_identifier.journal import ChangeJournal, JournaledMetadata, picard_apply
+from ai_identifier.postprocess import postprocess_tracks
+from ai_identifier.workflow import WorkflowEngine
+
+
+class FakeMetadata(dict):
+    """Nachbildung von picard.metadata.Metadata: Werte sind Listen, [] liefert sie verbunden."""
+    def __init__(self, **tags):
+        super().__init__()
+        self.deleted_tags = set()
+        for name, values in tags.items():
+            self.set(name, values)
+
+    def __getitem__(self, name):
+        return "; ".join(dict.__getitem__(self, name))
+
+    def __setitem__(self, name, values):
+        self.set(name, values)
+
+    def getall(self, name):
+        return dict.get(self, name, [])
+
+    def set(self, name, values):
+        dict.__setitem__(self, name, list(values) if isinstance(values, (list, tuple)) else [values])
+
+    def add(self, name, value):
+        dict.__setitem__(self, name, self.getall(name) + [value])
+
+    def add_unique(self, name, value):
+        if value not in self.getall(name):
+            self.add(name, value)
+
+    def delete(self, name):
+        dict.pop(self, name, None)
+        self.deleted_tags.add(name)
+
+    unset = delete
+
+    def update(self, other):
+        for name in other:
+            self.set(name, other.getall(name) if hasattr(other, "getall") else other[name])
+
+
+class FakeFile:
+    def __init__(self, filename, metadata):
+        self.filename = filename
+        self.metadata = metadata
+
+    def update(self):
+        pass
+
+
+class FakeTagger:
+    def __init__(self, *files):
+        self.files = {f.filename: f for f in files}
+
+
+class SetGenreRule:
+    name = "genre-from-ai"
+    priority = 0
+    pure = False
+
+    def evaluate_conditions(self, metadata, ai_results, context):
+        return bool(ai_results.get("genre"))
+
+    def execute_actions(self, metadata, ai_results, context):
+        metadata["genre"] = ai_results["genre"]
+        metadata.add_unique("mood", "Energetic")
+        metadata.delete("comment")
+        return {"genre": ai_results["genre"]}
+
+
+def test_batch_apply_then_undo_restores_tags(tmp_path):
+    journal = ChangeJournal(spill_dir=str(tmp_path))
+    engine = WorkflowEngine(journal=journal)
+    engine.add_rule(SetGenreRule())
+    first = FakeFile("/music/a.flac", FakeMetadata(genre=["Rock", "Pop"], comment="gekauft"))
+    second = FakeFile("/music/b.flac", FakeMetadata(genre="Jazz", mood="Calm"))
+    tagger = FakeTagger(first, second)
+    tracks = [{"metadata": f.metadata, "ai_results": {"genre": "Electronic"}, "filename": f.filename} for f in (first, second)]
+
+    postprocess_tracks(tracks, engine=engine, tagger=tagger)
+    assert first.metadata.getall("genre") == ["Electronic"]
+    assert second.metadata.getall("mood") == ["Calm", "Energetic"]
+    assert "comment" not in first.metadata
+    assert len(journal.history()) == 1  # ein Batch = eine Undo-Gruppe
+
+    journal.undo(picard_apply(tagger))
+    assert first.metadata.getall("genre") == ["Rock", "Pop"]
+    assert first.metadata.getall("comment") == ["gekauft"]
+    assert second.metadata.getall("genre") == ["Jazz"]
+    assert second.metadata.getall("mood") == ["Calm"]
+
+    journal.redo(picard_apply(tagger))
+    assert first.metadata.getall("genre") == ["Electronic"]
+    assert "comment" not in first.metadata
+
+
+def test_unchanged_values_are_not_recorded(tmp_path):
+    journal = ChangeJournal(spill_dir=str(tmp_path))
+    metadata = JournaledMetadata(FakeMetadata(genre="Rock"), journal, "/music/a.flac")
+    metadata["genre"] = "Rock"
+    metadata.set("genre", ["Rock"])
+    metadata.add_unique("genre", "Rock")
+    assert not journal.can_undo
+
+
+def test_update_records_every_touched_tag(tmp_path):
+    journal = ChangeJournal(spill_dir=str(tmp_path))
+    original = FakeMetadata(genre="Rock", title="Song")
+    metadata = JournaledMetadata(original, journal, "/music/a.flac")
+    metadata.update(FakeMetadata(genre="Pop", title="Song", mood="Happy"))
+    restored = {}
+    journal.undo(lambda item_id, field, value: restored.__setitem__(field, value))
+    assert restored == {"genre": ("Rock",), "mood": None}
@@ -0,0 +1,29 @@
+from ai_identifier.langdetect import HELDOUT_SET, detect_language, run_benchmark
+
+THRESHOLD = 0.95  # Standardwert von "aiid_language_min_confidence"
+
+
+def test_short_titles_stay_unsure():
+    # Zu wenige (verschiedene) Wörter: nie ohne LLM entscheiden
+    for title, artist in [("Under Pressure", "Queen"), ("Da Da Da", "Trio")]:
+        assert detect_language(title, artist).confidence < THRESHOLD
+
+
+def test_single_word_evidence_stays_unsure():
+    # Vorsprung hängt an einem Wort ("Die" → de) oder ist zu knapp ("alles", "nur" → fr)
+    assert detect_language("Die With A Smile", "Lady Gaga").confidence < THRESHOLD
+    assert detect_language("Alles nur geklaut", "Die Prinzen").confidence < THRESHOLD
+
+
+def test_clear_titles_are_detected():
+    for title, expected in [("Wie schön, dass du geboren bist", "de"), ("Tous les garçons et les filles", "fr")]:
+        guess = detect_language(title)
+        assert guess.code == expected
+        assert guess.confidence >= THRESHOLD
+    assert detect_language("上を向いて歩こう").code == "ja"
+
+
+def test_heldout_precision():
+    result = run_benchmark(THRESHOLD, HELDOUT_SET, repeat=1)
+    assert result["skip_rate"] > 0.0
+    assert result["precision"] == 1.0
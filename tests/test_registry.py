@@ -0,0 +1,75 @@
+from ai_identifier.providers.registry import ModelRegistry, model_aliases
+
+# Antwort von GET /api/tags (Ollama 0.3), gekürzt auf zwei Modelle
+TAGS_PAYLOAD = {
+    "models": [
+        {
+            "name": "mistral:latest",
+            "model": "mistral:latest",
+            "modified_at": "2024-07-22T20:10:41.374163632+02:00",
+            "size": 4113301824,
+            "digest": "f974a74358d62a017b37c6f424fcdf2744ca02926c4f952513ddf474b2fa5091",
+            "details": {
+                "parent_model": "",
+                "format": "gguf",
+                "family": "llama",
+                "families": ["llama"],
+                "parameter_size": "7.2B",
+                "quantization_level": "Q4_0",
+            },
+        },
+        {
+            "name": "llama3:8b-instruct-q4_0",
+            "model": "llama3:8b-instruct-q4_0",
+            "modified_at": "2024-07-20T11:02:13.154392191+02:00",
+            "size": 4661224676,
+            "digest": "365c0bd3c000a25d28ddbf732fe1c6add414de7275464c4e4d1c3b5fcb5d8ad1",
+            "details": {
+                "parent_model": "",
+                "format": "gguf",
+                "family": "llama",
+                "families": ["llama"],
+                "parameter_size": "8.0B",
+                "quantization_level": "Q4_0",
+            },
+        },
+    ]
+}
+
+
+def test_untagged_name_matches_latest():
+    registry = ModelRegistry()
+    assert registry.contains("mistral") is None
+    assert registry.observe("http://localhost:11434", TAGS_PAYLOAD) is not None
+    assert registry.contains("mistral") is True
+    assert registry.contains("mistral:latest") is True
+
+
+def test_other_tags_do_not_match():
+    registry = ModelRegistry()
+    registry.observe("http://localhost:11434", TAGS_PAYLOAD)
+    assert registry.contains("llama3:8b-instruct-q4_0") is True
+    # "llama3" bedeutet "llama3:latest", das nicht installiert ist
+    assert registry.contains("llama3") is False
+    assert registry.contains("mistral:7b") is False
+
+
+def test_model_field_without_name():
+    registry = ModelRegistry()
+    registry.observe("http://localhost:11434", {"models": [{"model": "phi3:latest", "digest": "abc"}]})
+    assert registry.contains("phi3") is True
+
+
+def test_unchanged_payload_is_not_rebuilt():
+    registry = ModelRegistry()
+    registry.observe("http://localhost:11434", TAGS_PAYLOAD)
+    version = registry.version
+    assert registry.observe("http://localhost:11434", TAGS_PAYLOAD) is None
+    assert registry.version == version
+
+
+def test_model_aliases():
+    assert model_aliases("mistral") == ("mistral", "mistral:latest")
+    assert model_aliases("mistral:latest") == ("mistral:latest", "mistral")
+    assert model_aliases("mistral:7b") == ("mistral:7b",)
+    assert model_aliases("localhost:5000/library/mistral") == ("localhost:5000/library/mistral", "localhost:5000/library/mistral:latest")
@@ -0,0 +1,72 @@
+import asyncio
+import gzip
+import json
+
+from ai_identifier.providers.base import AIProviderBase, ProviderCapabilities, backend_timing
+from ai_identifier.providers.replay import RecordingProvider, ReplayProvider, request_key
+
+
+class FakeBackend(AIProviderBase):
+    """Provider, der vor dem eigentlichen Request wartet (wie auf einen Slot) und die HTTP-Messung meldet."""
+    def __init__(self):
+        super().__init__(name="Fake")
+
+    def capabilities(self):
+        return ProviderCapabilities(max_concurrency=4, supports_json_mode=True)
+
+    async def call(self, prompt, model=None, tagger=None, file_name=None, token=None, settings=None, images=None, json_mode=False):
+        await asyncio.sleep(0.05)
+        timing = backend_timing.get()
+        if timing is not None:
+            timing.update(elapsed=0.01, in_flight=2)
+        return ("{\"genre\": \"Rock\"}" if json_mode else "Rock") + f" ({prompt})"
+
+
+def read_records(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_request_key_depends_on_json_mode_and_images():
+    plain = request_key("p", "mistral")
+    assert plain == request_key("p", "mistral")
+    assert plain != request_key("p", "mistral", json_mode=True)
+    assert plain != request_key("p", "mistral", images=["aGVsbG8="])
+    assert plain != request_key("p", "llama3")
+
+
+def test_recording_stores_backend_timing(tmp_path):
+    path = str(tmp_path / "rec.jsonl.gz")
+    recorder = RecordingProvider(path, FakeBackend())
+    assert asyncio.run(recorder.call("a", "mistral")) == "Rock (a)"
+    recorder.close()
+    record, summary = read_records(path)
+    assert record["t"] == 0.01  # nur der HTTP-Round-Trip, nicht das Warten davor
+    assert record["c"] == 2
+    assert summary == {"summary": {"requests": 1, "max_concurrency": 2}}
+
+
+def test_replay_returns_recorded_answers(tmp_path):
+    path = str(tmp_path / "rec.jsonl.gz")
+    recorder = RecordingProvider(path, FakeBackend())
+
+    async def record():
+        await recorder.call("a", "mistral")
+        await recorder.call("a", "mistral", json_mode=True)
+    asyncio.run(record())
+    recorder.close()
+
+    replay = ReplayProvider(path, time_scale=0)
+    assert replay.max_concurrency == 2
+
+    async def play():
+        return [
+            await replay.call("a", "mistral"),
+            await replay.call("a", "mistral", json_mode=True),
+            await replay.call("b", "mistral"),
+        ]
+    plain, as_json, missing = asyncio.run(play())
+    assert plain == "Rock (a)"
+    assert as_json == '{"genre": "Rock"} (a)'
+    assert "Fehler" in missing
+    assert (replay.hits, replay.misses) == (2, 1)